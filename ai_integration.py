@@ -3,8 +3,9 @@ import os
 import logging
 import json
 import base64
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
 import google.generativeai as genai
+from llm_scheduler import LLMScheduler, LLMRequestExpired
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,9 @@ class GeminiAPI:
 
         genai.configure(api_key=self.api_key)
         
+        # Every call waits its turn here so interactive requests beat background ones
+        self.scheduler = LLMScheduler()
+        
         # Get available models
         try:
             models = genai.list_models()
@@ -42,7 +46,7 @@ class GeminiAPI:
             self.text_model = genai.GenerativeModel('gemini-pro')
             self.vision_model = genai.GenerativeModel('gemini-pro-vision')
 
-    async def generate_response(self, prompt: str, system_prompt: str = None) -> str:
+    async def generate_response(self, prompt: str, system_prompt: str = None, priority: str = "text") -> str:
         """Generate a response using Gemini"""
         try:
             if system_prompt:
@@ -50,33 +54,82 @@ class GeminiAPI:
             else:
                 full_prompt = prompt
 
-            response = await self.text_model.generate_content_async(full_prompt)
+            async with self.scheduler.reserve(priority):
+                response = await self.text_model.generate_content_async(full_prompt)
             return response.text
 
+        except LLMRequestExpired:
+            raise
         except Exception as e:
             logger.error(f"Error with Gemini API: {e}")
             return "I'm having trouble thinking right now. Can you try again?"
 
-    async def generate_vision_response(self, prompt: str, image_path: str, system_prompt: str = None) -> str:
-        """Generate a response from vision model based on text prompt and image"""
+    async def generate_response_stream(self, prompt: str, system_prompt: str = None, priority: str = "text") -> AsyncIterator[str]:
+        """Generate a response using Gemini, yielding text chunks as they arrive"""
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n\n{prompt}"
+        else:
+            full_prompt = prompt
+
+        produced_text = False
+        try:
+            # The slot is held until the whole stream has been read
+            async with self.scheduler.reserve(priority):
+                response = await self.text_model.generate_content_async(full_prompt, stream=True)
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. safety metadata) have no .text
+                        continue
+                    if text:
+                        produced_text = True
+                        yield text
+
+        except LLMRequestExpired:
+            raise
+        except Exception as e:
+            logger.error(f"Error with Gemini streaming API: {e}")
+            if not produced_text:
+                yield "I'm having trouble thinking right now. Can you try again?"
+
+    async def generate_vision_response(self, prompt: str, image_data: bytes, system_prompt: str = None,
+                                       priority: str = "voice", mime_type: str = "image/jpeg") -> str:
+        """Generate a response from vision model based on text prompt and an encoded image held in memory"""
+        return await self.generate_multi_image_response(prompt, [(image_data, mime_type)], system_prompt, priority)
+
+    async def generate_multi_image_response(self, prompt: str, images: List[Tuple[bytes, str]], system_prompt: str = None,
+                                            priority: str = "voice", labels: List[str] = None) -> str:
+        """
+        Generate a response from vision model about several encoded images in one request
+
+        Args:
+            prompt: Text prompt, sent before the images
+            images: (encoded image, MIME type) pairs, in the order the model should see them
+            system_prompt: Optional system prompt prepended to the prompt
+            priority: LLM scheduling class for the request
+            labels: Optional caption sent before each image, e.g. when it was taken
+        """
         try:
             if system_prompt:
                 full_prompt = f"{system_prompt}\n\n{prompt}"
             else:
                 full_prompt = prompt
 
-            # Read image file
-            with open(image_path, 'rb') as img_file:
-                image_data = img_file.read()
+            # Create image parts for the model, each after its caption
+            parts: List[Any] = [full_prompt]
+            for index, (image_data, mime_type) in enumerate(images):
+                if labels and index < len(labels):
+                    parts.append(labels[index])
+                parts.append({"mime_type": mime_type, "data": image_data})
 
-            # Create image parts for the model
-            response = await self.vision_model.generate_content_async([
-                full_prompt,
-                {"mime_type": "image/jpeg", "data": image_data}
-            ])
+            async with self.scheduler.reserve(priority):
+                response = await self.vision_model.generate_content_async(parts)
 
             return response.text
 
+        except LLMRequestExpired:
+            raise
         except Exception as e:
             logger.error(f"Error with Gemini Vision API: {e}")
             return "I'm having trouble analyzing the image right now."
@@ -93,7 +146,8 @@ class GeminiAPI:
                 f"\"requires_response\": true/false, \"confidence\": 0-1, \"explanation\": \"brief explanation\"}}"
             )
 
-            response = await self.text_model.generate_content_async(prompt)
+            async with self.scheduler.reserve("intent"):
+                response = await self.text_model.generate_content_async(prompt)
 
             try:
                 # Extract JSON from response
@@ -0,0 +1,254 @@
+import asyncio
+import io
+import logging
+import struct
+import wave
+from typing import Iterable, Iterator, List, Optional, Union
+
+import discord
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Discord voice expects 20 ms frames of 48 kHz, 16-bit, stereo PCM
+DISCORD_SAMPLE_RATE = 48000
+DISCORD_CHANNELS = 2
+DISCORD_FRAME_SIZE = DISCORD_SAMPLE_RATE // 50 * DISCORD_CHANNELS * 2  # 3840 bytes
+OPUS_FRAME_SAMPLES = DISCORD_SAMPLE_RATE // 50  # Samples per channel in one 20 ms frame
+
+# Cache format for pre-encoded audio: each Opus packet prefixed with its 16-bit length
+OPUS_PACKETS_FORMAT = "opuspkt"
+
+_opus_available: Optional[bool] = None
+
+def resample_pcm(pcm: bytes, sample_rate: int, channels: int,
+                 target_rate: int = DISCORD_SAMPLE_RATE, target_channels: int = DISCORD_CHANNELS) -> bytes:
+    """
+    Convert 16-bit PCM to another sample rate and channel count
+
+    Uses vectorized linear interpolation, which is plenty for speech being
+    upsampled from a TTS voice's native rate.
+
+    Args:
+        pcm: Interleaved 16-bit little-endian samples
+        sample_rate: Rate of the input
+        channels: Channel count of the input
+        target_rate: Rate of the output
+        target_channels: Channel count of the output (1 or 2)
+
+    Returns:
+        Interleaved 16-bit little-endian samples at the target format
+    """
+    samples = np.frombuffer(pcm, dtype="<i2")
+    samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+
+    # Mix down to what the output needs before resampling so there is less to interpolate
+    if channels > target_channels:
+        samples = samples.mean(axis=1, keepdims=True) if target_channels == 1 else samples[:, :target_channels]
+
+    if sample_rate != target_rate and len(samples):
+        output_length = int(round(len(samples) * target_rate / sample_rate))
+        positions = np.arange(output_length, dtype=np.float64) * (sample_rate / target_rate)
+        source_positions = np.arange(len(samples), dtype=np.float64)
+        samples = np.stack(
+            [np.interp(positions, source_positions, samples[:, channel]) for channel in range(samples.shape[1])],
+            axis=1
+        )
+
+    if samples.shape[1] < target_channels:
+        samples = np.repeat(samples, target_channels, axis=1)
+
+    return np.clip(np.rint(samples), -32768, 32767).astype("<i2").tobytes()
+
+
+def encode_opus_packets(pcm: bytes) -> Optional[List[bytes]]:
+    """
+    Encode 48 kHz stereo PCM into one Opus packet per 20 ms frame
+
+    Args:
+        pcm: Discord-format PCM, e.g. from resample_pcm
+
+    Returns:
+        The packets, or None if the Opus library is not available
+    """
+    global _opus_available
+    if _opus_available is False:
+        return None
+
+    try:
+        encoder = discord.opus.Encoder()
+        _opus_available = True
+    except Exception as e:
+        logger.warning(f"Opus encoder not available, audio will be encoded during playback: {e}")
+        _opus_available = False
+        return None
+
+    packets = []
+    for offset in range(0, len(pcm), DISCORD_FRAME_SIZE):
+        frame = pcm[offset:offset + DISCORD_FRAME_SIZE]
+        if len(frame) < DISCORD_FRAME_SIZE:
+            frame += b"\x00" * (DISCORD_FRAME_SIZE - len(frame))
+        packets.append(encoder.encode(frame, OPUS_FRAME_SAMPLES))
+    return packets
+
+def pack_opus_packets(packets: List[bytes]) -> bytes:
+    """Serialize Opus packets for the audio cache"""
+    return b"".join(struct.pack(">H", len(packet)) + packet for packet in packets)
+
+def unpack_opus_packets(data: bytes) -> List[bytes]:
+    """Read back Opus packets written by pack_opus_packets"""
+    packets = []
+    offset = 0
+    while offset + 2 <= len(data):
+        (length,) = struct.unpack_from(">H", data, offset)
+        packets.append(data[offset + 2:offset + 2 + length])
+        offset += 2 + length
+    return packets
+
+
+class SpeechAudio:
+    def __init__(self, pcm: bytes, sample_rate: int, channels: int = 1, opus_packets: List[bytes] = None):
+        """
+        Synthesized speech held in memory as 16-bit PCM at the voice's native format
+
+        Once encoded for Discord the Opus packets are kept alongside, and audio
+        loaded from the cache may only have packets.
+
+        Args:
+            pcm: Interleaved 16-bit little-endian samples
+            sample_rate: Samples per second
+            channels: Number of interleaved channels
+            opus_packets: Pre-encoded 20 ms Opus packets of the same audio
+        """
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.opus_packets = opus_packets
+
+    def __bool__(self) -> bool:
+        return bool(self.pcm) or bool(self.opus_packets)
+
+    @property
+    def duration(self) -> float:
+        """Length of the audio in seconds"""
+        if not self.pcm and self.opus_packets:
+            return len(self.opus_packets) / 50
+        return len(self.pcm) / (self.sample_rate * self.channels * 2)
+
+    async def ensure_opus(self) -> bool:
+        """
+        Encode the audio to Opus once, on a worker thread
+
+        Returns:
+            True if Opus packets are available for playback
+        """
+        if self.opus_packets:
+            return True
+        if not self.pcm or _opus_available is False:
+            return False
+
+        loop = asyncio.get_running_loop()
+        self.opus_packets = await loop.run_in_executor(None, lambda: encode_opus_packets(self.to_discord_pcm()))
+        return bool(self.opus_packets)
+
+    def to_discord_pcm(self) -> bytes:
+        """Convert to 48 kHz stereo PCM for Discord"""
+        return resample_pcm(self.pcm, self.sample_rate, self.channels)
+
+    def to_wav(self) -> bytes:
+        """Encode as a WAV file in memory"""
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(self.channels)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(self.pcm)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_wav(cls, data: bytes) -> "SpeechAudio":
+        """Decode a 16-bit WAV file held in memory"""
+        with wave.open(io.BytesIO(data), "rb") as wav_file:
+            if wav_file.getsampwidth() != 2:
+                raise ValueError(f"Unsupported WAV sample width: {wav_file.getsampwidth()}")
+            return cls(wav_file.readframes(wav_file.getnframes()), wav_file.getframerate(), wav_file.getnchannels())
+
+    @classmethod
+    def from_encoded(cls, data: bytes, audio_format: str) -> "SpeechAudio":
+        """
+        Decode audio in any format pydub understands
+
+        WAV and cached Opus packets are read directly; other formats
+        (e.g. gTTS's MP3) need one ffmpeg run.
+        """
+        if audio_format == "wav":
+            return cls.from_wav(data)
+        if audio_format == OPUS_PACKETS_FORMAT:
+            return cls(b"", DISCORD_SAMPLE_RATE, DISCORD_CHANNELS, opus_packets=unpack_opus_packets(data))
+
+        from pydub import AudioSegment
+        segment = AudioSegment.from_file(io.BytesIO(data), format=audio_format).set_sample_width(2)
+        return cls(segment.raw_data, segment.frame_rate, segment.channels)
+
+    @classmethod
+    def from_file(cls, path: str) -> "SpeechAudio":
+        """Load an audio file into memory"""
+        with open(path, "rb") as f:
+            data = f.read()
+        extension = path.rsplit(".", 1)[-1].lower() if "." in path else "wav"
+        return cls.from_encoded(data, extension)
+
+
+class PCMBufferSource(discord.AudioSource):
+    def __init__(self, pcm: Union[bytes, Iterable[bytes]]):
+        """
+        An audio source that serves Discord PCM frames from memory
+
+        Args:
+            pcm: 48 kHz stereo 16-bit PCM, either as one buffer or as chunks from a synthesis stream
+        """
+        self.chunks: Iterator[bytes] = iter([pcm]) if isinstance(pcm, (bytes, bytearray, memoryview)) else iter(pcm)
+        self.pending = memoryview(b"")
+        self.exhausted = False
+
+    def read(self) -> bytes:
+        """Return the next 20 ms frame, or an empty bytes object when finished"""
+        while len(self.pending) < DISCORD_FRAME_SIZE and not self.exhausted:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.exhausted = True
+                break
+            # Only copy when a frame straddles two chunks
+            self.pending = memoryview(bytes(self.pending) + bytes(chunk)) if self.pending else memoryview(chunk)
+
+        if not self.pending:
+            return b""
+
+        frame = self.pending[:DISCORD_FRAME_SIZE]
+        self.pending = self.pending[DISCORD_FRAME_SIZE:]
+        if len(frame) < DISCORD_FRAME_SIZE:
+            # Pad the final partial frame with silence
+            return bytes(frame) + b"\x00" * (DISCORD_FRAME_SIZE - len(frame))
+        return bytes(frame)
+
+    def is_opus(self) -> bool:
+        return False
+
+
+class OpusPacketSource(discord.AudioSource):
+    def __init__(self, packets: List[bytes]):
+        """
+        An audio source that hands pre-encoded Opus packets straight to Discord
+
+        Args:
+            packets: One Opus packet per 20 ms frame
+        """
+        self.packets = iter(packets)
+
+    def read(self) -> bytes:
+        """Return the next packet, or an empty bytes object when finished"""
+        return next(self.packets, b"")
+
+    def is_opus(self) -> bool:
+        return True
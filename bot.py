@@ -6,56 +6,110 @@ import os
 import re
 import time
 import datetime
+import functools
 from discord.ext import commands
-from typing import Dict, Optional, List, Tuple, Union, Any
+from typing import Dict, Optional, List, Tuple, Union, Any, Callable
 
 from transcription import Transcriber
 from ai_integration import GeminiAPI
-from tts import GoogleTTS
-from utils import create_temp_file, cleanup_temp_file, capture_screenshot, analyze_image_with_vision_model, detect_content_type, analyze_conversation_intent
+from tts_router import TTSRouter
+from audio import SpeechAudio
+from playback import PlaybackQueue
+from text_streaming import StreamingMessage
+from voice_pipeline import GuildVoiceSession
+from speech_pipeline import SentencePipeline
+from memory import LongTermMemory
+from frames import Frame, FrameRingBuffer
+from vision_cache import VisionCache
+from vision_scheduler import VisionScheduler
+from commentary_pipeline import CommentaryJob, CommentaryPipeline
+import vision_preprocess
+import chess_engine
+from chess_vision import ChessBoardReader
+from youtube_context import YouTubeContextCache
+from llm_scheduler import LLMRequestExpired
+from utils import capture_screenshot, analyze_image_with_vision_model, detect_content_type, analyze_conversation_intent, VISION_FALLBACK_RESPONSES
 from config import (
     COMMAND_PREFIX, SYSTEM_PROMPT, VISION_SYSTEM_PROMPT, DM_SYSTEM_PROMPT, 
     TEXT_CHANNEL_SYSTEM_PROMPT, YOUTUBE_SYSTEM_PROMPT, CHESS_SYSTEM_PROMPT, 
     CHECKERS_SYSTEM_PROMPT, GEOGUESSER_SYSTEM_PROMPT, VISION_ENABLED, 
-    VISION_CONVERSATION_THRESHOLD, SCREENSHOT_INTERVAL, YOUTUBE_DETECTION_ENABLED, 
-    BOARD_GAMES_DETECTION_ENABLED, GEOGUESSER_DETECTION_ENABLED, CHESS_ANALYSIS_DEPTH, 
+    VISION_CONVERSATION_THRESHOLD, YOUTUBE_DETECTION_ENABLED, 
+    BOARD_GAMES_DETECTION_ENABLED, GEOGUESSER_DETECTION_ENABLED, CHESS_ANALYSIS_DEPTH, CHESS_LOCAL_ANALYSIS,
     PROACTIVE_COMMENTARY, INTENT_ANALYSIS_ENABLED, INTENT_CONFIDENCE_THRESHOLD,
-    TEXT_ENABLED, MESSAGE_HISTORY_LIMIT, TEXT_COOLDOWN_SECONDS
+    TEXT_ENABLED, MESSAGE_HISTORY_LIMIT, TEXT_COOLDOWN_SECONDS, TEXT_STREAMING_ENABLED,
+    TEXT_MESSAGE_LIMIT, SHARD_STATUS_INTERVAL, MEMORY_ENABLED, TTS_CACHE_ENABLED,
+    TTS_PREWARM_PHRASES, JOIN_GREETING, VISION_CACHE_ENABLED, VISION_TEMPORAL_ENABLED, VISION_KEYFRAMES,
+    VISION_KEYFRAME_WINDOW, YOUTUBE_CONTEXT_ENABLED
 )
 
 logger = logging.getLogger(__name__)
 
+# Phrases asking about what changed on screen, answered from several recent frames
+CHANGE_KEYWORDS = [
+    "just happened", "what happened", "what changed", "just did", "did they just", "did he just",
+    "did she just", "just moved", "last move", "what move was that", "just now", "a second ago",
+    "missed that", "what did i miss"
+]
+
 class RupertBot:
-    def __init__(self, token: str):
-        """Initialize the Discord bot with necessary components and settings"""
+    def __init__(self, token: str, shard_ids: Optional[List[int]] = None, shard_count: Optional[int] = None,
+                 status_reporter: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Initialize the Discord bot with necessary components and settings
+        
+        Args:
+            token: Discord bot token
+            shard_ids: Gateway shards this process should connect (None for an unsharded bot)
+            shard_count: Total number of shards across all processes
+            status_reporter: Optional callback that receives periodic status updates
+        """
         self.token = token
+        self.shard_ids = shard_ids
+        self.status_reporter = status_reporter
+        self.status_task: Optional[asyncio.Task] = None
         
         # Set up Discord bot with required intents
         intents = discord.Intents.default()
         intents.message_content = True
         intents.voice_states = True
         
-        self.bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+        if shard_ids is not None:
+            # Only connect the shards assigned to this process
+            self.bot = commands.AutoShardedBot(
+                command_prefix=COMMAND_PREFIX, intents=intents,
+                shard_ids=shard_ids, shard_count=shard_count
+            )
+        else:
+            self.bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
         
         # Initialize components
         self.transcriber = Transcriber()
         self.ai_api = GeminiAPI()  # Using Gemini API instead of Ollama
-        self.tts = GoogleTTS()
+        self.tts = TTSRouter()
+        self.tts_prewarmed = False
         
         # Voice client tracking
         self.voice_clients: Dict[int, discord.VoiceClient] = {}
+        self.voice_sessions: Dict[int, GuildVoiceSession] = {}  # Guild ID -> Voice pipeline
+        self.playback_queues: Dict[int, PlaybackQueue] = {}  # Guild ID -> Playback queue owning the voice client
         
         # Speaker tracking (mapping user IDs to usernames)
         self.speakers = {}
         
         # Screenshare tracking
         self.screenshare_users: Dict[int, discord.Member] = {}  # Guild ID -> Member
-        self.last_screenshot: Dict[int, str] = {}  # Guild ID -> Screenshot path
-        self.screenshot_interval = SCREENSHOT_INTERVAL  # Seconds between screenshots
-        self.vision_tasks: Dict[int, asyncio.Task] = {}  # Guild ID -> Screenshot task
+        self.last_screenshot: Dict[int, Frame] = {}  # Guild ID -> Latest screenshare frame
+        self.frame_buffers: Dict[int, FrameRingBuffer] = {}  # Guild ID -> Recent screenshare frames
+        self.vision_scheduler = VisionScheduler(self.capture_screenshare_frame)  # Samples every guild's screenshare
+        self.commentary_state: Dict[int, Dict[str, Any]] = {}  # Guild ID -> When and what was last commented on
+        self.commentary = CommentaryPipeline(self.plan_comment, self.write_comment, self.say_comment)  # Decide, analyse and speak stages
+        self.vision_cache = VisionCache() if VISION_CACHE_ENABLED else None
+        self.chess_readers: Dict[int, ChessBoardReader] = {}  # Guild ID -> Board reader following the game
+        self.youtube_contexts = YouTubeContextCache() if YOUTUBE_CONTEXT_ENABLED else None  # Titles and earlier comments per video
         
         # Conversation context tracking
         self.conversation_history: Dict[int, List[Dict]] = {}  # Guild ID -> Conversation history
+        self.memory = LongTermMemory() if MEMORY_ENABLED else None  # Older turns, recalled by relevance
         
         # Set up event handlers
         self.setup_events()
@@ -69,6 +123,15 @@ class RupertBot:
         async def on_ready():
             logger.info(f"{self.bot.user} has connected to Discord!")
             await self.bot.change_presence(activity=discord.Game(name="Listening..."))
+            
+            # on_ready fires again after reconnects, only start one reporter
+            if self.status_reporter and self.status_task is None:
+                self.status_task = asyncio.create_task(self.report_status_periodically())
+            
+            # Synthesize the fixed phrases once so they play instantly later
+            if TTS_CACHE_ENABLED and not self.tts_prewarmed:
+                self.tts_prewarmed = True
+                asyncio.create_task(self.tts.prewarm(TTS_PREWARM_PHRASES))
         
         @self.bot.event
         async def on_voice_state_update(member, before, after):
@@ -81,11 +144,9 @@ class RupertBot:
                 logger.info(f"User {member.display_name} started screensharing")
                 self.screenshare_users[member.guild.id] = member
                 
-                # Start screenshot capture task if vision is enabled
+                # Start sampling the screenshare if vision is enabled
                 if VISION_ENABLED and member.guild.id in self.voice_clients:
-                    self.vision_tasks[member.guild.id] = asyncio.create_task(
-                        self.capture_screenshare_periodically(member.guild.id, member)
-                    )
+                    self.vision_scheduler.watch(member.guild.id)
             
             # Check if the user stopped screensharing
             elif before.self_stream and not after.self_stream:
@@ -93,10 +154,8 @@ class RupertBot:
                 if member.guild.id in self.screenshare_users and self.screenshare_users[member.guild.id].id == member.id:
                     del self.screenshare_users[member.guild.id]
                     
-                    # Cancel screenshot task if it exists
-                    if member.guild.id in self.vision_tasks:
-                        self.vision_tasks[member.guild.id].cancel()
-                        del self.vision_tasks[member.guild.id]
+                    # Stop sampling the screenshare
+                    self.vision_scheduler.unwatch(member.guild.id)
     
     def register_commands(self):
         """Register bot commands"""
@@ -125,9 +184,8 @@ class RupertBot:
                 await ctx.send(f"Joined {channel.name}!")
                 
                 # Test TTS
-                test_message = "Hello! I'm Rupert and I'm ready to chat!"
-                audio_file = await self.tts.text_to_speech(test_message)
-                await self.play_audio_response(voice_client, audio_file)
+                greeting = await self.synthesize_speech(JOIN_GREETING)
+                self.get_playback_queue(voice_client).enqueue(greeting)
                 
                 # Check if someone is already screensharing
                 for member in channel.members:
@@ -135,9 +193,7 @@ class RupertBot:
                         logger.info(f"Found active screenshare from {member.display_name}")
                         self.screenshare_users[guild_id] = member
                         if VISION_ENABLED:
-                            self.vision_tasks[guild_id] = asyncio.create_task(
-                                self.capture_screenshare_periodically(guild_id, member)
-                            )
+                            self.vision_scheduler.watch(guild_id)
                         break
                 
                 # Start listening and transcribing voice
@@ -153,6 +209,13 @@ class RupertBot:
             guild_id = ctx.guild.id
             if guild_id in self.voice_clients:
                 voice_client = self.voice_clients[guild_id]
+                
+                # Stop the voice pipeline and playback before disconnecting
+                if guild_id in self.voice_sessions:
+                    await self.voice_sessions.pop(guild_id).stop()
+                if guild_id in self.playback_queues:
+                    await self.playback_queues.pop(guild_id).close()
+                
                 await voice_client.disconnect()
                 del self.voice_clients[guild_id]
                 
@@ -160,19 +223,27 @@ class RupertBot:
                 if guild_id in self.conversation_history:
                     del self.conversation_history[guild_id]
                 
+                # Long-term memory outlives the session, make sure it is on disk
+                if self.memory:
+                    self.memory.save_in_background(guild_id)
+                
                 # Clean up screenshare tracking
                 if guild_id in self.screenshare_users:
                     del self.screenshare_users[guild_id]
                 
-                # Cancel screenshot task if it exists
-                if guild_id in self.vision_tasks:
-                    self.vision_tasks[guild_id].cancel()
-                    del self.vision_tasks[guild_id]
+                # Stop sampling the screenshare
+                self.vision_scheduler.unwatch(guild_id)
                 
-                # Clean up last screenshot if exists
-                if guild_id in self.last_screenshot and os.path.exists(self.last_screenshot[guild_id]):
-                    cleanup_temp_file(self.last_screenshot[guild_id])
-                    del self.last_screenshot[guild_id]
+                # Drop the frames kept for this guild
+                self.last_screenshot.pop(guild_id, None)
+                self.frame_buffers.pop(guild_id, None)
+                self.commentary_state.pop(guild_id, None)
+                self.commentary.stop(guild_id)
+                self.chess_readers.pop(guild_id, None)
+                if self.youtube_contexts:
+                    self.youtube_contexts.forget(guild_id)
+                if self.vision_cache:
+                    self.vision_cache.forget(guild_id)
                 
                 await ctx.send("Left the voice channel!")
             else:
@@ -190,24 +261,65 @@ class RupertBot:
         # Setup the voice receiver and start listening
         voice_client.listen(discord.WaveSink("./temp_audio"))
         
-        while voice_client.is_connected():
-            # Process audio data and detect speakers
-            if hasattr(voice_client, 'voice_data'):
-                for user_id, audio_data in voice_client.voice_data.items():
-                    if user_id in self.speakers:
-                        # Transcribe the audio
-                        transcript = await self.transcriber.transcribe_async(audio_data)
-                        if transcript:
-                            speaker = self.speakers.get(user_id, "Unknown User")
-                            logger.info(f"{speaker}: {transcript}")
-                            
-                            # Add to conversation history
-                            self.add_to_conversation_history(guild.id, speaker, transcript)
-                            
-                            # Analyze if the user is talking to Rupert vs. about Rupert
-                            await self.analyze_and_respond(voice_client, guild.id, user_id, speaker, transcript)
-            
-            await asyncio.sleep(0.5)
+        # Run ingest, transcription, decisions, replies and playback as separate
+        # stages so one long answer never stops us hearing everyone else
+        playback_queue = self.get_playback_queue(voice_client)
+        session = GuildVoiceSession(
+            guild.id,
+            voice_client,
+            poll_audio=functools.partial(self.collect_voice_audio, voice_client),
+            transcribe=self.transcriber.transcribe_async,
+            decide=functools.partial(self.decide_voice_response, voice_client, guild.id),
+            play=functools.partial(self.play_speech, voice_client),
+            release_audio=self.release_speech,
+            is_speaking=playback_queue.is_busy,
+            stop_speaking=playback_queue.clear
+        )
+        self.voice_sessions[guild.id] = session
+        
+        try:
+            await session.run()
+        finally:
+            if self.voice_sessions.get(guild.id) is session:
+                del self.voice_sessions[guild.id]
+    
+    def collect_voice_audio(self, voice_client) -> List[Tuple[int, bytes]]:
+        """Take the audio captured for each known speaker since the last poll"""
+        if not hasattr(voice_client, 'voice_data'):
+            return []
+        
+        captured = []
+        for user_id in list(voice_client.voice_data.keys()):
+            if user_id in self.speakers:
+                captured.append((user_id, voice_client.voice_data.pop(user_id)))
+        return captured
+    
+    async def decide_voice_response(self, voice_client, guild_id: int, user_id: int, transcript: str):
+        """
+        Record a transcript and decide how Rupert should reply to it
+        
+        Args:
+            voice_client: The voice client for the guild
+            guild_id: The guild the transcript came from
+            user_id: The speaking user's ID
+            transcript: What the user said
+            
+        Returns:
+            A coroutine function that produces the reply, or None if Rupert should stay quiet
+        """
+        speaker = self.speakers.get(user_id, "Unknown User")
+        logger.info(f"{speaker}: {transcript}")
+        
+        # Add to conversation history
+        self.add_to_conversation_history(guild_id, speaker, transcript)
+        
+        # Analyze if the user is talking to Rupert vs. about Rupert
+        action = await self.decide_response(voice_client, guild_id, user_id, speaker, transcript)
+        if action == "vision":
+            return functools.partial(self.handle_vision_interaction, voice_client, guild_id, speaker, transcript)
+        if action == "chat":
+            return functools.partial(self.handle_rupert_interaction, voice_client, speaker, transcript)
+        return None
     
     def add_to_conversation_history(self, guild_id: int, speaker: str, transcript: str):
         """Add a message to the conversation history"""
@@ -224,9 +336,37 @@ class RupertBot:
         # Keep only the last 10 messages for context
         if len(self.conversation_history[guild_id]) > 10:
             self.conversation_history[guild_id] = self.conversation_history[guild_id][-10:]
+        
+        # Everything is kept in long-term memory for later recall
+        if self.memory:
+            self.memory.remember(guild_id, speaker, transcript)
+    
+    def get_relevant_memories(self, scope, query: str, recent_context: str = "") -> str:
+        """
+        Get long-term memories relevant to a query, formatted for a prompt
+        
+        Args:
+            scope: Guild ID, or "dm_<user id>" for direct messages
+            query: The message being responded to
+            recent_context: Recent history already in the prompt, which is not repeated
+            
+        Returns:
+            Formatted memories, or an empty string if none are relevant
+        """
+        if not self.memory:
+            return ""
+        
+        # Skip anything the prompt already contains
+        recent_messages = [line.split(": ", 1)[-1] for line in recent_context.split("\n") if line]
+        return self.memory.format_recalled(scope, query, exclude=recent_messages)
     
-    async def analyze_and_respond(self, voice_client, guild_id: int, user_id: int, speaker: str, transcript: str):
-        """Analyze the transcript and respond if appropriate"""
+    async def decide_response(self, voice_client, guild_id: int, user_id: int, speaker: str, transcript: str) -> Optional[str]:
+        """
+        Decide whether and how to respond to a transcript
+        
+        Returns:
+            "vision" for a screenshare question, "chat" for a normal reply, or None to stay quiet
+        """
         # Get conversation context for better analysis
         context = self.get_recent_conversation_context(guild_id)
         
@@ -301,12 +441,13 @@ class RupertBot:
         if should_respond:
             # Check if this is related to a screenshare that needs visual analysis
             if VISION_ENABLED and self.is_asking_about_screen(transcript, guild_id):
-                await self.handle_vision_interaction(voice_client, guild_id, speaker, transcript)
-            else:
-                # Normal Rupert interaction
-                await self.handle_rupert_interaction(voice_client, speaker, transcript)
+                return "vision"
+            # Normal Rupert interaction
+            return "chat"
         elif contains_rupert:
             logger.info(f"Detected mention of Rupert but not addressing Rupert directly (confidence: {confidence})")
+        
+        return None
     
     def get_recent_conversation_context(self, guild_id: int) -> str:
         """Get recent conversation context as a string"""
@@ -340,11 +481,12 @@ class RupertBot:
             "what's happening", "what is happening", "what's this video", "what game is this",
             "what are they talking about", "who is this", "what am i watching"
         ]
+        vision_keywords.extend(CHANGE_KEYWORDS)
         
         # Get content type from last screenshot if available
         current_content_type = "unknown"
-        if guild_id in self.last_screenshot and os.path.exists(self.last_screenshot[guild_id]):
-            current_content_type = detect_content_type(self.last_screenshot[guild_id])
+        if guild_id in self.last_screenshot:
+            current_content_type = self.classify_frame(guild_id, self.last_screenshot[guild_id])
             
         # Add content-specific keywords based on detected content
         if current_content_type == "geoguesser":
@@ -368,157 +510,261 @@ class RupertBot:
                 
         return False
     
-    async def capture_screenshare_periodically(self, guild_id: int, member: discord.Member):
-        """Continuously capture screenshots of a user's screenshare at regular intervals"""
-        try:
-            logger.info(f"Starting periodic screenshot capture for {member.display_name}")
-            
-            # Keep track of when we last made a comment about each content type
-            last_content_comment = {}
+    def is_asking_about_change(self, transcript: str) -> bool:
+        """Determine if the user is asking about what just happened rather than what is on screen now"""
+        lower_transcript = transcript.lower()
+        return any(keyword in lower_transcript for keyword in CHANGE_KEYWORDS)
+    
+    async def capture_screenshare_frame(self, guild_id: int) -> Optional[bool]:
+        """
+        Capture one frame of a guild's screenshare and pass it on for commentary if it shows something new
+        
+        Called by the vision scheduler, which decides when the next capture happens.
+        
+        Returns:
+            Whether the screen changed, or None if nothing was captured
+        """
+        member = self.screenshare_users.get(guild_id)
+        if guild_id not in self.voice_clients or member is None:
+            self.vision_scheduler.unwatch(guild_id)
+            return None
+        
+        # Make sure bot is fully initialized
+        voice_channel = member.voice.channel if member.voice else None
+        if not self.bot.user or not voice_channel:
+            return None
+        
+        frame = await capture_screenshot(self.bot, voice_channel.id)
+        if not frame:
+            return None
+        
+        # Hash off the event loop, decoding a full-size frame takes a while
+        await asyncio.get_running_loop().run_in_executor(None, frame.perceptual_hash)
+        
+        # Keep the new frame even if it looks unchanged, so the latest one is always fresh
+        is_new = self.get_frame_buffer(guild_id).append(frame)
+        # Classify off the loop too, duplicates just take the type of the frame they match
+        await asyncio.get_running_loop().run_in_executor(None, self.classify_frame, guild_id, frame)
+        self.last_screenshot[guild_id] = frame
+        if is_new:
+            logger.info(f"Updated screenshot for {member.display_name}")
+            # Read every new board, the reader works out whose turn it is from the moves it sees
+            if frame.content_type == "chess" and CHESS_LOCAL_ANALYSIS and BOARD_GAMES_DETECTION_ENABLED:
+                await asyncio.get_running_loop().run_in_executor(None, self.get_chess_reader(guild_id).read, frame)
+            # Notice when the video changes, its title is only read once
+            elif frame.content_type == "youtube" and self.youtube_contexts:
+                await asyncio.get_running_loop().run_in_executor(None, self.youtube_contexts.update, guild_id, frame)
+        else:
+            logger.debug(f"Screen of {member.display_name} unchanged, skipping analysis")
+        
+        # Commentary runs in its own stages, so the next capture never waits for the LLM
+        if PROACTIVE_COMMENTARY and is_new:
+            self.commentary.submit(guild_id, frame)
+        return is_new
+    
+    def comment_due(self, guild_id: int, content_type: str) -> bool:
+        """
+        Whether it is time for another proactive comment about a content type
+        
+        At least 60 seconds since the last comment of any type, counting comments
+        still being written, and either the content type changed or it's been at
+        least 3 minutes since the last comment on it.
+        """
+        state = self.commentary_state.setdefault(guild_id, {
+            "last_comment_time": 0, "last_attempt_time": 0, "last_content_type": None, "last_content_comment": {}
+        })
+        current_time = time.time()
+        return (
+            current_time - max(state["last_comment_time"], state["last_attempt_time"]) >= 60 and
+            content_type is not None and
+            (
+                content_type != state["last_content_type"] or  # Content changed
+                content_type not in state["last_content_comment"] or  # Never commented on this type
+                current_time - state["last_content_comment"].get(content_type, 0) >= 180  # 3 minutes since last comment
+            )
+        )
+    
+    async def plan_comment(self, guild_id: int, frame: Frame) -> Optional[Dict[str, Any]]:
+        """
+        Decide stage of proactive commentary: whether a new frame is worth a comment, and how to ask for it
+        
+        Returns:
+            The content type, prompts and upload size for the analyse stage, or None to skip the frame
+        """
+        voice_client = self.voice_clients.get(guild_id)
+        if not voice_client or self.get_playback_queue(voice_client).is_busy():  # Only if we're not already speaking
+            return None
+        
+        content_type = self.classify_frame(guild_id, frame)
+        if not self.comment_due(guild_id, content_type):
+            return None
+        
+        plan: Dict[str, Any] = {"content_type": content_type, "max_side": None, "video": None}
+        # Create an appropriate prompt based on content type
+        if content_type == "youtube" and YOUTUBE_DETECTION_ENABLED:
+            prompt = "What's happening in this YouTube video right now? Provide a brief, conversational commentary."
+            video = self.youtube_contexts.get(guild_id) if self.youtube_contexts else None
+            if video:
+                # What is already known goes as text, so a smaller frame is enough
+                prompt = f"{video.describe()}\n\n{prompt} Say something new rather than repeating earlier comments."
+                plan.update(video=video, max_side=video.image_side())
+            plan.update(prompt=prompt, system_prompt=YOUTUBE_SYSTEM_PROMPT)
+        elif content_type == "chess" and BOARD_GAMES_DETECTION_ENABLED:
+            plan.update(prompt="What's the current state of this chess game? Analyze the position and suggest a good move.",
+                        system_prompt=CHESS_SYSTEM_PROMPT)
+        elif content_type == "checkers" and BOARD_GAMES_DETECTION_ENABLED:
+            plan.update(prompt="What's the current state of this checkers game? Analyze the position and suggest a good move.",
+                        system_prompt=CHECKERS_SYSTEM_PROMPT)
+        elif content_type == "geoguesser" and GEOGUESSER_DETECTION_ENABLED:
+            # Create detailed prompts for GeoGuessr to make better proactive comments
+            prompt_variations = [
+                "Based on the visual clues in this GeoGuesser scene (architecture, vegetation, signage, road markings), where do you think this location is?",
+                "I notice some interesting features in this GeoGuesser location. Can you identify what country this might be based on the visual elements?",
+                "There are some distinctive characteristics in this GeoGuesser scene. What region of the world does this appear to be, and what are the key clues?",
+                "This GeoGuesser location has specific geographical markers. What continent and country do you think this is, and what evidence supports your analysis?",
+                "Looking at this GeoGuessr image, what stands out to you as location-specific identifiers and where might this place be?"
+            ]
             
-            # For proactive commentary, track time of last comment and content type
-            last_comment_time = 0
-            last_content_type = None
+            # Choose a random variation to keep commentary fresh
+            import random
+            plan.update(prompt=random.choice(prompt_variations), system_prompt=GEOGUESSER_SYSTEM_PROMPT)
+        else:
+            # Skip commentary for unknown content
+            return None
+        return plan
+    
+    async def write_comment(self, job: CommentaryJob) -> Optional[str]:
+        """
+        Analyse stage of proactive commentary: ask the engine or the vision model for the comment
+        
+        Returns:
+            The comment, or None if it is no longer due, over the vision budget or the LLM was busy
+        """
+        plan = job.plan
+        content_type = plan["content_type"]
+        # A newer job may have been queued while the last comment was being written
+        if not self.comment_due(job.guild_id, content_type):
+            return None
+        self.commentary_state[job.guild_id]["last_attempt_time"] = time.time()
+        
+        try:
+            if content_type == "chess":
+                analysis = await self.analyse_chess(job.guild_id, job.frame)
+                if analysis:
+                    # The engine did the looking, a text model only has to say it
+                    prompt = f"{analysis}\n\nGive a brief, conversational comment on this chess game based on the analysis above."
+                    return await self.ai_api.generate_response(prompt, plan["system_prompt"], priority="proactive")
             
-            while guild_id in self.voice_clients and guild_id in self.screenshare_users:
-                # Capture the screenshot
-                if self.bot.user:  # Make sure bot is fully initialized
-                    voice_channel = member.voice.channel if member.voice else None
-                    if voice_channel:
-                        screenshot_path = await capture_screenshot(self.bot, voice_channel.id)
-                        
-                        if screenshot_path:
-                            # Clean up previous screenshot if it exists
-                            if guild_id in self.last_screenshot and os.path.exists(self.last_screenshot[guild_id]):
-                                cleanup_temp_file(self.last_screenshot[guild_id])
-                                
-                            # Store the new screenshot path
-                            self.last_screenshot[guild_id] = screenshot_path
-                            logger.info(f"Updated screenshot for {member.display_name}")
-                            
-                            # If proactive commentary is enabled, analyze the content and potentially comment
-                            if PROACTIVE_COMMENTARY:
-                                voice_client = self.voice_clients.get(guild_id)
-                                if voice_client and not voice_client.is_playing():  # Only if we're not already speaking
-                                    try:
-                                        # Detect content type
-                                        content_type = detect_content_type(screenshot_path)
-                                        
-                                        current_time = time.time()
-                                        # Decide if we should make a comment based on several factors:
-                                        # 1. At least 60 seconds since last comment of any type
-                                        # 2. Content type is recognized (not None)
-                                        # 3. Either the content type changed OR it's been at least 3 minutes since 
-                                        #    we last commented on this specific content type
-                                        should_comment = (
-                                            current_time - last_comment_time >= 60 and  # At least 60 seconds between any comments
-                                            content_type is not None and
-                                            (
-                                                content_type != last_content_type or  # Content changed
-                                                content_type not in last_content_comment or  # Never commented on this type
-                                                current_time - last_content_comment.get(content_type, 0) >= 180  # 3 minutes since last comment
-                                            )
-                                        )
-                                        
-                                        if should_comment:
-                                            # Create an appropriate prompt based on content type
-                                            if content_type == "youtube" and YOUTUBE_DETECTION_ENABLED:
-                                                prompt = "What's happening in this YouTube video right now? Provide a brief, conversational commentary."
-                                                system_prompt = YOUTUBE_SYSTEM_PROMPT
-                                            elif content_type == "chess" and BOARD_GAMES_DETECTION_ENABLED:
-                                                prompt = "What's the current state of this chess game? Analyze the position and suggest a good move."
-                                                system_prompt = CHESS_SYSTEM_PROMPT
-                                            elif content_type == "checkers" and BOARD_GAMES_DETECTION_ENABLED:
-                                                prompt = "What's the current state of this checkers game? Analyze the position and suggest a good move."
-                                                system_prompt = CHECKERS_SYSTEM_PROMPT
-                                            elif content_type == "geoguesser" and GEOGUESSER_DETECTION_ENABLED:
-                                                # Create detailed prompts for GeoGuessr to make better proactive comments
-                                                prompt_variations = [
-                                                    "Based on the visual clues in this GeoGuesser scene (architecture, vegetation, signage, road markings), where do you think this location is?",
-                                                    "I notice some interesting features in this GeoGuesser location. Can you identify what country this might be based on the visual elements?",
-                                                    "There are some distinctive characteristics in this GeoGuesser scene. What region of the world does this appear to be, and what are the key clues?",
-                                                    "This GeoGuesser location has specific geographical markers. What continent and country do you think this is, and what evidence supports your analysis?",
-                                                    "Looking at this GeoGuessr image, what stands out to you as location-specific identifiers and where might this place be?"
-                                                ]
-                                                
-                                                # Choose a random variation to keep commentary fresh
-                                                import random
-                                                prompt = random.choice(prompt_variations)
-                                                system_prompt = GEOGUESSER_SYSTEM_PROMPT
-                                            else:
-                                                # Skip commentary for unknown content
-                                                should_comment = False
-                                            
-                                            if should_comment:
-                                                # Generate and speak a proactive comment
-                                                response = await analyze_image_with_vision_model(
-                                                    screenshot_path,
-                                                    prompt,
-                                                    self.ai_api,
-                                                    content_type
-                                                )
-                                                
-                                                # Convert to speech and play
-                                                audio_file = await self.tts.text_to_speech(response)
-                                                await self.play_audio_response(voice_client, audio_file)
-                                                
-                                                # Update tracking variables
-                                                last_comment_time = current_time
-                                                last_content_type = content_type
-                                                last_content_comment[content_type] = current_time
-                                                
-                                                logger.info(f"Made proactive comment about {content_type}")
-                                    except Exception as e:
-                                        logger.error(f"Error in proactive commentary: {e}")
-                
-                # Wait before taking the next screenshot
-                await asyncio.sleep(SCREENSHOT_INTERVAL)
-                
-        except asyncio.CancelledError:
-            logger.info(f"Screenshot capture task for {member.display_name} was cancelled")
-        except Exception as e:
-            logger.error(f"Error in screenshot capture task: {e}")
+            response = await self.analyze_frame(
+                job.guild_id,
+                job.frame,
+                plan["prompt"],
+                plan["prompt"],
+                content_type,
+                priority="proactive",
+                max_side=plan["max_side"]
+            )
+            if response is None:
+                # The shared vision budget is kept for questions people are waiting on
+                logger.info("Skipped proactive comment, over the vision call budget")
+                return None
+            return response if response not in VISION_FALLBACK_RESPONSES else None
+        except LLMRequestExpired:
+            logger.info("Skipped proactive comment, the LLM was busy with more urgent work")
+            return None
     
+    async def say_comment(self, job: CommentaryJob) -> bool:
+        """
+        Speak stage of proactive commentary: speak a finished comment unless someone else is talking
+        
+        Returns:
+            True if the comment was queued for playback
+        """
+        voice_client = self.voice_clients.get(job.guild_id)
+        if not voice_client or self.get_playback_queue(voice_client).is_busy():
+            logger.info("Dropped proactive comment, already speaking")
+            return False
+        
+        await self.speak(voice_client, job.text, priority="commentary")
+        content_type = job.plan["content_type"]
+        if job.plan["video"]:
+            job.plan["video"].add_comment(job.text)
+        
+        # Update tracking variables
+        current_time = time.time()
+        state = self.commentary_state[job.guild_id]
+        state["last_comment_time"] = current_time
+        state["last_content_type"] = content_type
+        state["last_content_comment"][content_type] = current_time
+        
+        logger.info(f"Made proactive comment about {content_type}")
+        return True
+
     async def handle_vision_interaction(self, voice_client, guild_id: int, speaker: str, transcript: str):
         """Handle an interaction that requires analysis of a screenshare"""
         logger.info(f"Detected vision interaction from {speaker}: {transcript}")
         
         try:
             # Check if we have a recent screenshot
-            if guild_id not in self.last_screenshot or not os.path.exists(self.last_screenshot[guild_id]):
+            if guild_id not in self.last_screenshot:
                 # Try to capture a screenshot now
                 member = self.screenshare_users.get(guild_id)
                 if not member or not member.voice or not member.voice.channel:
                     # No valid screenshare to analyze
                     ai_response = "I don't see anyone sharing their screen right now."
                 else:
-                    screenshot_path = await capture_screenshot(self.bot, member.voice.channel.id)
-                    if screenshot_path:
-                        self.last_screenshot[guild_id] = screenshot_path
+                    frame = await capture_screenshot(self.bot, member.voice.channel.id)
+                    if frame:
+                        self.get_frame_buffer(guild_id).append(frame)
+                        self.last_screenshot[guild_id] = frame
                     else:
                         # Could not capture screenshot
                         ai_response = "I'm having trouble seeing what's on the screen right now."
                         
                         # Skip to TTS and playback
-                        audio_file = await self.tts.text_to_speech(ai_response)
-                        await self.play_audio_response(voice_client, audio_file)
+                        await self.speak(voice_client, ai_response)
                         return
             
             # We have a screenshot, now detect what kind of content it shows
-            screenshot_path = self.last_screenshot[guild_id]
-            content_type = detect_content_type(screenshot_path)
+            frame = self.last_screenshot[guild_id]
+            content_type = self.classify_frame(guild_id, frame)
             logger.info(f"Detected content type in screenshare: {content_type}")
             
             # Clean and prepare the transcript
             clean_transcript = self.clean_transcript_for_prompt(transcript)
             
+            # Questions about what just happened get the recent scene changes in the same request
+            keyframes = None
+            if VISION_TEMPORAL_ENABLED and self.is_asking_about_change(clean_transcript):
+                window = self.get_frame_buffer(guild_id).keyframes(VISION_KEYFRAMES, VISION_KEYFRAME_WINDOW)
+                keyframes = [keyframe for keyframe in window if keyframe is not frame and keyframe.timestamp <= frame.timestamp]
+                logger.info(f"Sending {len(keyframes)} earlier keyframes with the question")
+            
             # Create an appropriate prompt based on content type
+            max_side = None
             if content_type == "youtube" and YOUTUBE_DETECTION_ENABLED:
-                vision_prompt = f"I'm watching a YouTube video. {speaker} asked: {clean_transcript}"
-                vision_prompt += " Please analyze the video content, title, channel, and current scene."
+                video = self.youtube_contexts.get(guild_id) if self.youtube_contexts else None
+                if video and video.known:
+                    vision_prompt = f"I'm watching a YouTube video.\n{video.describe()}\n\n{speaker} asked: {clean_transcript}"
+                    vision_prompt += " Please analyze the current scene, using what is already known about the video above."
+                    max_side = video.image_side()
+                else:
+                    vision_prompt = f"I'm watching a YouTube video. {speaker} asked: {clean_transcript}"
+                    vision_prompt += " Please analyze the video content, title, channel, and current scene."
                 system_prompt = YOUTUBE_SYSTEM_PROMPT
                 
             elif content_type == "chess" and BOARD_GAMES_DETECTION_ENABLED:
+                # The engine only sees the position now, moves that were just made need the earlier frames
+                analysis = None if keyframes else await self.analyse_chess(guild_id, frame)
+                if analysis:
+                    # Only the phrasing is left to the LLM, the engine already found the moves
+                    prompt = f"{analysis}\n\n{speaker} asked: {clean_transcript}\n"
+                    prompt += "Answer using the engine analysis above. Explain the best move and the expected line in plain words."
+                    ai_response = await self.ai_api.generate_response(prompt, CHESS_SYSTEM_PROMPT, priority="voice")
+                    logger.info(f"Chess engine response: {ai_response}")
+                    await self.speak(voice_client, ai_response)
+                    return
+                
                 vision_prompt = f"I'm looking at a chess board. {speaker} asked: {clean_transcript}"
                 vision_prompt += f" Please analyze the board position, suggest good moves, and evaluate the position. Look ahead {CHESS_ANALYSIS_DEPTH} moves if possible."
                 system_prompt = CHESS_SYSTEM_PROMPT
@@ -547,34 +793,37 @@ class RupertBot:
                 system_prompt = VISION_SYSTEM_PROMPT
             
             # Analyze the screenshot with the appropriate vision model and system prompt
-            ai_response = await analyze_image_with_vision_model(
-                screenshot_path, 
+            ai_response = await self.analyze_frame(
+                guild_id,
+                frame,
                 vision_prompt,
-                self.ai_api,
-                content_type
+                clean_transcript,
+                content_type,
+                keyframes=keyframes,
+                max_side=max_side
             )
             
             logger.info(f"Vision model response: {ai_response}")
             
             # Convert AI response to speech and play it
-            audio_file = await self.tts.text_to_speech(ai_response)
-            await self.play_audio_response(voice_client, audio_file)
+            await self.speak(voice_client, ai_response)
             
+        except LLMRequestExpired:
+            logger.info(f"Dropped stale vision response to {speaker}")
         except Exception as e:
             logger.error(f"Error handling vision interaction: {e}")
             
             # Send a fallback response
             try:
                 fallback = "I'm having trouble analyzing what's on the screen right now."
-                audio_file = await self.tts.text_to_speech(fallback)
-                await self.play_audio_response(voice_client, audio_file)
+                await self.speak(voice_client, fallback)
             except:
                 logger.error("Failed to send fallback vision response")
     
     def is_talking_to_rupert(self, transcript: str) -> bool:
         """
         LEGACY METHOD: Check if the transcript contains a mention of Rupert
-        This is now replaced by the more sophisticated analyze_and_respond method
+        This is now replaced by the more sophisticated decide_response method
         """
         return "rupert" in transcript.lower() or "ruppert" in transcript.lower()
     
@@ -596,56 +845,156 @@ class RupertBot:
             else:
                 full_prompt = prompt
             
+            # Add anything relevant from earlier conversations
+            memories = self.get_relevant_memories(guild_id, transcript, context)
+            if memories:
+                full_prompt = f"Things you remember from earlier conversations:\n{memories}\n\n{full_prompt}"
+            
             # Get AI response from Gemini
-            ai_response = await self.ai_api.generate_response(full_prompt)
+            ai_response = await self.ai_api.generate_response(full_prompt, priority="voice")
             logger.info(f"Gemini response: {ai_response}")
             
             # Add Rupert's response to conversation history
             self.add_to_conversation_history(guild_id, "Rupert", ai_response)
             
             # Convert AI response to speech and play it
-            audio_file = await self.tts.text_to_speech(ai_response)
-            await self.play_audio_response(voice_client, audio_file)
+            await self.speak(voice_client, ai_response)
             
+        except LLMRequestExpired:
+            logger.info(f"Dropped stale voice response to {speaker}")
         except Exception as e:
             logger.error(f"Error handling Rupert interaction: {e}")
     
-    async def play_audio_response(self, voice_client, audio_file: str):
-        """Play an audio file in the voice channel and clean up afterwards"""
-        if voice_client and voice_client.is_connected():
-            try:
-                # Create audio source
-                audio = discord.PCMVolumeTransformer(discord.AudioSource(audio_file))
-                audio.volume = 1.0
-                
-                def after_playing(error):
-                    if error:
-                        logger.error(f"Error in playback: {error}")
-                    try:
-                        cleanup_temp_file(audio_file)
-                    except Exception as e:
-                        logger.error(f"Error cleaning up audio file: {e}")
-                
-                # Play the audio with error handling
-                try:
-                    voice_client.play(audio, after=after_playing)
-                    
-                    # Wait for playback to complete with timeout
-                    start_time = time.time()
-                    while voice_client.is_playing():
-                        await asyncio.sleep(0.1)
-                        if time.time() - start_time > 30:  # 30 second timeout
-                            voice_client.stop()
-                            logger.warning("Audio playback timed out")
-                            break
-                except Exception as e:
-                    logger.error(f"Error during playback: {e}")
-                    if voice_client.is_playing():
-                        voice_client.stop()
-                    
-            except Exception as e:
-                logger.error(f"Error playing audio: {str(e)}")
-                cleanup_temp_file(audio_file)
+    async def speak(self, voice_client, text: str, priority: str = "reply"):
+        """
+        Speak a response, synthesizing it sentence by sentence
+        
+        Synthesis starts straight away and runs a few sentences ahead of
+        playback, so the first sentence can play while the rest is still
+        being synthesized.
+        """
+        if not text:
+            return
+        
+        pipeline = SentencePipeline(text, self.synthesize_speech)
+        pipeline.start()
+        await self.deliver_audio_response(voice_client, pipeline, priority)
+    
+    async def synthesize_speech(self, text: str) -> Optional[SpeechAudio]:
+        """Synthesize text and encode it to Opus ahead of playback, off the event loop"""
+        speech = await self.tts.synthesize(text)
+        if speech:
+            await speech.ensure_opus()
+        return speech
+    
+    async def deliver_audio_response(self, voice_client, audio: Union[SpeechAudio, SentencePipeline],
+                                     priority: str = "reply"):
+        """Hand a reply to the guild's playback stage, anything else goes straight to the playback queue"""
+        if not audio:
+            return
+        
+        guild_id = voice_client.guild.id if hasattr(voice_client, 'guild') else 0
+        session = self.voice_sessions.get(guild_id)
+        if session and priority == "reply":
+            session.enqueue_playback(audio)
+        else:
+            self.get_playback_queue(voice_client).enqueue(audio, priority)
+    
+    def get_playback_queue(self, voice_client) -> PlaybackQueue:
+        """Get the playback queue that owns a guild's voice client, creating it if needed"""
+        guild_id = voice_client.guild.id if hasattr(voice_client, 'guild') else 0
+        queue = self.playback_queues.get(guild_id)
+        if queue is None or queue.voice_client is not voice_client:
+            queue = PlaybackQueue(voice_client)
+            self.playback_queues[guild_id] = queue
+        return queue
+    
+    def get_frame_buffer(self, guild_id: int) -> FrameRingBuffer:
+        """Get the ring buffer of recent screenshare frames for a guild, creating it if needed"""
+        if guild_id not in self.frame_buffers:
+            self.frame_buffers[guild_id] = FrameRingBuffer()
+        return self.frame_buffers[guild_id]
+    
+    def get_chess_reader(self, guild_id: int) -> ChessBoardReader:
+        """Get the chess board reader for a guild, creating it if needed"""
+        if guild_id not in self.chess_readers:
+            self.chess_readers[guild_id] = ChessBoardReader()
+        return self.chess_readers[guild_id]
+    
+    async def analyse_chess(self, guild_id: int, frame: Frame) -> Optional[str]:
+        """
+        Read the board on a frame and search it with the local engine
+        
+        Returns:
+            The position and the engine's evaluation and best line for the LLM to
+            narrate, or None to fall back to the vision model
+        """
+        if not CHESS_LOCAL_ANALYSIS:
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+            fen = await loop.run_in_executor(None, self.get_chess_reader(guild_id).read, frame)
+            if fen is None:
+                logger.info("Couldn't read the chess board, asking the vision model instead")
+                return None
+            result = await loop.run_in_executor(None, chess_engine.analyse, fen)
+            logger.info(f"Chess engine: {fen} -> {result.best_move} ({result.score}) in {result.seconds:.2f}s")
+            return f"Position (FEN): {fen}\n{result.describe()}"
+        except Exception as e:
+            logger.error(f"Error analysing chess position: {e}")
+            return None
+    
+    def classify_frame(self, guild_id: int, frame: Frame) -> str:
+        """Detect what a frame shows, reusing the answer for a frame that looks unchanged"""
+        if frame.content_type is None:
+            buffer = self.get_frame_buffer(guild_id)
+            reference = buffer.reference
+            if reference is not None and reference is not frame and reference.content_type and buffer.is_duplicate(frame):
+                frame.content_type = reference.content_type
+            else:
+                frame.content_type = detect_content_type(frame)
+        return frame.content_type
+    
+    async def analyze_frame(self, guild_id: int, frame: Frame, prompt: str, question: str, content_type: str = None,
+                            priority: str = "voice", keyframes: List[Frame] = None,
+                            max_side: int = None) -> Optional[str]:
+        """
+        Ask the vision model about a frame, reusing a recent answer about the same screen when there is one
+        
+        Earlier keyframes go in the same request and bypass the cache, since the
+        answer depends on what came before the frame as well. The shared vision
+        budget is only charged when a request is actually sent.
+        
+        Returns:
+            The answer, or None if a proactive request was over the vision budget
+        """
+        def budget() -> bool:
+            if priority != "proactive":
+                # Questions always go through, but count towards the budget commentary has to respect
+                self.vision_scheduler.try_vision_call(force=True)
+                return True
+            return self.vision_scheduler.try_vision_call()
+        
+        if keyframes or self.vision_cache is None:
+            if not budget():
+                return None
+        if keyframes:
+            return await analyze_image_with_vision_model(frame, prompt, self.ai_api, content_type, priority=priority,
+                                                         keyframes=keyframes)
+        if self.vision_cache is None:
+            return await analyze_image_with_vision_model(frame, prompt, self.ai_api, content_type, priority=priority,
+                                                         max_side=max_side)
+        return await self.vision_cache.analyze(guild_id, frame, prompt, question, self.ai_api, content_type,
+                                               priority=priority, max_side=max_side, budget=budget)
+    
+    async def play_speech(self, voice_client, audio: Union[SpeechAudio, SentencePipeline]):
+        """Play a reply, cutting off less urgent speech such as commentary, and wait for it to finish"""
+        await self.get_playback_queue(voice_client).play(audio, "reply", preempt=True)
+    
+    def release_speech(self, audio: Union[SpeechAudio, SentencePipeline]):
+        """Discard audio that will never be played"""
+        if isinstance(audio, SentencePipeline):
+            audio.cancel()
     
     def clean_transcript_for_prompt(self, transcript: str) -> str:
         """Clean the transcript to make it a better prompt for Gemini"""
@@ -702,26 +1051,15 @@ class RupertBot:
             # Get message history for context
             context = await self.get_message_history(message.channel)
             
-            # Generate response appropriate to the channel type
-            response = None
+            # Generate and send a response appropriate to the channel type
             try:
                 if is_dm:
                     # This is a DM, handle it accordingly
-                    response = await self.handle_dm_message(message, context)
+                    await self.handle_dm_message(message, context)
                 else:
                     # This is a text channel message, check if we need to respond
                     if is_mentioned or (contains_rupert and await self.should_respond_to_text(message)):
-                        response = await self.handle_text_channel_message(message, context)
-                
-                # Send the response if we have one
-                if response:
-                    # Split long messages if needed
-                    if len(response) > 1900:  # Discord has a 2000 char limit
-                        chunks = [response[i:i+1900] for i in range(0, len(response), 1900)]
-                        for chunk in chunks:
-                            await message.channel.send(chunk)
-                    else:
-                        await message.channel.send(response)
+                        await self.handle_text_channel_message(message, context)
                         
             except Exception as e:
                 logger.error(f"Error handling message: {e}")
@@ -737,7 +1075,7 @@ class RupertBot:
             context: String containing message history
             
         Returns:
-            Response text to send back to the user
+            Response text that was sent back to the user
         """
         # Prepare prompt with DM-specific context
         prompt = (
@@ -749,8 +1087,18 @@ class RupertBot:
         if context:
             prompt += f"Recent conversation history:\n{context}\n\n"
         
+        # Add anything relevant from earlier conversations
+        memory_scope = f"dm_{message.author.id}"
+        memories = self.get_relevant_memories(memory_scope, message.content, context)
+        if memories:
+            prompt += f"Things you remember from earlier conversations with this user:\n{memories}\n\n"
+        
         # Send to Gemini with the DM system prompt
-        response = await self.ai_api.generate_response(prompt, DM_SYSTEM_PROMPT)
+        response = await self.send_text_response(message.channel, prompt, DM_SYSTEM_PROMPT, priority="dm")
+        
+        if self.memory:
+            self.memory.remember(memory_scope, message.author.display_name, message.content)
+            self.memory.remember(memory_scope, "Rupert", response)
         
         return response
     
@@ -763,7 +1111,7 @@ class RupertBot:
             context: String containing message history
             
         Returns:
-            Response text to send back to the user
+            Response text that was sent back to the channel
         """
         # Prepare prompt with text channel specific context
         guild_name = message.guild.name if message.guild else "Unknown Server"
@@ -781,8 +1129,52 @@ class RupertBot:
         if context:
             prompt += f"Recent conversation history in this channel:\n{context}\n\n"
         
+        # Add anything relevant from earlier conversations in this server
+        memory_scope = message.guild.id if message.guild else f"channel_{message.channel.id}"
+        memories = self.get_relevant_memories(memory_scope, message.content, context)
+        if memories:
+            prompt += f"Things you remember from earlier conversations in this server:\n{memories}\n\n"
+        
         # Send to Gemini with the text channel system prompt
-        response = await self.ai_api.generate_response(prompt, TEXT_CHANNEL_SYSTEM_PROMPT)
+        response = await self.send_text_response(message.channel, prompt, TEXT_CHANNEL_SYSTEM_PROMPT, priority="text")
+        
+        if self.memory:
+            self.memory.remember(memory_scope, message.author.display_name, message.content)
+            self.memory.remember(memory_scope, "Rupert", response)
+        
+        return response
+    
+    async def send_text_response(self, channel, prompt: str, system_prompt: str, priority: str = "text") -> str:
+        """
+        Generate a response and send it to a text channel
+        
+        When streaming is enabled the reply is posted as soon as the first tokens
+        arrive and edited in place as the rest is generated.
+        
+        Args:
+            channel: The Discord channel to reply in
+            prompt: The prompt to send to Gemini
+            system_prompt: The system prompt for this kind of channel
+            priority: LLM scheduling class ("dm" or "text")
+            
+        Returns:
+            The complete response text
+        """
+        if TEXT_STREAMING_ENABLED:
+            streamed_message = StreamingMessage(channel)
+            async for chunk in self.ai_api.generate_response_stream(prompt, system_prompt, priority=priority):
+                await streamed_message.append(chunk)
+            return await streamed_message.finish()
+        
+        response = await self.ai_api.generate_response(prompt, system_prompt, priority=priority)
+        if response:
+            # Split long messages if needed
+            if len(response) > TEXT_MESSAGE_LIMIT:
+                chunks = [response[i:i+TEXT_MESSAGE_LIMIT] for i in range(0, len(response), TEXT_MESSAGE_LIMIT)]
+                for chunk in chunks:
+                    await channel.send(chunk)
+            else:
+                await channel.send(response)
         
         return response
     
@@ -867,6 +1259,46 @@ class RupertBot:
                 
         return is_addressing_rupert
     
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get a snapshot of what this bot process is doing
+        
+        Returns:
+            Dictionary of shard, guild and session counts
+        """
+        latency = self.bot.latency
+        return {
+            "shard_ids": self.shard_ids,
+            "pid": os.getpid(),
+            "ready": self.bot.is_ready(),
+            "latency": round(latency, 3) if latency == latency else None,  # NaN before the first heartbeat
+            "guilds": len(self.bot.guilds),
+            "voice_sessions": len(self.voice_sessions),
+            "screenshares": len(self.screenshare_users),
+            "screenshare_frames": {
+                "captured": sum(buffer.captured for buffer in self.frame_buffers.values()),
+                "duplicates": sum(buffer.duplicates for buffer in self.frame_buffers.values()),
+            },
+            "llm_queues": self.ai_api.scheduler.get_metrics(),
+            "vision_cache": dict(self.vision_cache.stats) if self.vision_cache else None,
+            "vision_uploads": dict(vision_preprocess.stats),
+            "vision_scheduler": self.vision_scheduler.get_metrics(),
+            "commentary": self.commentary.get_metrics(),
+            "chess_readers": len(self.chess_readers),
+            "youtube_contexts": dict(self.youtube_contexts.stats) if self.youtube_contexts else None,
+            "tts_engines": self.tts.get_stats(),
+            "timestamp": time.time()
+        }
+    
+    async def report_status_periodically(self):
+        """Send status snapshots to the status reporter"""
+        while not self.bot.is_closed():
+            try:
+                self.status_reporter(self.get_status())
+            except Exception as e:
+                logger.error(f"Error reporting bot status: {e}")
+            await asyncio.sleep(SHARD_STATUS_INTERVAL)
+    
     def run(self):
         """Run the Discord bot"""
         # Register the message handler
@@ -0,0 +1,736 @@
+import random
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import CHESS_ANALYSIS_DEPTH, CHESS_ENGINE_TIME_LIMIT
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_SYMBOLS = "pnbrqk"
+PIECE_VALUES = (100, 320, 330, 500, 900, 20000)
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Castling rights as bits of one integer
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+# Moves are integers: from square, to square, promotion piece and a flag
+_EN_PASSANT, _CASTLE, _DOUBLE_PUSH = 1, 2, 3
+
+_FULL = (1 << 64) - 1
+_RANK_3 = 0xFF << 16
+_RANK_6 = 0xFF << 40
+_LAST_RANKS = 0xFF | (0xFF << 56)
+
+MATE_SCORE = 100000
+_MATE_BOUND = MATE_SCORE - 1000
+_INFINITY = MATE_SCORE + 1
+_MAX_PLY = 64
+_TT_MAX_ENTRIES = 1_000_000
+
+def _bits(bitboard: int) -> Iterator[int]:
+    while bitboard:
+        low = bitboard & -bitboard
+        yield low.bit_length() - 1
+        bitboard ^= low
+
+def square_name(square: int) -> str:
+    """Algebraic name of a square index, a1 being 0 and h8 63"""
+    return "abcdefgh"[square & 7] + str((square >> 3) + 1)
+
+def placement(squares: List[int]) -> str:
+    """
+    The piece placement field of a FEN
+
+    Args:
+        squares: Colour * 6 + piece type on each square from a1 to h8, -1 when empty
+    """
+    ranks = []
+    for rank in range(7, -1, -1):
+        row, empty = "", 0
+        for file in range(8):
+            code = squares[rank * 8 + file]
+            if code < 0:
+                empty += 1
+                continue
+            if empty:
+                row += str(empty)
+                empty = 0
+            symbol = PIECE_SYMBOLS[code % 6]
+            row += symbol.upper() if code < 6 else symbol
+        ranks.append(row + (str(empty) if empty else ""))
+    return "/".join(ranks)
+
+def _leaper_attacks(steps: List[Tuple[int, int]]) -> List[int]:
+    table = []
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        attacks = 0
+        for dr, df in steps:
+            if 0 <= rank + dr < 8 and 0 <= file + df < 8:
+                attacks |= 1 << ((rank + dr) * 8 + file + df)
+        table.append(attacks)
+    return table
+
+_KNIGHT_ATTACKS = _leaper_attacks([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+_KING_ATTACKS = _leaper_attacks([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+# Squares a pawn of each colour attacks from each square
+_PAWN_ATTACKS = (_leaper_attacks([(1, -1), (1, 1)]), _leaper_attacks([(-1, -1), (-1, 1)]))
+
+# Rays in each direction, for directions towards higher squares the nearest blocker is the lowest bit
+_DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1)]
+_ASCENDING = [True, True, True, True, False, False, False, False]
+_ROOK_DIRECTIONS = (0, 1, 4, 5)
+_BISHOP_DIRECTIONS = (2, 3, 6, 7)
+
+def _rays() -> List[List[int]]:
+    rays = []
+    for dr, df in _DIRECTIONS:
+        table = []
+        for square in range(64):
+            rank, file = divmod(square, 8)
+            ray = 0
+            rank, file = rank + dr, file + df
+            while 0 <= rank < 8 and 0 <= file < 8:
+                ray |= 1 << (rank * 8 + file)
+                rank, file = rank + dr, file + df
+            table.append(ray)
+        rays.append(table)
+    return rays
+
+_RAYS = _rays()
+
+def _slider_attacks(square: int, occupied: int, directions: Tuple[int, ...]) -> int:
+    attacks = 0
+    for direction in directions:
+        ray = _RAYS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            blocker = (blockers & -blockers).bit_length() - 1 if _ASCENDING[direction] else blockers.bit_length() - 1
+            ray ^= _RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+# Rights that survive a move touching each square
+_CASTLING_MASK = [15] * 64
+_CASTLING_MASK[0] &= ~WHITE_QUEENSIDE
+_CASTLING_MASK[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+_CASTLING_MASK[7] &= ~WHITE_KINGSIDE
+_CASTLING_MASK[56] &= ~BLACK_QUEENSIDE
+_CASTLING_MASK[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+_CASTLING_MASK[63] &= ~BLACK_KINGSIDE
+
+# Zobrist keys, seeded so hashes are the same in every process
+_random = random.Random(20240601)
+_ZOBRIST_PIECES = [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+_ZOBRIST_CASTLING = [_random.getrandbits(64) for _ in range(16)]
+_ZOBRIST_EN_PASSANT = [_random.getrandbits(64) for _ in range(8)]
+_ZOBRIST_SIDE = _random.getrandbits(64)
+
+# Piece-square tables from White's side, rank 8 first as a board is read
+_PIECE_SQUARE_TABLES = [
+    [0, 0, 0, 0, 0, 0, 0, 0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+     5, 5, 10, 25, 25, 10, 5, 5,
+     0, 0, 0, 20, 20, 0, 0, 0,
+     5, -5, -10, 0, 0, -10, -5, 5,
+     5, 10, 10, -20, -20, 10, 10, 5,
+     0, 0, 0, 0, 0, 0, 0, 0],
+    [-50, -40, -30, -30, -30, -30, -40, -50,
+     -40, -20, 0, 0, 0, 0, -20, -40,
+     -30, 0, 10, 15, 15, 10, 0, -30,
+     -30, 5, 15, 20, 20, 15, 5, -30,
+     -30, 0, 15, 20, 20, 15, 0, -30,
+     -30, 5, 10, 15, 15, 10, 5, -30,
+     -40, -20, 0, 5, 5, 0, -20, -40,
+     -50, -40, -30, -30, -30, -30, -40, -50],
+    [-20, -10, -10, -10, -10, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 10, 10, 5, 0, -10,
+     -10, 5, 5, 10, 10, 5, 5, -10,
+     -10, 0, 10, 10, 10, 10, 0, -10,
+     -10, 10, 10, 10, 10, 10, 10, -10,
+     -10, 5, 0, 0, 0, 0, 5, -10,
+     -20, -10, -10, -10, -10, -10, -10, -20],
+    [0, 0, 0, 0, 0, 0, 0, 0,
+     5, 10, 10, 10, 10, 10, 10, 5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     0, 0, 0, 5, 5, 0, 0, 0],
+    [-20, -10, -10, -5, -5, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 5, 5, 5, 0, -10,
+     -5, 0, 5, 5, 5, 5, 0, -5,
+     0, 0, 5, 5, 5, 5, 0, -5,
+     -10, 5, 5, 5, 5, 5, 0, -10,
+     -10, 0, 5, 0, 0, 0, 0, -10,
+     -20, -10, -10, -5, -5, -10, -10, -20],
+    [-30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -20, -30, -30, -40, -40, -30, -30, -20,
+     -10, -20, -20, -20, -20, -20, -20, -10,
+     20, 20, 0, 0, 0, 0, 20, 20,
+     20, 30, 10, 0, 0, 10, 30, 20],
+]
+# Once the queens are off the king should walk to the centre
+_KING_ENDGAME_TABLE = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+def _square_tables(table: List[int]) -> Tuple[List[int], List[int]]:
+    """Piece value plus table bonus by square, for White and for Black"""
+    return [table[square ^ 56] for square in range(64)], [table[square] for square in range(64)]
+
+_SQUARE_SCORES = [
+    [[PIECE_VALUES[kind] + bonus for bonus in side] for side in _square_tables(_PIECE_SQUARE_TABLES[kind])]
+    for kind in range(6)
+]
+_KING_ENDGAME_SCORES = _square_tables(_KING_ENDGAME_TABLE)
+
+
+class Position:
+    __slots__ = ("pieces", "occupancy", "squares", "side", "castling", "en_passant", "halfmove", "fullmove", "key")
+
+    def __init__(self, fen: str = STARTING_FEN):
+        """
+        A chess position held as one bitboard per colour and piece type
+
+        Args:
+            fen: The position in Forsyth-Edwards Notation
+
+        Raises:
+            ValueError: If the FEN can't be parsed
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen}")
+        placement, side, castling, en_passant = fields[:4]
+
+        self.pieces = [[0] * 6, [0] * 6]
+        self.squares = [-1] * 64  # Colour * 6 + piece type on each square, -1 when empty
+        ranks = placement.split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN placement: {placement}")
+        for rank_index, rank in enumerate(ranks):
+            file = 0
+            for char in rank:
+                if char.isdigit():
+                    file += int(char)
+                    continue
+                if char.lower() not in PIECE_SYMBOLS or file > 7:
+                    raise ValueError(f"Invalid FEN placement: {placement}")
+                colour = WHITE if char.isupper() else BLACK
+                kind = PIECE_SYMBOLS.index(char.lower())
+                square = (7 - rank_index) * 8 + file
+                self.pieces[colour][kind] |= 1 << square
+                self.squares[square] = colour * 6 + kind
+                file += 1
+            if file != 8:
+                raise ValueError(f"Invalid FEN placement: {placement}")
+
+        if side not in ("w", "b"):
+            raise ValueError(f"Invalid FEN side to move: {side}")
+        self.side = WHITE if side == "w" else BLACK
+        self.castling = 0
+        for char, right in zip("KQkq", (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+            if char in castling:
+                self.castling |= right
+        self.en_passant = None if en_passant == "-" else "abcdefgh".index(en_passant[0]) + (int(en_passant[1]) - 1) * 8
+        self.halfmove = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self.occupancy = [self._occupied_by(WHITE), self._occupied_by(BLACK)]
+
+        self.key = _ZOBRIST_CASTLING[self.castling] ^ (_ZOBRIST_SIDE if self.side == BLACK else 0)
+        if self.en_passant is not None:
+            self.key ^= _ZOBRIST_EN_PASSANT[self.en_passant & 7]
+        for square, code in enumerate(self.squares):
+            if code >= 0:
+                self.key ^= _ZOBRIST_PIECES[code][square]
+
+        for colour in (WHITE, BLACK):
+            if bin(self.pieces[colour][KING]).count("1") != 1:
+                raise ValueError("Each side needs exactly one king")
+
+    def _occupied_by(self, colour: int) -> int:
+        occupied = 0
+        for bitboard in self.pieces[colour]:
+            occupied |= bitboard
+        return occupied
+
+    def fen(self) -> str:
+        """The position in Forsyth-Edwards Notation"""
+        castling = "".join(char for char, right in zip("KQkq", (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE,
+                                                                BLACK_QUEENSIDE)) if self.castling & right) or "-"
+        en_passant = square_name(self.en_passant) if self.en_passant is not None else "-"
+        return f"{placement(self.squares)} {'wb'[self.side]} {castling} {en_passant} {self.halfmove} {self.fullmove}"
+
+    def king_square(self, colour: int) -> int:
+        return self.pieces[colour][KING].bit_length() - 1
+
+    def is_attacked(self, square: int, by: int) -> bool:
+        """Whether a piece of colour `by` attacks a square"""
+        pieces = self.pieces[by]
+        if _KNIGHT_ATTACKS[square] & pieces[KNIGHT] or _KING_ATTACKS[square] & pieces[KING]:
+            return True
+        # A pawn of `by` attacks the square if a pawn of the other colour there would attack it
+        if _PAWN_ATTACKS[by ^ 1][square] & pieces[PAWN]:
+            return True
+        occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+        if _slider_attacks(square, occupied, _ROOK_DIRECTIONS) & (pieces[ROOK] | pieces[QUEEN]):
+            return True
+        return bool(_slider_attacks(square, occupied, _BISHOP_DIRECTIONS) & (pieces[BISHOP] | pieces[QUEEN]))
+
+    def in_check(self) -> bool:
+        """Whether the side to move is in check"""
+        return self.is_attacked(self.king_square(self.side), self.side ^ 1)
+
+    def pseudo_legal_moves(self, captures_only: bool = False) -> List[int]:
+        """
+        Moves that follow the piece rules but may leave the mover's king in check
+
+        Args:
+            captures_only: Only captures and queen promotions, for the quiescence search
+        """
+        us, them = self.side, self.side ^ 1
+        own, enemy = self.occupancy[us], self.occupancy[them]
+        occupied = own | enemy
+        targets = enemy if captures_only else ~own & _FULL
+        pieces = self.pieces[us]
+        moves = []
+
+        pawns = pieces[PAWN]
+        if us == WHITE:
+            single = (pawns << 8) & ~occupied & _FULL
+            double = ((single & _RANK_3) << 8) & ~occupied & _FULL
+            push = 8
+        else:
+            single = (pawns >> 8) & ~occupied
+            double = ((single & _RANK_6) >> 8) & ~occupied
+            push = -8
+        for to in _bits(single):
+            if (1 << to) & _LAST_RANKS:
+                for promotion in ((QUEEN,) if captures_only else (QUEEN, ROOK, BISHOP, KNIGHT)):
+                    moves.append((to - push) | to << 6 | promotion << 12)
+            elif not captures_only:
+                moves.append((to - push) | to << 6)
+        if not captures_only:
+            for to in _bits(double):
+                moves.append((to - 2 * push) | to << 6 | _DOUBLE_PUSH << 15)
+        for origin in _bits(pawns):
+            attacks = _PAWN_ATTACKS[us][origin]
+            for to in _bits(attacks & enemy):
+                if (1 << to) & _LAST_RANKS:
+                    for promotion in ((QUEEN,) if captures_only else (QUEEN, ROOK, BISHOP, KNIGHT)):
+                        moves.append(origin | to << 6 | promotion << 12)
+                else:
+                    moves.append(origin | to << 6)
+            if self.en_passant is not None and attacks & (1 << self.en_passant):
+                moves.append(origin | self.en_passant << 6 | _EN_PASSANT << 15)
+
+        for origin in _bits(pieces[KNIGHT]):
+            for to in _bits(_KNIGHT_ATTACKS[origin] & targets):
+                moves.append(origin | to << 6)
+        for origin in _bits(pieces[BISHOP]):
+            for to in _bits(_slider_attacks(origin, occupied, _BISHOP_DIRECTIONS) & targets):
+                moves.append(origin | to << 6)
+        for origin in _bits(pieces[ROOK]):
+            for to in _bits(_slider_attacks(origin, occupied, _ROOK_DIRECTIONS) & targets):
+                moves.append(origin | to << 6)
+        for origin in _bits(pieces[QUEEN]):
+            attacks = (_slider_attacks(origin, occupied, _ROOK_DIRECTIONS)
+                       | _slider_attacks(origin, occupied, _BISHOP_DIRECTIONS))
+            for to in _bits(attacks & targets):
+                moves.append(origin | to << 6)
+        king = self.king_square(us)
+        for to in _bits(_KING_ATTACKS[king] & targets):
+            moves.append(king | to << 6)
+
+        if not captures_only and self.castling:
+            home = 0 if us == WHITE else 56
+            kingside, queenside = (WHITE_KINGSIDE, WHITE_QUEENSIDE) if us == WHITE else (BLACK_KINGSIDE, BLACK_QUEENSIDE)
+            if king == home + 4 and not self.is_attacked(king, them):
+                if (self.castling & kingside and not occupied & (0b11 << (home + 5))
+                        and not self.is_attacked(home + 5, them) and not self.is_attacked(home + 6, them)):
+                    moves.append(king | (home + 6) << 6 | _CASTLE << 15)
+                if (self.castling & queenside and not occupied & (0b111 << (home + 1))
+                        and not self.is_attacked(home + 3, them) and not self.is_attacked(home + 2, them)):
+                    moves.append(king | (home + 2) << 6 | _CASTLE << 15)
+        return moves
+
+    def make(self, move: int) -> "Position":
+        """The position after a move, this one is left as it was"""
+        origin, to, promotion, flag = move & 63, (move >> 6) & 63, (move >> 12) & 7, move >> 15
+        us, them = self.side, self.side ^ 1
+        child = Position.__new__(Position)
+        pieces = [self.pieces[WHITE][:], self.pieces[BLACK][:]]
+        squares = self.squares[:]
+        key = self.key
+
+        code = squares[origin]
+        captured = squares[to]
+        if captured >= 0:
+            pieces[them][captured % 6] ^= 1 << to
+            key ^= _ZOBRIST_PIECES[captured][to]
+        if flag == _EN_PASSANT:
+            taken = to - 8 if us == WHITE else to + 8
+            pieces[them][PAWN] ^= 1 << taken
+            squares[taken] = -1
+            key ^= _ZOBRIST_PIECES[them * 6 + PAWN][taken]
+
+        pieces[us][code % 6] ^= 1 << origin
+        key ^= _ZOBRIST_PIECES[code][origin]
+        squares[origin] = -1
+        if promotion:
+            code = us * 6 + promotion
+        pieces[us][code % 6] |= 1 << to
+        key ^= _ZOBRIST_PIECES[code][to]
+        squares[to] = code
+
+        if flag == _CASTLE:
+            rook_from, rook_to = (to + 1, to - 1) if to > origin else (to - 2, to + 1)
+            rook = us * 6 + ROOK
+            pieces[us][ROOK] ^= (1 << rook_from) | (1 << rook_to)
+            squares[rook_to], squares[rook_from] = rook, -1
+            key ^= _ZOBRIST_PIECES[rook][rook_from] ^ _ZOBRIST_PIECES[rook][rook_to]
+
+        child.castling = self.castling & _CASTLING_MASK[origin] & _CASTLING_MASK[to]
+        key ^= _ZOBRIST_CASTLING[self.castling] ^ _ZOBRIST_CASTLING[child.castling]
+        if self.en_passant is not None:
+            key ^= _ZOBRIST_EN_PASSANT[self.en_passant & 7]
+        child.en_passant = (origin + to) // 2 if flag == _DOUBLE_PUSH else None
+        if child.en_passant is not None:
+            key ^= _ZOBRIST_EN_PASSANT[child.en_passant & 7]
+
+        child.pieces = pieces
+        child.squares = squares
+        child.occupancy = [self.occupancy[WHITE], self.occupancy[BLACK]]
+        child.occupancy[us] = child._occupied_by(us)
+        child.occupancy[them] = child._occupied_by(them)
+        child.side = them
+        child.halfmove = 0 if code % 6 == PAWN or captured >= 0 else self.halfmove + 1
+        child.fullmove = self.fullmove + (us == BLACK)
+        child.key = key ^ _ZOBRIST_SIDE
+        return child
+
+    def is_legal_after(self, child: "Position") -> bool:
+        """Whether the move that led to `child` left the mover's king safe"""
+        return not child.is_attacked(child.king_square(self.side), child.side)
+
+    def legal_moves(self) -> List[int]:
+        return [move for move in self.pseudo_legal_moves() if self.is_legal_after(self.make(move))]
+
+    def evaluate(self) -> int:
+        """Material and piece placement in centipawns, from the side to move's point of view"""
+        endgame = not (self.pieces[WHITE][QUEEN] | self.pieces[BLACK][QUEEN])
+        score = 0
+        for colour, sign in ((WHITE, 1), (BLACK, -1)):
+            for kind in range(6):
+                table = _SQUARE_SCORES[kind][colour]
+                if kind == KING and endgame:
+                    table = _KING_ENDGAME_SCORES[colour]
+                    score += sign * PIECE_VALUES[KING]
+                for square in _bits(self.pieces[colour][kind]):
+                    score += sign * table[square]
+        return score if self.side == WHITE else -score
+
+    def san(self, move: int) -> str:
+        """A legal move in Standard Algebraic Notation, such as Nf3, exd5 or O-O"""
+        origin, to, promotion, flag = move & 63, (move >> 6) & 63, (move >> 12) & 7, move >> 15
+        kind = self.squares[origin] % 6
+        if flag == _CASTLE:
+            text = "O-O" if to > origin else "O-O-O"
+        else:
+            capture = self.squares[to] >= 0 or flag == _EN_PASSANT
+            if kind == PAWN:
+                text = ("abcdefgh"[origin & 7] + "x" if capture else "") + square_name(to)
+                if promotion:
+                    text += "=" + PIECE_SYMBOLS[promotion].upper()
+            else:
+                # Name the file, rank or square when another piece of the same kind could go there too
+                rivals = [other & 63 for other in self.legal_moves()
+                          if (other >> 6) & 63 == to and other & 63 != origin and self.squares[other & 63] % 6 == kind
+                          and self.squares[other & 63] // 6 == self.side]
+                qualifier = ""
+                if rivals:
+                    if all(rival & 7 != origin & 7 for rival in rivals):
+                        qualifier = "abcdefgh"[origin & 7]
+                    elif all(rival >> 3 != origin >> 3 for rival in rivals):
+                        qualifier = str((origin >> 3) + 1)
+                    else:
+                        qualifier = square_name(origin)
+                text = PIECE_SYMBOLS[kind].upper() + qualifier + ("x" if capture else "") + square_name(to)
+
+        child = self.make(move)
+        if child.in_check():
+            text += "#" if not child.legal_moves() else "+"
+        return text
+
+
+class SearchResult:
+    def __init__(self, fen: str, best_move: Optional[str], score: int, line: List[str], depth: int, nodes: int,
+                 seconds: float):
+        """
+        What the engine found for a position
+
+        Args:
+            fen: The position searched
+            best_move: Best move in SAN, None when there are no legal moves
+            score: Centipawns for the side to move, or beyond MATE_SCORE - 1000 for a forced mate
+            line: The expected continuation in SAN, starting with the best move
+            depth: Plies fully searched
+            nodes: Positions visited
+            seconds: Time the search took
+        """
+        self.fen = fen
+        self.best_move = best_move
+        self.score = score
+        self.line = line
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+
+    @property
+    def mate_in(self) -> Optional[int]:
+        """Moves to mate, negative when the side to move is getting mated, None without a forced mate"""
+        if abs(self.score) < _MATE_BOUND:
+            return None
+        moves = (MATE_SCORE - abs(self.score) + 1) // 2
+        return moves if self.score > 0 else -moves
+
+    def describe(self) -> str:
+        """The evaluation and best line as a sentence for the LLM to narrate"""
+        position = Position(self.fen)
+        side, other = ("White", "Black") if position.side == WHITE else ("Black", "White")
+        if self.best_move is None:
+            if position.in_check():
+                return f"{side} is checkmated, {other} has won."
+            return f"{side} has no legal moves, the game is drawn by stalemate."
+
+        if self.mate_in is not None:
+            evaluation = (f"{side} can force mate in {self.mate_in}" if self.mate_in > 0
+                          else f"{other} can force mate in {-self.mate_in}")
+        else:
+            white_score = self.score if position.side == WHITE else -self.score
+            leader = "White" if white_score > 0 else "Black"
+            if abs(white_score) < 30:
+                verdict = "the position is roughly equal"
+            elif abs(white_score) < 100:
+                verdict = f"{leader} is slightly better"
+            elif abs(white_score) < 300:
+                verdict = f"{leader} is clearly better"
+            else:
+                verdict = f"{leader} is winning"
+            evaluation = f"Evaluation {white_score / 100:+.2f} for White, {verdict}"
+
+        number, moves = position.fullmove, []
+        for index, san in enumerate(self.line):
+            if (index + position.side) % 2 == 0:
+                moves.append(f"{number}. {san}")
+            else:
+                moves.append(f"{number}... {san}" if index == 0 else san)
+                number += 1
+        plies = "ply" if self.depth == 1 else "plies"
+        return (f"{evaluation}. {side} to move, best move {self.best_move}. "
+                f"Expected line: {' '.join(moves)} (searched {self.depth} {plies}).")
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class Engine:
+    def __init__(self):
+        """
+        Alpha-beta search over bitboards with a transposition table
+
+        Moves are tried best-first: the transposition table's move, then
+        captures by most valuable victim and least valuable attacker, then
+        killer moves. Iterative deepening fills the table so each depth
+        starts from the previous one's best line, and a capture-only
+        quiescence search settles exchanges at the horizon.
+        """
+        # Zobrist key -> (Depth, Score, Bound, Best move)
+        self.table: Dict[int, Tuple[int, int, int, int]] = {}
+        self.killers: List[List[int]] = [[0, 0] for _ in range(_MAX_PLY + 1)]
+        self.nodes = 0
+        self.deadline = float("inf")
+
+    def search(self, position: Position, depth: int = None, time_limit: float = None) -> SearchResult:
+        """
+        Find the best move by iterative deepening
+
+        Args:
+            position: The position to search
+            depth: Plies to search (uses config if None)
+            time_limit: Seconds after which the deepest finished iteration is used (uses config if None)
+
+        Returns:
+            The best move, score and expected line
+        """
+        depth = max(1, depth or CHESS_ANALYSIS_DEPTH)
+        time_limit = time_limit if time_limit is not None else CHESS_ENGINE_TIME_LIMIT
+        start = time.monotonic()
+        self.deadline = start + time_limit if time_limit > 0 else float("inf")
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(_MAX_PLY + 1)]
+        if len(self.table) > _TT_MAX_ENTRIES:
+            self.table.clear()
+
+        if not position.legal_moves():
+            score = -MATE_SCORE if position.in_check() else 0
+            return SearchResult(position.fen(), None, score, [], 0, 0, time.monotonic() - start)
+
+        score, completed = 0, 0
+        for current in range(1, depth + 1):
+            try:
+                score = self._negamax(position, current, -_INFINITY, _INFINITY, 0)
+            except _SearchTimeout:
+                break
+            completed = current
+            if abs(score) >= _MATE_BOUND:
+                break
+        if completed == 0:
+            # Not even one ply in time, a one-ply search is always worth finishing
+            self.deadline = float("inf")
+            score, completed = self._negamax(position, 1, -_INFINITY, _INFINITY, 0), 1
+
+        line = self._principal_variation(position, completed)
+        return SearchResult(position.fen(), line[0] if line else None, score, line, completed, self.nodes,
+                            time.monotonic() - start)
+
+    def _principal_variation(self, position: Position, depth: int) -> List[str]:
+        line, seen = [], set()
+        while len(line) < max(depth, 1) and position.key not in seen:
+            seen.add(position.key)
+            entry = self.table.get(position.key)
+            if entry is None or entry[3] not in position.legal_moves():
+                break
+            line.append(position.san(entry[3]))
+            position = position.make(entry[3])
+        return line
+
+    def _order(self, position: Position, moves: List[int], best: int, ply: int) -> List[int]:
+        killers = self.killers[ply]
+        squares = position.squares
+
+        def priority(move: int) -> int:
+            if move == best:
+                return 1_000_000
+            victim = squares[(move >> 6) & 63]
+            if victim >= 0 or move >> 15 == _EN_PASSANT:
+                victim_value = PIECE_VALUES[victim % 6] if victim >= 0 else PIECE_VALUES[PAWN]
+                return 100_000 + victim_value * 10 - squares[move & 63] % 6
+            if (move >> 12) & 7:
+                return 90_000
+            if move in killers:
+                return 80_000
+            return 0
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def _negamax(self, position: Position, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.monotonic() > self.deadline:
+            raise _SearchTimeout()
+        if ply and position.halfmove >= 100:
+            return 0
+
+        original_alpha = alpha
+        best_move = 0
+        entry = self.table.get(position.key)
+        if entry is not None:
+            entry_depth, entry_score, bound, best_move = entry
+            if ply and entry_depth >= depth:
+                # Mate scores are stored relative to the node, turn them back into distance from the root
+                if entry_score >= _MATE_BOUND:
+                    entry_score -= ply
+                elif entry_score <= -_MATE_BOUND:
+                    entry_score += ply
+                if bound == 0:
+                    return entry_score
+                if bound == 1:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        in_check = position.in_check()
+        if in_check and ply < _MAX_PLY:
+            # Checks are forcing, look one ply further
+            depth += 1
+        if depth <= 0 or ply >= _MAX_PLY:
+            return self._quiesce(position, alpha, beta, ply)
+
+        best_score, legal = -_INFINITY, 0
+        for move in self._order(position, position.pseudo_legal_moves(), best_move, ply):
+            child = position.make(move)
+            if not position.is_legal_after(child):
+                continue
+            legal += 1
+            score = -self._negamax(child, depth - 1, -beta, -alpha, ply + 1)
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if position.squares[(move >> 6) & 63] < 0 and move not in self.killers[ply]:
+                    self.killers[ply] = [move, self.killers[ply][0]]
+                break
+
+        if not legal:
+            return -MATE_SCORE + ply if in_check else 0
+
+        bound = 2 if best_score <= original_alpha else 1 if best_score >= beta else 0  # Upper, lower or exact
+        stored = best_score
+        if stored >= _MATE_BOUND:
+            stored += ply
+        elif stored <= -_MATE_BOUND:
+            stored -= ply
+        self.table[position.key] = (depth, stored, bound, best_move)
+        return best_score
+
+    def _quiesce(self, position: Position, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.monotonic() > self.deadline:
+            raise _SearchTimeout()
+
+        stand_pat = position.evaluate()
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        for move in self._order(position, position.pseudo_legal_moves(captures_only=True), 0, min(ply, _MAX_PLY)):
+            child = position.make(move)
+            if not position.is_legal_after(child):
+                continue
+            score = -self._quiesce(child, -beta, -alpha, ply + 1)
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+
+def analyse(fen: str, depth: int = None, time_limit: float = None) -> SearchResult:
+    """
+    Search a position given as FEN
+
+    CPU-bound for up to `time_limit` seconds, so call this in an executor.
+
+    Raises:
+        ValueError: If the FEN can't be parsed
+    """
+    return Engine().search(Position(fen), depth, time_limit)
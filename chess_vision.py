@@ -0,0 +1,301 @@
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from chess_engine import (
+    Position, STARTING_FEN, WHITE, BLACK, PAWN, KING, ROOK,
+    WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE, placement, square_name
+)
+from content_classifier import find_board
+from frames import Frame, downscale, grayscale
+
+logger = logging.getLogger(__name__)
+
+# Side each square is resampled to before its features are taken
+_SQUARE_PIXELS = 24
+# Pixels dropped from each edge of a square, so the neighbouring squares' borders don't count as piece edges
+_SQUARE_INSET = 2
+# Central part of a square that the piece body covers
+_CENTRE = slice(7, 17)
+
+# Where castling rights need the king and rooks: (right, king square, rook square)
+_CASTLING_HOMES = [(WHITE_KINGSIDE, 4, 7), (WHITE_QUEENSIDE, 4, 0), (BLACK_KINGSIDE, 60, 63), (BLACK_QUEENSIDE, 60, 56)]
+
+_STARTING_SQUARES = Position(STARTING_FEN).squares
+
+
+def _refine_box(gray: np.ndarray, box: Tuple[float, float, float]) -> Tuple[float, float, float]:
+    """
+    Move a board found on the thumbnail by whole squares until every rank and file alternates
+
+    The thumbnail only places the board to within a few pixels, so the grid
+    lines are first fitted to the edges of the full-size frame. The coarse
+    search also scores a grid over all its squares, so with pieces covering
+    many of them it can settle a square or two off the board. A rank or file
+    that falls outside the board has no alternating colours, so the shift
+    whose weakest line still alternates the most is kept.
+
+    Args:
+        gray: Full-size grayscale frame
+        box: (top, left, side) of the board in the same pixels
+
+    Returns:
+        The corrected (top, left, side)
+    """
+    h, w = gray.shape
+    top, left, side = box
+    band_y = slice(max(0, int(top)), min(h, int(top + side)))
+    band_x = slice(max(0, int(left)), min(w, int(left + side)))
+    gray = gray.astype(np.float32)
+    fits = []
+    for profile, origin in ((np.abs(np.diff(gray[band_y], axis=1)).sum(axis=0), left),
+                            (np.abs(np.diff(gray[:, band_x], axis=0)).sum(axis=1), top)):
+        # Every line between squares separates two colours along its whole length
+        cells = side / 8 * np.linspace(0.96, 1.04, 33)
+        origins = origin + np.arange(-side / 32, side / 32 + 1)
+        positions = np.round(origins[None, :, None] + cells[:, None, None] * np.arange(9)).astype(int)
+        strength = np.append(profile, 0)[np.clip(positions, 0, len(profile))].sum(axis=-1)
+        i, j = np.unravel_index(np.argmax(strength), strength.shape)
+        fits.append((origins[j] + 0.5, cells[i]))
+    (left, cell_x), (top, cell_y) = fits
+    cell = (cell_x + cell_y) / 2
+    side = 8 * cell
+    box = (top, left, side)
+    inset, size = max(1, int(cell * 0.06)), max(1, int(cell * 0.12))
+    table = np.zeros((h + 1, w + 1))
+    table[1:, 1:] = gray.astype(np.float64).cumsum(0).cumsum(1)
+
+    def patch(y: int, x: int) -> float:
+        return (table[y + size, x + size] - table[y, x + size] - table[y + size, x] + table[y, x]) / (size * size)
+
+    best, best_score = box, -1.0
+    for dy in range(-2, 3):
+        for dx in range(-2, 3):
+            y0, x0 = top + dy * cell, left + dx * cell
+            if y0 < 0 or x0 < 0 or y0 + side > h or x0 + side > w:
+                continue
+            # Colour of each square from the median of its four corners, which pieces rarely cover
+            colours = np.empty((8, 8))
+            for row in range(8):
+                for column in range(8):
+                    ys = (int(y0 + row * cell) + inset, int(y0 + (row + 1) * cell) - inset - size)
+                    xs = (int(x0 + column * cell) + inset, int(x0 + (column + 1) * cell) - inset - size)
+                    colours[row, column] = np.median([patch(y, x) for y in ys for x in xs])
+            signs = np.where(np.indices((8, 8)).sum(axis=0) % 2 == 0, 1.0, -1.0)
+            contrast = colours * signs
+            score = min(np.abs(contrast.mean(axis=0)).min(), np.abs(contrast.mean(axis=1)).min())
+            if score > best_score + 1e-6 or (dy, dx) == (0, 0) and score >= best_score - 1e-6:
+                best, best_score = (y0, x0, side), score
+    return best
+
+
+def _square_features(gray: np.ndarray, box: Tuple[float, float, float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Resample a board into squares and describe each one
+
+    Args:
+        gray: Full-size grayscale frame
+        box: (top, left, side) of the board in the same pixels
+
+    Returns:
+        (occupied, edges, brightness): an 8x8 boolean array, an (8, 8, n) array
+        of normalised edge maps and an 8x8 array of the piece body's brightness,
+        all indexed by screen row and column
+    """
+    top, left, side = box
+    board = gray[int(round(top)):int(round(top + side)), int(round(left)):int(round(left + side))]
+    size = 8 * _SQUARE_PIXELS
+    squares = downscale(board, size, size).reshape(8, _SQUARE_PIXELS, 8, _SQUARE_PIXELS).transpose(0, 2, 1, 3)
+    inner = squares[:, :, _SQUARE_INSET:-_SQUARE_INSET, _SQUARE_INSET:-_SQUARE_INSET]
+
+    # Pieces rarely reach a square's corners, which show the square's own colour
+    corners = np.stack([inner[:, :, :3, :3], inner[:, :, :3, -3:], inner[:, :, -3:, :3], inner[:, :, -3:, -3:]])
+    background = np.median(corners.reshape(4, 8, 8, -1).mean(axis=-1), axis=0)
+    centre = squares[:, :, _CENTRE, _CENTRE]
+    occupied = (np.abs(centre.mean(axis=(2, 3)) - background) > 18) | (centre.std(axis=(2, 3)) > 12)
+
+    # Outlines look alike whatever the colours of the piece and the square, so shapes are compared by their edges
+    edges = (np.abs(np.diff(inner, axis=2))[:, :, :, :-1] + np.abs(np.diff(inner, axis=3))[:, :, :-1, :])
+    edges = edges.reshape(8, 8, -1)
+    edges = edges - edges.mean(axis=-1, keepdims=True)
+    edges /= np.maximum(np.linalg.norm(edges, axis=-1, keepdims=True), 1e-6)
+    return occupied, edges, centre.mean(axis=(2, 3))
+
+
+class ChessBoardReader:
+    def __init__(self):
+        """
+        Reads chess positions off one guild's screenshared board
+
+        Pieces are told apart by comparing each square's edges with templates
+        learnt from the starting position, so the reader has to see a game
+        start once for every board style. That also tells it which way up
+        the board is. From then on, the difference between consecutive
+        positions gives the side to move, castling rights and en passant.
+        """
+        self.templates: Optional[np.ndarray] = None  # (6, n) edge template per piece type
+        self.colour_threshold = 0.0  # Body brightness between Black's and White's pieces
+        self.white_at_bottom = True
+
+        self.squares: Optional[List[int]] = None  # Last position read, as Position.squares
+        self.side = WHITE
+        self.castling = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self.en_passant: Optional[int] = None
+        self.fullmove = 1
+
+        self.last_frame: Optional[str] = None  # Key of the last frame read and its FEN
+        self.last_fen: Optional[str] = None
+        # Capture and chess analysis both read frames from executor threads
+        self.lock = threading.Lock()
+
+    @property
+    def calibrated(self) -> bool:
+        return self.templates is not None
+
+    def _to_square(self, row: int, column: int) -> int:
+        """The square index (a1 = 0) shown at a screen row and column"""
+        if self.white_at_bottom:
+            return (7 - row) * 8 + column
+        return row * 8 + (7 - column)
+
+    def _calibrate(self, occupied: np.ndarray, edges: np.ndarray, brightness: np.ndarray) -> bool:
+        """Learn the piece set from a board in the starting position"""
+        home_rows = np.zeros((8, 8), dtype=bool)
+        home_rows[[0, 1, 6, 7]] = True
+        if not np.array_equal(occupied, home_rows):
+            return False
+
+        top, bottom = brightness[:2].mean(), brightness[6:].mean()
+        if abs(top - bottom) < 20:
+            return False
+        self.white_at_bottom = bottom > top
+        self.colour_threshold = float((top + bottom) / 2)
+
+        samples: List[List[np.ndarray]] = [[] for _ in range(6)]
+        for row, column in zip(*np.nonzero(home_rows)):
+            samples[_STARTING_SQUARES[self._to_square(row, column)] % 6].append(edges[row, column])
+        templates = np.stack([np.mean(kind, axis=0) for kind in samples])
+        self.templates = templates / np.maximum(np.linalg.norm(templates, axis=1, keepdims=True), 1e-6)
+
+        self.squares = None
+        self.side = WHITE
+        self.castling = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self.en_passant = None
+        self.fullmove = 1
+        logger.info(f"Learnt the chess piece set, White is at the {'bottom' if self.white_at_bottom else 'top'}")
+        return True
+
+    def _track_move(self, squares: List[int]) -> None:
+        """Work out who moved from what changed since the last position"""
+        if self.squares is None or squares == self.squares:
+            if self.squares is None:
+                # With no history, assume it is the turn of whoever is playing from the bottom
+                self.side = WHITE if self.white_at_bottom else BLACK
+            return
+
+        vacated = [square for square in range(64) if self.squares[square] >= 0 and squares[square] < 0]
+        movers = {self.squares[square] // 6 for square in vacated}
+        self.en_passant = None
+        if len(movers) == 1:
+            mover = movers.pop()
+            self.side = mover ^ 1
+            if mover == BLACK:
+                self.fullmove += 1
+            if len(vacated) == 1 and self.squares[vacated[0]] % 6 == PAWN:
+                origin = vacated[0]
+                target = origin + (16 if mover == WHITE else -16)
+                if 0 <= target < 64 and squares[target] == self.squares[origin] and self.squares[target] < 0:
+                    self.en_passant = (origin + target) // 2
+
+    def read(self, frame: Frame) -> Optional[str]:
+        """
+        Read the position on a screenshare frame
+
+        Decodes the frame and compares 64 squares, so call this in an executor.
+        Reads are serialised, a frame read again while waiting gets the same answer.
+
+        Args:
+            frame: A frame classified as chess
+
+        Returns:
+            The position as FEN, or None if no board was found, the piece set
+            hasn't been learnt yet or what was read isn't a legal position
+        """
+        with self.lock:
+            return self._read(frame)
+
+    def _read(self, frame: Frame) -> Optional[str]:
+        if frame.key == self.last_frame:
+            return self.last_fen
+        pixels, thumbnail = frame.pixels(), frame.thumbnail()
+        if pixels is None or thumbnail is None:
+            return None
+        board = find_board(grayscale(thumbnail))
+        if board is None:
+            return None
+
+        scale = pixels.shape[0] / thumbnail.shape[0]
+        top, left, side = board[3]
+        gray = grayscale(pixels)
+        box = _refine_box(gray, (top * scale, left * scale, side * scale))
+        occupied, edges, brightness = _square_features(gray, box)
+        if self._calibrate(occupied, edges, brightness):
+            self.squares = list(_STARTING_SQUARES)
+            self.last_frame, self.last_fen = frame.key, STARTING_FEN
+            return STARTING_FEN
+        if not self.calibrated:
+            return None
+
+        squares = [-1] * 64
+        kinds = np.argmax(edges @ self.templates.T, axis=-1)
+        for row, column in zip(*np.nonzero(occupied)):
+            colour = WHITE if brightness[row, column] > self.colour_threshold else BLACK
+            squares[self._to_square(row, column)] = colour * 6 + int(kinds[row, column])
+
+        fen = self._fen(squares)
+        if fen is None:
+            logger.debug("Board read from the screenshare isn't a legal chess position")
+            return None
+        self.last_frame, self.last_fen = frame.key, fen
+        return fen
+
+    def _fen(self, squares: List[int]) -> Optional[str]:
+        """Build a FEN from the pieces read, tracking game state, or None if the position is impossible"""
+        for colour in (WHITE, BLACK):
+            if squares.count(colour * 6 + KING) != 1 or sum(1 for code in squares if code >= 0 and code // 6 == colour) > 16:
+                return None
+        if any(squares[square] % 6 == PAWN for square in list(range(8)) + list(range(56, 64)) if squares[square] >= 0):
+            return None
+
+        # A misread must not move the game on, so tracked state is put back unless the position is legal
+        saved = (self.squares, self.side, self.castling, self.en_passant, self.fullmove)
+        fen = self._advance(squares)
+        if fen is None:
+            self.squares, self.side, self.castling, self.en_passant, self.fullmove = saved
+        return fen
+
+    def _advance(self, squares: List[int]) -> Optional[str]:
+        """Track the move to a new position and build its FEN, or None if it isn't legal"""
+        self._track_move(squares)
+        self.squares = squares
+        for right, king, rook in _CASTLING_HOMES:
+            colour = WHITE if king == 4 else BLACK
+            if squares[king] != colour * 6 + KING or squares[rook] != colour * 6 + ROOK:
+                self.castling &= ~right
+
+        castling = "".join(char for char, (right, _, _) in zip("KQkq", _CASTLING_HOMES) if self.castling & right) or "-"
+        en_passant = "-" if self.en_passant is None else square_name(self.en_passant)
+
+        for attempt in range(2):
+            try:
+                position = Position(f"{placement(squares)} {'wb'[self.side]} {castling} {en_passant} 0 {self.fullmove}")
+            except ValueError:
+                return None
+            if not position.is_attacked(position.king_square(position.side ^ 1), position.side):
+                return position.fen()
+            # The side that just moved can't be left in check, so it must be the other side's turn
+            self.side ^= 1
+            en_passant = "-"
+        return None
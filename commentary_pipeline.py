@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import (
+    COMMENTARY_DECIDE_TIMEOUT, COMMENTARY_ANALYSE_TIMEOUT, COMMENTARY_SPEAK_TIMEOUT, COMMENTARY_MAX_AGE
+)
+from frames import Frame
+
+logger = logging.getLogger(__name__)
+
+# Stages a frame goes through after capture, in order
+STAGES = ["decide", "analyse", "speak"]
+
+
+class LatestSlot:
+    def __init__(self):
+        """
+        A queue of one: putting an item replaces the one still waiting
+
+        Made inside the running loop, like the pipeline that uses it.
+        """
+        self.item: Any = None
+        self.full = False
+        self.ready = asyncio.Event()
+
+    def put(self, item: Any) -> Any:
+        """
+        Offer an item without waiting
+
+        Returns:
+            The item it replaced, or None if the slot was empty
+        """
+        replaced = self.item if self.full else None
+        self.item, self.full = item, True
+        self.ready.set()
+        return replaced
+
+    async def get(self) -> Any:
+        """Wait for an item and take it"""
+        while not self.full:
+            self.ready.clear()
+            await self.ready.wait()
+        item, self.item, self.full = self.item, None, False
+        return item
+
+
+class CommentaryJob:
+    def __init__(self, guild_id: int, frame: Frame, plan: Dict[str, Any]):
+        """
+        One proactive comment on its way through the pipeline
+
+        Args:
+            guild_id: Guild whose screenshare the frame is from
+            frame: The frame being commented on
+            plan: What the decide stage settled on, e.g. the content type and prompt
+        """
+        self.guild_id = guild_id
+        self.frame = frame
+        self.plan = plan
+        self.text: Optional[str] = None  # Filled in by the analyse stage
+
+
+class _GuildPipeline:
+    def __init__(self):
+        self.slots: Dict[str, LatestSlot] = {stage: LatestSlot() for stage in STAGES}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.latest: Optional[Frame] = None  # Newest frame submitted, newer work supersedes older
+
+
+class CommentaryPipeline:
+    def __init__(self, decide: Callable[[int, Frame], Awaitable[Optional[Dict[str, Any]]]],
+                 analyse: Callable[[CommentaryJob], Awaitable[Optional[str]]],
+                 speak: Callable[[CommentaryJob], Awaitable[Optional[bool]]],
+                 timeouts: Dict[str, float] = None, max_age: float = None):
+        """
+        Proactive commentary as stages joined by latest-value slots, one set per guild
+
+        Capture only submits frames, so it never waits for a comment to be
+        written or spoken. Each stage works on the newest item offered to it
+        and anything still waiting when a newer one arrives is dropped. A
+        comment finished after the screen moved on to other content, or after
+        `max_age` seconds, is dropped before it is spoken.
+
+        Args:
+            decide: Coroutine checking whether a frame is worth a comment, returning its plan or None
+            analyse: Coroutine writing the comment for a job, returning None to give up
+            speak: Coroutine speaking a job's text, returning False if it couldn't be spoken now
+            timeouts: Seconds each stage may take per item, by stage name (uses config if None)
+            max_age: Seconds after its frame was captured that a comment is no longer worth speaking (uses config if None)
+        """
+        self.handlers = {"decide": decide, "analyse": analyse, "speak": speak}
+        self.timeouts = {"decide": COMMENTARY_DECIDE_TIMEOUT, "analyse": COMMENTARY_ANALYSE_TIMEOUT,
+                         "speak": COMMENTARY_SPEAK_TIMEOUT}
+        self.timeouts.update(timeouts or {})
+        self.max_age = max_age or COMMENTARY_MAX_AGE
+        self.guilds: Dict[int, _GuildPipeline] = {}
+
+        self.metrics: Dict[str, Dict[str, float]] = {
+            stage: {"in": 0, "done": 0, "skipped": 0, "superseded": 0, "stale": 0, "timeouts": 0, "errors": 0,
+                    "seconds": 0.0}
+            for stage in STAGES
+        }
+
+    def submit(self, guild_id: int, frame: Frame) -> None:
+        """Offer a new frame for commentary, returns straight away"""
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            guild = self.guilds[guild_id] = _GuildPipeline()
+            for stage in STAGES:
+                guild.tasks[stage] = asyncio.create_task(self._run(guild_id, guild, stage),
+                                                         name=f"commentary-{stage}-{guild_id}")
+        guild.latest = frame
+        self._offer(guild, "decide", frame)
+
+    def stop(self, guild_id: int) -> None:
+        """Stop a guild's stages, dropping work in flight"""
+        guild = self.guilds.pop(guild_id, None)
+        if guild is None:
+            return
+        for task in guild.tasks.values():
+            task.cancel()
+
+    async def close(self) -> None:
+        guilds = list(self.guilds.values())
+        for guild_id in list(self.guilds):
+            self.stop(guild_id)
+        for guild in guilds:
+            await asyncio.gather(*guild.tasks.values(), return_exceptions=True)
+
+    def _offer(self, guild: _GuildPipeline, stage: str, item: Any) -> None:
+        self.metrics[stage]["in"] += 1
+        if guild.slots[stage].put(item) is not None:
+            self.metrics[stage]["superseded"] += 1
+
+    def _is_stale(self, guild: _GuildPipeline, job: CommentaryJob) -> bool:
+        """Whether a comment is about something no longer on screen"""
+        if job.frame.age > self.max_age:
+            return True
+        latest = guild.latest
+        return (latest is not None and latest is not job.frame
+                and latest.content_type is not None and latest.content_type != job.frame.content_type)
+
+    async def _run(self, guild_id: int, guild: _GuildPipeline, stage: str) -> None:
+        handler = self.handlers[stage]
+        metrics = self.metrics[stage]
+        while True:
+            item = await guild.slots[stage].get()
+            if stage != "decide" and self._is_stale(guild, item):
+                metrics["stale"] += 1
+                logger.debug(f"Dropped a stale comment before the {stage} stage in guild {guild_id}")
+                continue
+
+            started = time.monotonic()
+            try:
+                arguments = (guild_id, item) if stage == "decide" else (item,)
+                result = await asyncio.wait_for(handler(*arguments), self.timeouts[stage])
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                metrics["timeouts"] += 1
+                logger.warning(f"Commentary {stage} stage timed out in guild {guild_id}")
+                continue
+            except Exception as e:
+                metrics["errors"] += 1
+                logger.error(f"Error in commentary {stage} stage: {e}")
+                continue
+            finally:
+                metrics["seconds"] += time.monotonic() - started
+
+            if result is None or result is False:
+                metrics["skipped"] += 1
+                continue
+            metrics["done"] += 1
+
+            if stage == "decide":
+                self._offer(guild, "analyse", CommentaryJob(guild_id, item, result))
+            elif stage == "analyse":
+                item.text = result
+                self._offer(guild, "speak", item)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Counters per stage: items in, done, skipped, superseded, stale, timeouts, errors and time spent"""
+        return {
+            "guilds": len(self.guilds),
+            **{stage: {key: round(value, 3) if key == "seconds" else int(value) for key, value in metrics.items()}
+               for stage, metrics in self.metrics.items()},
+        }
@@ -10,13 +10,51 @@ RUN_BOT_DIRECTLY = os.getenv("RUN_BOT_DIRECTLY", "true").lower() == "true"
 # Discord Bot Configuration
 COMMAND_PREFIX = os.getenv("COMMAND_PREFIX", "!")
 
+# Sharded Deployment (run_bot.py starts one worker process per shard group when SHARD_PROCESSES > 1)
+SHARD_PROCESSES = int(os.getenv("SHARD_PROCESSES", "1"))
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))  # Total gateway shards, 0 means one per process
+SHARD_STATUS_INTERVAL = float(os.getenv("SHARD_STATUS_INTERVAL", "15"))  # Seconds between status reports
+SHARD_RESTART_BACKOFF_MAX = float(os.getenv("SHARD_RESTART_BACKOFF_MAX", "60"))  # Longest wait before restarting a crashed shard
+DASHBOARD_URL = os.getenv("DASHBOARD_URL", "")  # e.g. http://localhost:5000, empty to only log status
+
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# LLM Request Scheduling (voice > intent > dm > text > proactive)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))  # Gemini calls in flight at once
+LLM_PRIORITY_AGING_SECONDS = float(os.getenv("LLM_PRIORITY_AGING_SECONDS", "10"))  # Waiting this long raises a request one class
+LLM_QUEUE_DEADLINES = {  # Seconds a request may wait for its turn before it is dropped as stale
+    "voice": float(os.getenv("LLM_VOICE_DEADLINE", "20")),
+    "intent": float(os.getenv("LLM_INTENT_DEADLINE", "10")),
+    "dm": float(os.getenv("LLM_DM_DEADLINE", "60")),
+    "text": float(os.getenv("LLM_TEXT_DEADLINE", "60")),
+    "proactive": float(os.getenv("LLM_PROACTIVE_DEADLINE", "15")),
+}
+
 # Vision Features
 VISION_ENABLED = os.getenv("VISION_ENABLED", "True").lower() == "true"
 VISION_CONVERSATION_THRESHOLD = float(os.getenv("VISION_CONVERSATION_THRESHOLD", "0.6"))
-SCREENSHOT_INTERVAL = int(os.getenv("SCREENSHOT_INTERVAL", "5"))  # Seconds between screenshots
+SCREENSHOT_INTERVAL = int(os.getenv("SCREENSHOT_INTERVAL", "5"))  # Seconds between screenshots when sampling starts
+SCREENSHOT_MIN_INTERVAL = float(os.getenv("SCREENSHOT_MIN_INTERVAL", "1"))  # Fastest sampling of a screen that keeps changing
+SCREENSHOT_MAX_INTERVAL = float(os.getenv("SCREENSHOT_MAX_INTERVAL", "30"))  # Slowest sampling of a screen that stays the same
+SCREENSHOT_MAX_FPS = float(os.getenv("SCREENSHOT_MAX_FPS", "2"))  # Screenshots per second across all guilds
+VISION_CALLS_PER_MINUTE = int(os.getenv("VISION_CALLS_PER_MINUTE", "20"))  # Vision calls across all guilds, commentary is skipped past it
+SCREENSHARE_FRAME_BUFFER_SIZE = int(os.getenv("SCREENSHARE_FRAME_BUFFER_SIZE", "8"))  # Recent frames kept in memory per guild
+SCREENSHARE_DEDUP_ENABLED = os.getenv("SCREENSHARE_DEDUP_ENABLED", "True").lower() == "true"  # Skip analysis of frames that look unchanged
+SCREENSHARE_HASH_METHOD = os.getenv("SCREENSHARE_HASH_METHOD", "phash")  # Options: phash, dhash
+SCREENSHARE_DEDUP_THRESHOLD = int(os.getenv("SCREENSHARE_DEDUP_THRESHOLD", "6"))  # Max differing hash bits (of 64) for a duplicate
+VISION_CACHE_ENABLED = os.getenv("VISION_CACHE_ENABLED", "True").lower() == "true"  # Reuse answers about an unchanged screen
+VISION_CACHE_TTL = float(os.getenv("VISION_CACHE_TTL", "30"))  # Seconds a cached vision answer stays valid
+VISION_CACHE_MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "64"))
+VISION_SCENE_ANSWERS = os.getenv("VISION_SCENE_ANSWERS", "False").lower() == "true"  # Answer follow-ups from a cached scene description
+VISION_PREPROCESS_ENABLED = os.getenv("VISION_PREPROCESS_ENABLED", "True").lower() == "true"  # Crop, downscale and re-encode frames before upload
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "jpeg")  # Options: jpeg, webp
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "80"))  # Encoder quality, 1-100
+VISION_IMAGE_MAX_SIDE = int(os.getenv("VISION_IMAGE_MAX_SIDE", "1024"))  # Longest side uploaded for content without its own target
+VISION_TEMPORAL_ENABLED = os.getenv("VISION_TEMPORAL_ENABLED", "True").lower() == "true"  # Send recent keyframes with questions about what just happened
+VISION_KEYFRAMES = int(os.getenv("VISION_KEYFRAMES", "4"))  # Most frames in one temporal request, the current one included
+VISION_KEYFRAME_WINDOW = float(os.getenv("VISION_KEYFRAME_WINDOW", "60"))  # Seconds back that keyframes are picked from
+VISION_KEYFRAME_MAX_BYTES = int(os.getenv("VISION_KEYFRAME_MAX_BYTES", "1500000"))  # Total encoded size of the images in one request
 
 # Content Type Detection
 YOUTUBE_DETECTION_ENABLED = os.getenv("YOUTUBE_DETECTION_ENABLED", "True").lower() == "true"
@@ -24,16 +62,90 @@ BOARD_GAMES_DETECTION_ENABLED = os.getenv("BOARD_GAMES_DETECTION_ENABLED", "True
 GEOGUESSER_DETECTION_ENABLED = os.getenv("GEOGUESSER_DETECTION_ENABLED", "True").lower() == "true"
 
 # Game and Content Analysis
-CHESS_ANALYSIS_DEPTH = int(os.getenv("CHESS_ANALYSIS_DEPTH", "3"))  # Moves to look ahead
+CHESS_ANALYSIS_DEPTH = int(os.getenv("CHESS_ANALYSIS_DEPTH", "3"))  # Plies the local engine looks ahead
+CHESS_LOCAL_ANALYSIS = os.getenv("CHESS_LOCAL_ANALYSIS", "True").lower() == "true"  # Read the board and search it locally, the LLM only narrates
+CHESS_ENGINE_TIME_LIMIT = float(os.getenv("CHESS_ENGINE_TIME_LIMIT", "2"))  # Seconds before the engine settles for a shallower search
+YOUTUBE_CONTEXT_ENABLED = os.getenv("YOUTUBE_CONTEXT_ENABLED", "True").lower() == "true"  # Keep each video's title and earlier comments for later prompts
+YOUTUBE_OCR_ENABLED = os.getenv("YOUTUBE_OCR_ENABLED", "True").lower() == "true"  # Read video titles locally with Tesseract when it is installed
+YOUTUBE_CONTEXT_MAX_VIDEOS = int(os.getenv("YOUTUBE_CONTEXT_MAX_VIDEOS", "8"))  # Videos remembered per guild
+YOUTUBE_SUMMARY_COMMENTS = int(os.getenv("YOUTUBE_SUMMARY_COMMENTS", "5"))  # Earlier comments on a video repeated in its prompts
+YOUTUBE_CONTEXT_MIN_SIDE = int(os.getenv("YOUTUBE_CONTEXT_MIN_SIDE", "512"))  # Smallest frame sent once a video's context is known
 PROACTIVE_COMMENTARY = os.getenv("PROACTIVE_COMMENTARY", "True").lower() == "true"  # Comment without being asked
+COMMENTARY_DECIDE_TIMEOUT = float(os.getenv("COMMENTARY_DECIDE_TIMEOUT", "5"))  # Seconds to decide whether a frame is worth a comment
+COMMENTARY_ANALYSE_TIMEOUT = float(os.getenv("COMMENTARY_ANALYSE_TIMEOUT", "30"))  # Seconds to write a comment before it is given up
+COMMENTARY_SPEAK_TIMEOUT = float(os.getenv("COMMENTARY_SPEAK_TIMEOUT", "10"))  # Seconds to hand a comment to playback
+COMMENTARY_MAX_AGE = float(os.getenv("COMMENTARY_MAX_AGE", "45"))  # Seconds after capture that a comment is still worth speaking
 
 # Text Interaction Features
 TEXT_ENABLED = os.getenv("TEXT_ENABLED", "True").lower() == "true"
 MESSAGE_HISTORY_LIMIT = int(os.getenv("MESSAGE_HISTORY_LIMIT", "20"))
 TEXT_COOLDOWN_SECONDS = int(os.getenv("TEXT_COOLDOWN_SECONDS", "5"))
+TEXT_STREAMING_ENABLED = os.getenv("TEXT_STREAMING_ENABLED", "True").lower() == "true"  # Edit replies in place as they generate
+TEXT_STREAM_EDIT_INTERVAL = float(os.getenv("TEXT_STREAM_EDIT_INTERVAL", "1.0"))  # Minimum seconds between message edits
+TEXT_MESSAGE_LIMIT = int(os.getenv("TEXT_MESSAGE_LIMIT", "1900"))  # Discord has a 2000 char limit
+
+# Voice Session Pipeline (bounded queues between ingest, ASR, decide, respond and playback)
+VOICE_POLL_INTERVAL = float(os.getenv("VOICE_POLL_INTERVAL", "0.5"))  # Seconds between audio intake polls
+VOICE_ASR_QUEUE_SIZE = int(os.getenv("VOICE_ASR_QUEUE_SIZE", "8"))
+VOICE_DECIDE_QUEUE_SIZE = int(os.getenv("VOICE_DECIDE_QUEUE_SIZE", "8"))
+VOICE_RESPOND_QUEUE_SIZE = int(os.getenv("VOICE_RESPOND_QUEUE_SIZE", "2"))
+VOICE_PLAYBACK_QUEUE_SIZE = int(os.getenv("VOICE_PLAYBACK_QUEUE_SIZE", "3"))
+
+# Barge-In (a user talking over Rupert stops his reply)
+VOICE_BARGE_IN_ENABLED = os.getenv("VOICE_BARGE_IN_ENABLED", "True").lower() == "true"
+VOICE_BARGE_IN_WINDOW = float(os.getenv("VOICE_BARGE_IN_WINDOW", "0.15"))  # Seconds between audio polls while Rupert has the floor
+VOICE_BARGE_IN_GRACE = float(os.getenv("VOICE_BARGE_IN_GRACE", "1.0"))  # Speech this soon after a reply starts is the end of the question
+VOICE_BARGE_IN_MIN_RMS = float(os.getenv("VOICE_BARGE_IN_MIN_RMS", "500"))  # RMS level of 16-bit PCM that counts as speech rather than noise
+VOICE_BARGE_IN_MIN_SPEECH = float(os.getenv("VOICE_BARGE_IN_MIN_SPEECH", "0.3"))  # Seconds of speech in a row needed to interrupt Rupert
+
+# Long-Term Memory (per-guild vector index of past conversation turns)
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "True").lower() == "true"
+MEMORY_DIR = os.getenv("MEMORY_DIR", "memory")
+MEMORY_EMBEDDING_DIM = int(os.getenv("MEMORY_EMBEDDING_DIM", "512"))
+MEMORY_CAPACITY = int(os.getenv("MEMORY_CAPACITY", "5000"))  # Turns kept per guild before the oldest are evicted
+MEMORY_INITIAL_CAPACITY = int(os.getenv("MEMORY_INITIAL_CAPACITY", "256"))  # Turns a new index has room for, doubled as it fills
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "3"))  # Memories added to each prompt
+MEMORY_MIN_SIMILARITY = float(os.getenv("MEMORY_MIN_SIMILARITY", "0.25"))
+MEMORY_SAVE_EVERY = int(os.getenv("MEMORY_SAVE_EVERY", "10"))  # Turns between metadata saves
+MEMORY_MAX_OPEN_INDEXES = int(os.getenv("MEMORY_MAX_OPEN_INDEXES", "32"))  # Guild and DM indexes kept open before the least recently used is closed
 
 # Piper TTS Configuration
 PIPER_VOICE = os.getenv("PIPER_VOICE", "en_US-lessac-medium")
+PIPER_INTRA_OP_THREADS = int(os.getenv("PIPER_INTRA_OP_THREADS", "2"))  # ONNX runtime threads per synthesis, 0 = all cores
+
+# TTS Engine Routing (fastest healthy engine, with circuit breakers on failing ones)
+TTS_ENGINE_PREFERENCE = [
+    engine.strip().lower() for engine in os.getenv("TTS_ENGINE_PREFERENCE", "piper,google,gtts").split(",") if engine.strip()
+]  # Engines allowed to speak, most preferred voice first
+TTS_ENGINE_TIMEOUT = float(os.getenv("TTS_ENGINE_TIMEOUT", "15"))  # Seconds before a synthesis attempt counts as failed
+TTS_ROUTER_SWITCH_RATIO = float(os.getenv("TTS_ROUTER_SWITCH_RATIO", "2.0"))  # A less preferred engine must be this much faster to be chosen
+TTS_HEALTH_WINDOW = int(os.getenv("TTS_HEALTH_WINDOW", "20"))  # Recent attempts used for latency and error rate
+TTS_BREAKER_FAILURES = int(os.getenv("TTS_BREAKER_FAILURES", "3"))  # Consecutive failures that open the breaker
+TTS_BREAKER_ERROR_RATE = float(os.getenv("TTS_BREAKER_ERROR_RATE", "0.5"))  # Error rate over a full window that opens the breaker
+TTS_BREAKER_COOLDOWN = float(os.getenv("TTS_BREAKER_COOLDOWN", "60"))  # Seconds before a tripped engine is tried again
+
+# TTS Audio Cache (memory and disk tiers keyed by engine, voice settings and text)
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "True").lower() == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "32"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "256"))
+TTS_CACHE_MAX_TEXT_LENGTH = int(os.getenv("TTS_CACHE_MAX_TEXT_LENGTH", "300"))  # Longer replies are not cached
+
+# Fixed phrases synthesized at startup so they play without delay
+JOIN_GREETING = "Hello! I'm Rupert and I'm ready to chat!"
+TTS_PREWARM_PHRASES = [
+    JOIN_GREETING,
+    "I don't see anyone sharing their screen right now.",
+    "I'm having trouble seeing what's on the screen right now.",
+    "I'm having trouble analyzing what's on the screen right now.",
+    "I'm having trouble analyzing the image right now.",
+    "Unable to analyze the image at this time.",
+    "I'm having trouble thinking right now. Can you try again?",
+]
+
+# Sentence-Pipelined Speech (synthesize the next sentences while the current one plays)
+TTS_PIPELINE_LOOKAHEAD = int(os.getenv("TTS_PIPELINE_LOOKAHEAD", "2"))
+TTS_SENTENCE_MIN_LENGTH = int(os.getenv("TTS_SENTENCE_MIN_LENGTH", "20"))  # Shorter fragments join the next sentence
 
 # Speech Recognition Configuration
 SPEECH_LANGUAGE = os.getenv("SPEECH_LANGUAGE", "en-US")
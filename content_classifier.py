@@ -0,0 +1,541 @@
+import collections
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from frames import Frame, grayscale
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = ["youtube", "chess", "checkers", "geoguesser", "unknown"]
+
+# Classifications remembered by perceptual hash, so an unchanged screen is never classified twice
+_MEMO_SIZE = 64
+_memo: "collections.OrderedDict[int, str]" = collections.OrderedDict()
+_memo_lock = threading.Lock()  # Frames are classified from executor threads
+
+# Board square sizes tried shrink by this factor, down to boards this tall relative to the thumbnail
+_BOARD_SCALE_STEP = 0.9
+_BOARD_MIN_SIDE = 0.4
+_BOARD_PARITY = (np.add.outer(np.arange(8), np.arange(8)) % 2).astype(bool)
+
+# Rows of the full-size frame searched for YouTube red, the progress bar is at least three pixels tall at 1080p
+_RED_ROW_STEP = 2
+
+# Below the player of a watch page: the title, then the channel line, as a fraction of the player height
+_TITLE_STRIP = (0.015, 0.2)
+
+
+def _integral(values: np.ndarray) -> np.ndarray:
+    """Summed-area table with a leading row and column of zeros"""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    # Summed in float64 throughout, float32 loses whole grey levels over a thumbnail
+    table[1:, 1:] = values
+    table.cumsum(0, out=table)
+    table.cumsum(1, out=table)
+    return table
+
+
+def _box_means(table: np.ndarray, size: int) -> np.ndarray:
+    """Mean of every size x size patch, indexed by its top-left corner"""
+    return (table[size:, size:] - table[:-size, size:] - table[size:, :-size] + table[:-size, :-size]) / (size * size)
+
+
+def _corner_patch(cell: float) -> Tuple[int, int]:
+    """Inset and side of the patch near a square's corner that its colour is read from"""
+    return max(1, round(cell * 0.07)), max(1, round(cell * 0.14))
+
+
+def _grid_scores(corners: np.ndarray, cell: float, rows: slice, cols: slice) -> np.ndarray:
+    """
+    How strongly an 8x8 grid of alternating squares starts at each position
+
+    Only the top-left corner patch of each square is read, which tolerates a
+    grid that is off by a fraction of a square and suits a coarse search.
+
+    Args:
+        corners: Mean of the corner patch at every pixel stacked on its square, see _box_means
+        cell: Square side in pixels
+        rows, cols: Board top-left positions to score
+
+    Returns:
+        Contrast between the two square colours over their spread, 0 where the contrast is too low
+    """
+    offset, _ = _corner_patch(cell)
+    height = len(range(rows.start, rows.stop, rows.step))
+    width = len(range(cols.start, cols.stop, cols.step))
+
+    # Sum the rows of the even and odd ranks first, then pick alternating files from them,
+    # means and squares together so each step is one array operation
+    sums = [0.0, 0.0]
+    for rank_parity in (0, 1):
+        rank_sum = 0.0
+        for i in range(rank_parity, 8, 2):
+            top = offset + round(i * cell) + rows.start
+            rank_sum = rank_sum + corners[:, top:top + (height - 1) * rows.step + 1:rows.step]
+        for j in range(8):
+            left = offset + round(j * cell) + cols.start
+            parity = (rank_parity + j) % 2
+            sums[parity] = sums[parity] + rank_sum[:, :, left:left + (width - 1) * cols.step + 1:cols.step]
+
+    averages = [total[0] / 32 for total in sums]
+    spread = sum(np.sqrt(np.maximum(sums[k][1] / 32 - averages[k] * averages[k], 0)) for k in (0, 1))
+    contrast = np.abs(averages[0] - averages[1])
+    return np.where(contrast >= 25, contrast / (spread + 4), 0)
+
+
+def _aligned_scores(table: np.ndarray, cell: float, tops: np.ndarray, lefts: np.ndarray) -> np.ndarray:
+    """
+    Like _grid_scores, but reading all four corners of every square
+
+    That only scores well when the grid lines up with the squares. Medians
+    keep the odd corner covered by a piece from spoiling the score.
+
+    Args:
+        table: Summed-area table of the image
+        cell: Square side in pixels
+        tops, lefts: Board top-left positions to score, every combination is tried
+
+    Returns:
+        Array of shape (len(tops), len(lefts))
+    """
+    offset, size = _corner_patch(cell)
+    insets = np.array([offset, max(offset, round(cell) - offset - size)])
+    starts = np.round(np.arange(8) * cell).astype(int)
+    # Patch corners of shape (tops, insets, ranks) and (lefts, insets, files)
+    ys = tops[:, None, None] + insets[None, :, None] + starts[None, None, :]
+    xs = lefts[:, None, None] + insets[None, :, None] + starts[None, None, :]
+    y0, y1 = ys[:, None, :, None, :, None], ys[:, None, :, None, :, None] + size
+    x0, x1 = xs[None, :, None, :, None, :], xs[None, :, None, :, None, :] + size
+    patches = (table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]) / (size * size)
+
+    # (tops, lefts, 4 corners, 8, 8) -> samples of each square colour
+    patches = patches.reshape(len(tops), len(lefts), 4, 8, 8)
+    even, odd = patches[..., ~_BOARD_PARITY].reshape(len(tops), len(lefts), -1), patches[..., _BOARD_PARITY].reshape(len(tops), len(lefts), -1)
+    even_median, odd_median = np.median(even, axis=-1), np.median(odd, axis=-1)
+    spread = (np.median(np.abs(even - even_median[..., None]), axis=-1)
+              + np.median(np.abs(odd - odd_median[..., None]), axis=-1))
+    contrast = np.abs(even_median - odd_median)
+
+    # A grid a square off the board still has seven good ranks, but the eighth doesn't alternate
+    signs = np.where(_BOARD_PARITY, 1.0, -1.0)
+    squares = np.median(patches, axis=2) * signs
+    weakest = np.minimum(np.abs(squares.mean(axis=-1)).min(axis=-1), np.abs(squares.mean(axis=-2)).min(axis=-1)) * 2
+    alternation = np.clip(weakest / np.maximum(contrast, 1), 0, 1)
+    return np.where(contrast >= 25, contrast * alternation / (spread + 4), 0)
+
+
+def _best_grid(table: np.ndarray, boxes: Dict[int, np.ndarray], cell: float, rows: slice,
+               cols: slice) -> Tuple[float, int, int]:
+    """The best scoring board position of one square size, as (score, top, left)"""
+    h, w = table.shape[0] - 1, table.shape[1] - 1
+    span_y, span_x = h - int(np.ceil(8 * cell)) + 1, w - int(np.ceil(8 * cell)) + 1
+    rows = slice(max(0, rows.start), min(span_y, rows.stop), rows.step)
+    cols = slice(max(0, cols.start), min(span_x, cols.stop), cols.step)
+    if rows.start >= rows.stop or cols.start >= cols.stop:
+        return 0.0, 0, 0
+
+    size = _corner_patch(cell)[1]
+    if size not in boxes:
+        means = _box_means(table, size)
+        boxes[size] = np.stack((means, means * means))
+    scores = _grid_scores(boxes[size], cell, rows, cols)
+    y, x = np.unravel_index(np.argmax(scores), scores.shape)
+    return float(scores[y, x]), rows.start + y * rows.step, cols.start + x * cols.step
+
+
+def _cell_means(table: np.ndarray, tops: np.ndarray, lefts: np.ndarray, size: int) -> np.ndarray:
+    """Mean of the size x size patch at every combination of a top and a left edge"""
+    bottoms, rights = tops + size, lefts + size
+    total = (table[bottoms[:, None], rights[None, :]] - table[tops[:, None], rights[None, :]]
+             - table[bottoms[:, None], lefts[None, :]] + table[tops[:, None], lefts[None, :]])
+    return total / (size * size)
+
+
+def _fit_grid_lines(profile: np.ndarray, sizes: np.ndarray, origins: np.ndarray) -> np.ndarray:
+    """
+    Edge strength along the nine lines of a board for every square size and origin
+
+    Args:
+        profile: Edge strength summed across the board, one value per pixel along it
+        sizes: Square sizes to try
+        origins: First line positions to try
+
+    Returns:
+        Array of shape (len(sizes), len(origins))
+    """
+    positions = np.round(origins[None, :, None] + sizes[:, None, None] * np.arange(9)).astype(int)
+    padded = np.append(profile, 0)
+    return padded[np.minimum(positions, len(profile))].sum(axis=-1)
+
+
+def find_board(gray: np.ndarray) -> Optional[Tuple[float, np.ndarray, np.ndarray, Tuple[int, int, int]]]:
+    """
+    Look for an 8x8 grid of alternating squares
+
+    Square colours are read from a patch near each square's corner, where
+    pieces rarely reach, and occupancy from the square's centre. Every board
+    size is searched on a coarse grid of positions at half resolution, then
+    the exact square size and origin of the best match, and of the runner-up
+    if it is somewhere else, are fitted to the edges between squares at full
+    resolution. Frames without a contrasting grid anywhere stop after the
+    coarse search.
+
+    Args:
+        gray: Grayscale thumbnail
+
+    Returns:
+        (score, occupied, light, (top, left, side)) for the best grid, where
+        occupied and light are 8x8 boolean arrays and the box is in thumbnail
+        pixels, or None if nothing looks like a board
+    """
+    h, w = gray.shape
+    half = gray[:h - h % 2, :w - w % 2]
+    half = (half[0::2, 0::2] + half[1::2, 0::2] + half[0::2, 1::2] + half[1::2, 1::2]) / 4
+    coarse_table = _integral(half)
+    coarse_boxes: Dict[int, np.ndarray] = {}
+
+    matches = []
+    cell = min(half.shape) / 8
+    while cell >= _BOARD_MIN_SIDE * half.shape[0] / 8 and cell >= 3:
+        step = max(1, round(cell / 3))
+        score, y, x = _best_grid(coarse_table, coarse_boxes, cell, slice(0, h, step), slice(0, w, step))
+        matches.append((score, cell, y, x, step))
+        cell *= _BOARD_SCALE_STEP
+    if not matches or max(matches)[0] <= 0:
+        # No grid anywhere has two contrasting square colours, most frames end here
+        return None
+
+    table = _integral(gray)
+
+    candidates = sorted(matches, reverse=True)[:2]
+    if len(candidates) == 2:
+        (_, cell, y, x, _), (_, other_cell, other_y, other_x, _) = candidates
+        if abs(other_cell / cell - 1) < 0.15 and abs(other_y - y) < cell and abs(other_x - x) < cell:
+            # The runner-up is the same board at the neighbouring size, the fit below covers both sizes
+            candidates = candidates[:1]
+
+    best = (0.0, 0.0, 0, 0)
+    for _, cell, y, x, step in candidates:
+        cell, y, x, step = cell * 2, y * 2, x * 2, step * 2
+        # One corner patch also matches a grid up to most of a square right of or below the board
+        origins_y = np.arange(max(0, y - round(cell * 0.8) - step), y + round(cell * 0.1) + step + 1)
+        origins_x = np.arange(max(0, x - round(cell * 0.8) - step), x + round(cell * 0.1) + step + 1)
+        # Square sizes between the coarse steps too, a small error adds up over eight squares
+        sizes = np.arange(cell * 0.92, cell * 1.08, 0.05)
+
+        band_y = slice(max(0, y - round(cell)), y + round(cell * 9))
+        band_x = slice(max(0, x - round(cell)), x + round(cell * 9))
+        # Edge strength between each pixel and the one before it, summed across the band
+        profile_x = np.concatenate(([0], np.abs(np.diff(gray[band_y], axis=1)).sum(axis=0)))
+        profile_y = np.concatenate(([0], np.abs(np.diff(gray[:, band_x], axis=0)).sum(axis=1)))
+        fit_x = _fit_grid_lines(profile_x, sizes, origins_x)
+        fit_y = _fit_grid_lines(profile_y, sizes, origins_y)
+        size_index = np.argmax(fit_x.max(axis=1) + fit_y.max(axis=1))
+        size = float(sizes[size_index])
+        top = int(origins_y[np.argmax(fit_y[size_index])])
+        left = int(origins_x[np.argmax(fit_x[size_index])])
+
+        # Lines alone can't tell a board from the same grid shifted by a whole square
+        nudges = np.round(np.array([-size, 0, size])).astype(int)
+        tops, lefts = top + nudges, left + nudges
+        tops = tops[(tops >= 0) & (tops + np.ceil(8 * size) <= h)]
+        lefts = lefts[(lefts >= 0) & (lefts + np.ceil(8 * size) <= w)]
+        if len(tops) and len(lefts):
+            scores = _aligned_scores(table, size, tops, lefts)
+            i, j = np.unravel_index(np.argmax(scores), scores.shape)
+            if scores[i, j] > best[0]:
+                best = (float(scores[i, j]), size, int(tops[i]), int(lefts[j]))
+
+    score, cell, y, x = best
+    if score < 2.5:
+        return None
+
+    offset, size = _corner_patch(cell)
+    inner = max(1, round(cell * 0.4))
+    starts = np.round(np.arange(8) * cell).astype(int)
+    squares = _cell_means(table, y + starts + offset, x + starts + offset, size)
+    middle_y, middle_x = y + starts + round((cell - inner) / 2), x + starts + round((cell - inner) / 2)
+    centre = _cell_means(table, middle_y, middle_x, inner)
+    # Squares are only needed over the board itself
+    board = gray[y:, x:][:int(np.ceil(8 * cell)) + 1, :int(np.ceil(8 * cell)) + 1]
+    squared = _cell_means(_integral(board * board), middle_y - y, middle_x - x, inner)
+    centre_std = np.sqrt(np.maximum(squared - centre * centre, 0))
+
+    light = _BOARD_PARITY if squares[_BOARD_PARITY].mean() > squares[~_BOARD_PARITY].mean() else ~_BOARD_PARITY
+    occupied = (np.abs(centre - squares) > 20) | (centre_std > 18)
+    return score, occupied, light, (y, x, int(round(8 * cell)))
+
+
+def _youtube_red(pixels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Every _RED_ROW_STEP full-resolution rows with columns sampled, and where they are YouTube red"""
+    stride = max(1, pixels.shape[1] // 240)
+    strip = pixels[::_RED_ROW_STEP, ::stride, :3]
+    red = (strip[..., 0] >= 190) & (strip[..., 1] <= 70) & (strip[..., 2] <= 90)
+    return strip, red, stride
+
+
+def _progress_bar(red: np.ndarray) -> Optional[Tuple[int, int, int]]:
+    """
+    Find the played part of the progress bar in a red mask
+
+    Returns:
+        (row, first column, last column) of the bar in mask coordinates, or None
+    """
+    h, columns = red.shape
+    # Rows with enough red, grouped into bands that are at most a few pixels thick
+    min_run = max(4, int(columns * 0.015))
+    bar_rows = (red.sum(axis=1) >= min_run).astype(np.int8)
+    max_thickness = max(2, int(h * 0.01))
+    bands = np.flatnonzero(np.diff(np.concatenate(([0], bar_rows, [0]))))
+    for start, row in zip(bands[::2], bands[1::2]):
+        if row - start > max_thickness:
+            continue
+        # The bar is one unbroken run of red, not scattered red text
+        band = red[start:row].any(axis=0).astype(np.int8)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], band, [0]))))
+        runs = edges[1::2] - edges[::2]
+        longest = int(np.argmax(runs))
+        if runs[longest] >= min_run:
+            return start, int(edges[2 * longest]), int(edges[2 * longest + 1]) - 1
+    return None
+
+
+def find_youtube_chrome(pixels: np.ndarray) -> bool:
+    """
+    Look for the YouTube player: its thin red progress bar, or the red logo in the top-left corner
+
+    Works on full-resolution rows with columns sampled, because the progress
+    bar is only a few pixels tall and would vanish from a thumbnail.
+
+    Args:
+        pixels: Full-size RGB array
+
+    Returns:
+        True if YouTube chrome was found
+    """
+    strip, red, stride = _youtube_red(pixels)
+    if _progress_bar(red) is not None:
+        return True
+
+    # The logo: a red rounded rectangle, wider than tall, with a white play triangle in it
+    # Only the masthead, so red in the video itself doesn't get mixed in
+    region = red[:max(1, red.shape[0] // 16), :max(1, strip.shape[1] // 4)]
+    rows, cols = np.nonzero(region)
+    if len(rows) >= 6:
+        top, bottom, left, right = rows.min(), rows.max() + 1, cols.min(), cols.max() + 1
+        box = region[top:bottom, left:right]
+        aspect = (right - left) * stride / max(1, (bottom - top) * _RED_ROW_STEP)
+        box_pixels = strip[top:bottom, left:right]
+        white = (box_pixels.min(axis=-1) >= 220).mean()
+        if box.mean() >= 0.55 and 1.1 <= aspect <= 1.9 and 0.02 <= white <= 0.4:
+            return True
+    return False
+
+
+def find_youtube_player(pixels: np.ndarray, thumbnail: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Estimate where the video is from the progress bar
+
+    The bar starts just inside the player's left edge and sits a little above
+    its bottom. The top is the first row above the bar where flat page
+    background begins, and the width follows from a 16:9 video.
+
+    Args:
+        pixels: Full-size RGB array
+        thumbnail: The same image shrunk, see Frame.thumbnail
+
+    Returns:
+        (top, left, bottom, right) in full-size pixels, or None without a visible progress bar
+    """
+    h, w = pixels.shape[:2]
+    _, red, stride = _youtube_red(pixels)
+    bar = _progress_bar(red)
+    if bar is None:
+        return None
+    bar_row, first, last = bar[0] * _RED_ROW_STEP, bar[1] * stride, (bar[2] + 1) * stride
+
+    scale = thumbnail.shape[0] / h
+    band = grayscale(thumbnail)[:int(bar_row * scale), int(first * scale):max(int(first * scale) + 2, int(last * scale))]
+    flat = band.std(axis=1) < 2.5 if band.size else np.zeros(0, dtype=bool)
+    top = 0
+    # Three flat rows in a row are page background rather than a dark patch of video
+    for row in range(len(flat) - 1, 1, -1):
+        if flat[row] and flat[row - 1] and flat[row - 2]:
+            top = int((row + 1) / scale)
+            break
+
+    # Controls take about the bottom 5.5% of the player, below the bar
+    height = (bar_row - top) / 0.945
+    width = height * 16 / 9
+    if width < w * 0.2:
+        return None
+    left = max(0, int(first - width * 0.01))
+    return top, left, min(h, int(top + height)), min(w, int(left + width))
+
+
+def title_region(pixels: np.ndarray, thumbnail: np.ndarray,
+                 player: Tuple[int, int, int, int] = None) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Where the title and channel of the playing video are on a watch page
+
+    Args:
+        pixels: Full-size RGB array
+        thumbnail: The same image shrunk, see Frame.thumbnail
+        player: The player's region if already found by find_youtube_player
+
+    Returns:
+        (top, left, bottom, right) in full-size pixels, or None without a player or room below it
+    """
+    if player is None:
+        player = find_youtube_player(pixels, thumbnail)
+        if player is None:
+            return None
+    top, left, bottom, right = player
+    height = bottom - top
+    strip_top, strip_bottom = bottom + int(height * _TITLE_STRIP[0]), bottom + int(height * _TITLE_STRIP[1])
+    if strip_bottom > pixels.shape[0]:
+        # Theatre or full screen, the title is only shown over the video on hover
+        return None
+    return strip_top, left, strip_bottom, right
+
+
+def street_view_score(thumbnail: np.ndarray) -> float:
+    """
+    How much a frame looks like a street-level photo: sky above, ground below, natural texture and colour
+
+    Args:
+        thumbnail: RGB thumbnail
+
+    Returns:
+        Score from 0 to 1, 0.5 or more means street view
+    """
+    small = thumbnail[::2, ::2]
+    h = small.shape[0]
+    # Channel by channel, reducing over a last axis of three is several times slower
+    r, g, b = small[..., 0], small[..., 1], small[..., 2]
+    value = np.maximum(np.maximum(r, g), b)
+    saturation = (value - np.minimum(np.minimum(r, g), b)) / np.maximum(value, 1)
+
+    top, bottom = slice(0, int(h * 0.35)), slice(int(h * 0.5), h)
+    sky = ((b[top] >= r[top] - 5) & (value[top] >= 140) & (saturation[top] <= 0.6)).mean()
+    brighter_above = value[top].mean() - value[bottom].mean() > 10
+
+    gray = grayscale(small)
+    gradient = np.abs(np.diff(gray, axis=0))[:, :-1] + np.abs(np.diff(gray, axis=1))[:-1, :]
+    flat = (gradient < 3).mean()
+
+    # Photos spread over many colours, UIs sit in a few flat ones
+    quantized = (small.astype(np.uint8) >> 4).astype(np.int32)
+    bins = np.bincount((quantized[..., 0] * 256 + quantized[..., 1] * 16 + quantized[..., 2]).ravel(), minlength=4096)
+    probabilities = bins[bins > 0] / value.size
+    entropy = float(-(probabilities * np.log2(probabilities)).sum())
+
+    score = (min(1.0, sky / 0.25) * float(np.clip((entropy - 3) / 2, 0, 1))
+             * float(np.clip((0.65 - flat) / 0.25, 0, 1)))
+    return score if brighter_above else score / 2
+
+
+def classify_pixels(pixels: np.ndarray, thumbnail: np.ndarray) -> str:
+    """
+    Classify a screenshot from its pixels
+
+    Args:
+        pixels: Full-size RGB array
+        thumbnail: The same image shrunk, see Frame.thumbnail
+
+    Returns:
+        One of CONTENT_TYPES
+    """
+    if find_youtube_chrome(pixels):
+        return "youtube"
+
+    board = find_board(grayscale(thumbnail))
+    if board is not None:
+        _, occupied, light, _ = board
+        on_light, on_dark = int((occupied & light).sum()), int((occupied & ~light).sum())
+        # Checkers pieces only ever stand on the dark squares
+        if on_dark >= 3 and on_light <= on_dark // 8:
+            return "checkers"
+        return "chess"
+
+    if street_view_score(thumbnail) >= 0.5:
+        return "geoguesser"
+    return "unknown"
+
+
+def classify_frame(frame: Frame) -> str:
+    """
+    Classify a screenshare frame, remembering the answer by perceptual hash
+
+    Args:
+        frame: The captured screenshare frame
+
+    Returns:
+        One of CONTENT_TYPES, unknown for frames that can't be decoded
+    """
+    frame_hash = frame.perceptual_hash()
+    if frame_hash is None:
+        return "unknown"
+    with _memo_lock:
+        if frame_hash in _memo:
+            _memo.move_to_end(frame_hash)
+            return _memo[frame_hash]
+
+    result = classify_pixels(frame.pixels(), frame.thumbnail())
+    with _memo_lock:
+        _memo[frame_hash] = result
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return result
+
+
+def evaluate(fixtures_dir: str) -> Dict[str, Any]:
+    """
+    Measure accuracy and latency on labelled screenshots
+
+    Args:
+        fixtures_dir: Directory with one subdirectory per content type, each holding screenshots
+
+    Returns:
+        Accuracy, the number of images, p50/p95 time in milliseconds to shrink and
+        classify a decoded frame, and the misclassified images as "label/name: predicted"
+    """
+    results, timings, misclassified = [], [], []
+    for label in CONTENT_TYPES:
+        directory = os.path.join(fixtures_dir, label)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name), "rb") as f:
+                frame = Frame(f.read())
+            pixels = frame.pixels()
+            if pixels is None:
+                continue
+
+            # Decoding is shared with everything else that looks at a frame, shrinking it is the classifier's cost
+            start = time.perf_counter()
+            predicted = classify_pixels(pixels, frame.thumbnail())
+            timings.append((time.perf_counter() - start) * 1000)
+            results.append(predicted == label)
+            if predicted != label:
+                misclassified.append(f"{label}/{name}: {predicted}")
+                logger.info(f"{label}/{name}: classified as {predicted}")
+
+    if not results:
+        return {"images": 0, "misclassified": []}
+    timings.sort()
+    report = {
+        "images": len(results),
+        "accuracy": round(sum(results) / len(results), 3),
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "misclassified": misclassified,
+    }
+    logger.info(f"Content classifier: {report['accuracy']:.1%} of {report['images']} images, "
+                f"p50 {report['p50_ms']} ms, p95 {report['p95_ms']} ms")
+    return report
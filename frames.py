@@ -0,0 +1,309 @@
+import collections
+import io
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import (
+    SCREENSHARE_FRAME_BUFFER_SIZE, SCREENSHARE_DEDUP_ENABLED, SCREENSHARE_HASH_METHOD, SCREENSHARE_DEDUP_THRESHOLD
+)
+
+logger = logging.getLogger(__name__)
+
+_sequence = itertools.count(1)
+
+# Rows of the shared thumbnail that hashing and classification work on
+THUMBNAIL_HEIGHT = 180
+
+# Side of the DCT input for pHash, only its top-left 8x8 low frequencies are kept
+_PHASH_SIZE = 32
+_dct_matrix: Optional[np.ndarray] = None
+
+def grayscale(pixels: np.ndarray) -> np.ndarray:
+    """Luma of an RGB array as float32"""
+    return pixels[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+def downscale(pixels: np.ndarray, height: int, width: int) -> np.ndarray:
+    """
+    Resize an image by averaging the block of pixels behind each output pixel
+
+    Args:
+        pixels: Grayscale (height, width) or colour (height, width, channels) array
+        height: Output rows
+        width: Output columns
+
+    Returns:
+        The resized image as float32
+    """
+    h, w = pixels.shape[:2]
+    if h < height or w < width:
+        # Tiny images are first stretched so every output pixel has at least one source pixel
+        rows = np.arange(max(h, height)) * h // max(h, height)
+        cols = np.arange(max(w, width)) * w // max(w, width)
+        pixels = pixels[rows][:, cols]
+        h, w = pixels.shape[:2]
+
+    row_edges = np.linspace(0, h, height + 1).astype(int)
+    col_edges = np.linspace(0, w, width + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(pixels, row_edges[:-1], axis=0, dtype=np.float32), col_edges[:-1], axis=1)
+    counts = np.outer(np.diff(row_edges), np.diff(col_edges)).astype(np.float32)
+    return sums / (counts[..., None] if sums.ndim == 3 else counts)
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def dhash(pixels: np.ndarray) -> int:
+    """
+    64-bit difference hash: whether each pixel of a 9x8 thumbnail is brighter than its left neighbour
+
+    Args:
+        pixels: RGB array of shape (height, width, 3)
+
+    Returns:
+        The hash as an integer
+    """
+    small = grayscale(downscale(pixels, 8, 9))
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+def phash(pixels: np.ndarray) -> int:
+    """
+    64-bit DCT hash: whether each of the 8x8 lowest frequencies of a 32x32 thumbnail is above their median
+
+    Slower than dHash but less sensitive to small shifts, compression noise and overlays.
+
+    Args:
+        pixels: RGB array of shape (height, width, 3)
+
+    Returns:
+        The hash as an integer
+    """
+    global _dct_matrix
+    if _dct_matrix is None:
+        k = np.arange(_PHASH_SIZE)[:, None]
+        n = np.arange(_PHASH_SIZE)[None, :]
+        _dct_matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * _PHASH_SIZE)).astype(np.float32)
+
+    small = grayscale(downscale(pixels, _PHASH_SIZE, _PHASH_SIZE))
+    low = (_dct_matrix @ small @ _dct_matrix.T)[:8, :8]
+    # The DC term is just overall brightness, leave it out of the median
+    return _pack_bits(low > np.median(low.ravel()[1:]))
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of bits that differ between two hashes"""
+    return bin(a ^ b).count("1")
+
+_HASH_METHODS = {"phash": phash, "dhash": dhash}
+
+class Frame:
+    def __init__(self, data: bytes, mime_type: str = "image/png", source_id: int = 0, timestamp: float = None):
+        """
+        One captured screenshare image held in memory
+
+        Args:
+            data: The encoded image (PNG, JPEG, ...)
+            mime_type: MIME type of the encoded image
+            source_id: ID of the member whose screen this is
+            timestamp: Capture time (now if None)
+        """
+        self.data = data
+        self.mime_type = mime_type
+        self.source_id = source_id
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.sequence = next(_sequence)
+        self._pixels: Optional[np.ndarray] = None
+        self._thumbnail: Optional[np.ndarray] = None
+        self._hashes: Dict[str, Optional[int]] = {}
+        self.content_type: Optional[str] = None  # Set once the frame has been classified
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def key(self) -> str:
+        """Identifier that is unique to this capture"""
+        return f"{self.source_id}_{self.sequence}"
+
+    @property
+    def age(self) -> float:
+        """Seconds since the frame was captured"""
+        return time.time() - self.timestamp
+
+    def view(self) -> memoryview:
+        """A read-only view of the encoded image that doesn't copy it"""
+        return memoryview(self.data)
+
+    def pixels(self) -> Optional[np.ndarray]:
+        """
+        The decoded image as a read-only RGB array, decoded once and shared by every consumer
+
+        Returns:
+            Array of shape (height, width, 3), or None if the frame can't be decoded
+        """
+        if self._pixels is None and self.data:
+            try:
+                from PIL import Image
+                with Image.open(io.BytesIO(self.data)) as image:
+                    pixels = np.asarray(image.convert("RGB"))
+                pixels.setflags(write=False)
+                self._pixels = pixels
+            except ImportError:
+                logger.warning("Pillow not available, screenshare frames can't be decoded. Install with 'pip install pillow'")
+            except Exception as e:
+                logger.error(f"Error decoding screenshare frame: {e}")
+        return self._pixels
+
+    def thumbnail(self) -> Optional[np.ndarray]:
+        """
+        The frame shrunk to at most THUMBNAIL_HEIGHT rows as float32 RGB, computed once
+
+        Returns:
+            Array of shape (rows, columns, 3), or None if the frame can't be decoded
+        """
+        if self._thumbnail is None:
+            pixels = self.pixels()
+            if pixels is not None:
+                # Averaging two samples from opposite quarters of each output pixel's block is
+                # enough for hashing and classification, and far cheaper than the whole block
+                h, w = pixels.shape[:2]
+                height = min(h, THUMBNAIL_HEIGHT)
+                width = max(1, round(w * height / h))
+                total = np.zeros((height, width, 3), dtype=np.uint16)
+                for quarter in (0.25, 0.75):
+                    rows = ((np.arange(height) + quarter) * h / height).astype(int)
+                    cols = ((np.arange(width) + quarter) * w / width).astype(int)
+                    total += pixels.take(rows, axis=0).take(cols, axis=1)
+                thumbnail = total.astype(np.float32) * np.float32(0.5)
+                thumbnail.setflags(write=False)
+                self._thumbnail = thumbnail
+        return self._thumbnail
+
+    def perceptual_hash(self, method: str = None) -> Optional[int]:
+        """
+        A 64-bit hash that barely changes when the image barely changes, computed once per method
+
+        Args:
+            method: phash or dhash (uses config if None)
+
+        Returns:
+            The hash, or None if the frame can't be decoded
+        """
+        method = method or SCREENSHARE_HASH_METHOD
+        if method not in self._hashes:
+            if method not in _HASH_METHODS:
+                raise ValueError(f"Unknown perceptual hash method: {method}")
+            thumbnail = self.thumbnail()
+            self._hashes[method] = _HASH_METHODS[method](thumbnail) if thumbnail is not None else None
+        return self._hashes[method]
+
+
+class FrameRingBuffer:
+    def __init__(self, capacity: int = None, dedup: bool = None, threshold: int = None):
+        """
+        The most recent screenshare frames of one guild, oldest dropped first
+
+        Every frame is kept, but a frame whose perceptual hash is within
+        `threshold` bits of the last new frame is reported as a duplicate so
+        callers can skip analysing it again.
+
+        Args:
+            capacity: Number of frames kept (uses config if None)
+            dedup: Whether to detect near-duplicate frames (uses config if None)
+            threshold: Max differing hash bits for a duplicate (uses config if None)
+        """
+        self.frames: "collections.deque[Frame]" = collections.deque(maxlen=max(1, capacity or SCREENSHARE_FRAME_BUFFER_SIZE))
+        self.dedup = SCREENSHARE_DEDUP_ENABLED if dedup is None else dedup
+        self.threshold = SCREENSHARE_DEDUP_THRESHOLD if threshold is None else threshold
+
+        # The last frame that was reported as new, duplicates are measured against it
+        self.reference: Optional[Frame] = None
+        self.captured = 0
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def append(self, frame: Frame) -> bool:
+        """
+        Add a newly captured frame
+
+        The hash is computed here if it hasn't been already, which decodes the
+        frame, so call frame.perceptual_hash in an executor first when that matters.
+
+        Returns:
+            True if the frame shows something new, False if it is a near duplicate
+        """
+        self.frames.append(frame)
+        self.captured += 1
+
+        if self.is_duplicate(frame):
+            self.duplicates += 1
+            return False
+        self.reference = frame
+        return True
+
+    def is_duplicate(self, frame: Frame) -> bool:
+        """Whether a frame looks the same as the last new frame"""
+        if not self.dedup or self.reference is None or self.reference.source_id != frame.source_id:
+            return False
+        current = frame.perceptual_hash()
+        reference = self.reference.perceptual_hash()
+        if current is None or reference is None:
+            return False
+        return hamming_distance(current, reference) <= self.threshold
+
+    def latest(self) -> Optional[Frame]:
+        """The newest frame, or None if nothing was captured yet"""
+        return self.frames[-1] if self.frames else None
+
+    def recent(self, count: int) -> List[Frame]:
+        """Up to `count` of the newest frames, oldest first"""
+        if count <= 0:
+            return []
+        return list(itertools.islice(self.frames, max(0, len(self.frames) - count), None))
+
+    def keyframes(self, count: int, window: float = None, threshold: int = None) -> List[Frame]:
+        """
+        The frames that best show how the screen changed recently, oldest first
+
+        The newest frame is always included. Going back from it, a frame is a
+        candidate when it differs from the next newer candidate by more than
+        `threshold` hash bits, and the biggest scene changes are kept.
+
+        Args:
+            count: Most frames returned
+            window: Only frames captured this many seconds before the newest one (all if None)
+            threshold: Min differing hash bits between kept frames (uses the dedup threshold if None)
+
+        Returns:
+            Up to `count` frames, the newest last
+        """
+        if count <= 0 or not self.frames:
+            return []
+        threshold = self.threshold if threshold is None else threshold
+        newest = self.frames[-1]
+
+        # (change to the next newer candidate, frame), newest first
+        candidates = [(0, newest)]
+        later_hash = newest.perceptual_hash()
+        for frame in reversed(list(self.frames)[:-1]):
+            if window is not None and newest.timestamp - frame.timestamp > window:
+                break
+            if frame.source_id != newest.source_id:
+                continue
+            frame_hash = frame.perceptual_hash()
+            if frame_hash is None or later_hash is None:
+                continue
+            distance = hamming_distance(frame_hash, later_hash)
+            if distance > threshold:
+                candidates.append((distance, frame))
+                later_hash = frame_hash
+
+        kept = [newest] + [frame for _, frame in sorted(candidates[1:], key=lambda item: -item[0])[:count - 1]]
+        return sorted(kept, key=lambda frame: frame.sequence)
+
+    def clear(self) -> None:
+        self.frames.clear()
+        self.reference = None
@@ -0,0 +1,141 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config import LLM_MAX_CONCURRENCY, LLM_PRIORITY_AGING_SECONDS, LLM_QUEUE_DEADLINES
+
+logger = logging.getLogger(__name__)
+
+# Request classes from most to least urgent
+PRIORITY_CLASSES = ["voice", "intent", "dm", "text", "proactive"]
+
+class LLMRequestExpired(Exception):
+    """Raised when a request waited past its deadline and was dropped before running"""
+
+
+class _QueuedRequest:
+    def __init__(self, priority: str, deadline: Optional[float]):
+        self.priority = priority
+        self.rank = PRIORITY_CLASSES.index(priority)
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline  # Monotonic time after which the request is stale
+        self.granted = asyncio.get_running_loop().create_future()
+
+    def effective_rank(self, now: float) -> float:
+        """Lower is more urgent, waiting requests slowly climb so nothing starves"""
+        return self.rank - (now - self.enqueued_at) / LLM_PRIORITY_AGING_SECONDS
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = None):
+        """
+        Shares a limited number of concurrent LLM calls between request classes
+
+        Args:
+            max_concurrency: Maximum LLM calls in flight at once (uses config if None)
+        """
+        self.max_concurrency = max(1, max_concurrency or LLM_MAX_CONCURRENCY)
+        self.in_flight = 0
+        self.waiting: List[_QueuedRequest] = []
+
+        self.metrics: Dict[str, Dict[str, float]] = {
+            priority: {"submitted": 0, "started": 0, "expired": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for priority in PRIORITY_CLASSES
+        }
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, priority: str, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """
+        Wait for a turn to call the LLM and hold it for the duration of the block
+
+        Args:
+            priority: One of PRIORITY_CLASSES
+            timeout: Seconds the request may wait before it is dropped (uses the class default if None)
+
+        Raises:
+            LLMRequestExpired: If the request could not start before its deadline
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown LLM priority class: {priority}")
+
+        if timeout is None:
+            timeout = LLM_QUEUE_DEADLINES.get(priority)
+        deadline = time.monotonic() + timeout if timeout else None
+
+        request = _QueuedRequest(priority, deadline)
+        self.metrics[priority]["submitted"] += 1
+        self.waiting.append(request)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(request.granted), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(request)
+            self.metrics[priority]["expired"] += 1
+            logger.info(f"Dropped {priority} LLM request after waiting {timeout}s")
+            raise LLMRequestExpired(f"{priority} request waited longer than {timeout}s")
+        except asyncio.CancelledError:
+            self._abandon(request)
+            raise
+
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def _abandon(self, request: _QueuedRequest) -> None:
+        """Forget a request that stopped waiting, handing back its slot if it was just granted"""
+        if request in self.waiting:
+            self.waiting.remove(request)
+        elif request.granted.done() and not request.granted.cancelled():
+            self.in_flight -= 1
+            self._dispatch()
+        request.granted.cancel()
+
+    def _dispatch(self) -> None:
+        """Grant free slots to the most urgent waiting requests"""
+        now = time.monotonic()
+
+        # Stale work is dropped rather than run
+        for request in [r for r in self.waiting if r.deadline is not None and r.deadline <= now]:
+            self.waiting.remove(request)
+
+        while self.waiting and self.in_flight < self.max_concurrency:
+            request = min(self.waiting, key=lambda r: (r.effective_rank(now), r.enqueued_at))
+            self.waiting.remove(request)
+            if request.granted.done():
+                continue
+
+            waited = now - request.enqueued_at
+            metrics = self.metrics[request.priority]
+            metrics["started"] += 1
+            metrics["total_wait"] += waited
+            metrics["max_wait"] = max(metrics["max_wait"], waited)
+
+            self.in_flight += 1
+            request.granted.set_result(None)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get queue metrics for every request class
+
+        Returns:
+            Per-class queue depth, counters and wait times in seconds, plus the in-flight count
+        """
+        result = {}
+        for priority in PRIORITY_CLASSES:
+            metrics = self.metrics[priority]
+            started = metrics["started"]
+            result[priority] = {
+                "waiting": sum(1 for r in self.waiting if r.priority == priority),
+                "submitted": metrics["submitted"],
+                "started": started,
+                "expired": metrics["expired"],
+                "avg_wait": round(metrics["total_wait"] / started, 3) if started else 0.0,
+                "max_wait": round(metrics["max_wait"], 3),
+            }
+        result["in_flight"] = self.in_flight
+        return result
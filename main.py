@@ -31,6 +31,7 @@ bot_status = {
     "voice_channel": None,
     "active_users": [],
     "conversation_log": [],
+    "shards": None,
     "tts_settings": {
         "engine": "British English",
         "accent": "en-GB", 
@@ -259,6 +260,17 @@ def log_conversation():
         return jsonify({"status": "success"})
     return jsonify({"status": "error", "message": "Missing required fields"})
 
+# Receive aggregated status from a sharded deployment (run_bot.py with SHARD_PROCESSES > 1)
+@app.route("/shard-status", methods=["POST"])
+def shard_status():
+    data = request.json
+    if not data or "processes" not in data:
+        return jsonify({"status": "error", "message": "Missing shard status"})
+    
+    bot_status["shards"] = data
+    bot_status["running"] = any(process.get("alive") for process in data["processes"])
+    return jsonify({"status": "success"})
+
 # This is the entry point when run directly
 if __name__ == "__main__":
     # Check if running as a standalone script or as part of the web app
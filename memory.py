@@ -0,0 +1,351 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from config import (
+    MEMORY_DIR, MEMORY_EMBEDDING_DIM, MEMORY_CAPACITY, MEMORY_INITIAL_CAPACITY, MEMORY_TOP_K,
+    MEMORY_MIN_SIMILARITY, MEMORY_SAVE_EVERY, MEMORY_MAX_OPEN_INDEXES
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    logger.warning("NumPy not available, long-term memory is disabled. Install with 'pip install numpy'")
+    NUMPY_AVAILABLE = False
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+class HashingEmbedder:
+    def __init__(self, dim: int = None):
+        """
+        A CPU-only text embedder that needs no model download
+
+        Words, word pairs and character trigrams are hashed into a fixed number of
+        signed buckets and the result is L2 normalized, so related turns that share
+        vocabulary end up with a high cosine similarity.
+
+        Args:
+            dim: Number of dimensions in each embedding (uses config if None)
+        """
+        self.dim = dim or MEMORY_EMBEDDING_DIM
+
+    def _features(self, text: str) -> List[str]:
+        words = TOKEN_PATTERN.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        features += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        """
+        Embed a batch of texts
+
+        Args:
+            texts: The texts to embed
+
+        Returns:
+            Float32 array of shape (len(texts), dim) with unit-length rows
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                # Whole words count more than character fragments
+                weight = 1.0 if feature[0] != "c" else 0.5
+                vectors[row, value % self.dim] += weight if value & (1 << 63) else -weight
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class VectorIndex:
+    def __init__(self, path: str, dim: int, capacity: int, initial_capacity: int = None):
+        """
+        A bounded cosine similarity index backed by a memory-mapped NumPy file
+
+        The vector file starts small and doubles as entries are added, up to the
+        full capacity. From then on it is used as a ring buffer, so the oldest
+        entries are overwritten. Searches, additions and saves may come from
+        different threads.
+
+        Args:
+            path: Base path for the index files (without extension)
+            dim: Embedding dimensions
+            capacity: Maximum number of stored entries
+            initial_capacity: Rows allocated for a new index (uses config if None)
+        """
+        self.vectors_path = f"{path}.npy"
+        self.metadata_path = f"{path}.json"
+        self.dim = dim
+        self.capacity = capacity
+        self.initial_capacity = min(capacity, initial_capacity or MEMORY_INITIAL_CAPACITY)
+        self.lock = threading.Lock()
+
+        self.next_slot = 0
+        self.unsaved_changes = 0
+
+        self.vectors = self._open_vectors()
+        self.entries: List[Optional[Dict]] = [None] * len(self.vectors)  # Slot -> Metadata
+        self._load_metadata()
+
+    def _open_vectors(self) -> "np.ndarray":
+        """Map the vector file into memory, creating it if needed"""
+        os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+
+        if os.path.exists(self.vectors_path):
+            try:
+                vectors = np.load(self.vectors_path, mmap_mode="r+")
+                if vectors.ndim == 2 and 0 < len(vectors) <= self.capacity and vectors.shape[1] == self.dim \
+                        and vectors.dtype == np.float32:
+                    return vectors
+                logger.warning(f"Memory index {self.vectors_path} has a different shape, rebuilding it")
+            except Exception as e:
+                logger.error(f"Error loading memory index {self.vectors_path}, rebuilding it: {e}")
+
+        # A new index starts with no valid metadata either
+        if os.path.exists(self.metadata_path):
+            os.remove(self.metadata_path)
+        return np.lib.format.open_memmap(
+            self.vectors_path, mode="w+", dtype=np.float32, shape=(self.initial_capacity, self.dim)
+        )
+
+    def _grow(self, rows: int) -> None:
+        """Reallocate the vector file with room for at least this many rows"""
+        rows = min(self.capacity, max(rows, len(self.vectors) * 2))
+        existing = np.array(self.vectors)
+        # Drop the old mapping before the file is rewritten
+        self.vectors = None
+        vectors = np.lib.format.open_memmap(
+            self.vectors_path, mode="w+", dtype=np.float32, shape=(rows, self.dim)
+        )
+        vectors[:len(existing)] = existing
+        self.vectors = vectors
+        self.entries += [None] * (rows - len(existing))
+
+    def _load_metadata(self) -> None:
+        if not os.path.exists(self.metadata_path):
+            return
+
+        try:
+            with open(self.metadata_path, "r") as f:
+                data = json.load(f)
+            for slot, entry in data.get("entries", {}).items():
+                if int(slot) < len(self.entries):
+                    self.entries[int(slot)] = entry
+            self.next_slot = data.get("next_slot", 0) % self.capacity
+        except Exception as e:
+            logger.error(f"Error loading memory metadata {self.metadata_path}: {e}")
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self.entries if entry is not None)
+
+    def add(self, vector: "np.ndarray", entry: Dict) -> bool:
+        """
+        Store a vector, evicting the oldest entry if the index is full
+
+        Args:
+            vector: Unit-length embedding
+            entry: Metadata to return from searches
+
+        Returns:
+            True once enough entries have been added since the last save that it is time to save
+        """
+        with self.lock:
+            slot = self.next_slot
+            if slot >= len(self.vectors):
+                self._grow(slot + 1)
+            self.vectors[slot] = vector
+            self.entries[slot] = entry
+            self.next_slot = (slot + 1) % self.capacity
+
+            self.unsaved_changes += 1
+            return self.unsaved_changes >= MEMORY_SAVE_EVERY
+
+    def search(self, query: "np.ndarray", k: int, min_similarity: float = 0.0) -> List[Dict]:
+        """
+        Find the stored entries most similar to a query
+
+        Args:
+            query: Unit-length query embedding
+            k: Maximum number of results
+            min_similarity: Results below this cosine similarity are ignored
+
+        Returns:
+            Metadata of the matching entries with a "similarity" field, best first
+        """
+        with self.lock:
+            filled = np.array([entry is not None for entry in self.entries])
+            if not filled.any() or k <= 0:
+                return []
+
+            # Rows are unit length, so the dot product is the cosine similarity
+            scores = np.asarray(self.vectors @ query)
+            scores[~filled] = -np.inf
+
+            k = min(k, int(filled.sum()))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            for slot in top:
+                if scores[slot] < min_similarity:
+                    break
+                results.append({**self.entries[slot], "similarity": float(scores[slot])})
+            return results
+
+    def save(self) -> None:
+        """Flush vectors and write metadata to disk"""
+        try:
+            with self.lock:
+                self.vectors.flush()
+                entries = {str(slot): entry for slot, entry in enumerate(self.entries) if entry is not None}
+                next_slot = self.next_slot
+                self.unsaved_changes = 0
+            temp_path = f"{self.metadata_path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"next_slot": next_slot, "entries": entries}, f)
+            os.replace(temp_path, self.metadata_path)
+        except Exception as e:
+            logger.error(f"Error saving memory index {self.metadata_path}: {e}")
+
+
+class LongTermMemory:
+    def __init__(self, base_dir: str = None, max_open: int = None):
+        """
+        Per-guild long-term conversation memory
+
+        Args:
+            base_dir: Directory holding one index per guild (uses config if None)
+            max_open: Indexes kept open at once, the least recently used are saved and closed (uses config if None)
+        """
+        self.base_dir = base_dir or MEMORY_DIR
+        self.max_open = max_open or MEMORY_MAX_OPEN_INDEXES
+        self.enabled = NUMPY_AVAILABLE
+        self.embedder = HashingEmbedder() if self.enabled else None
+        self.indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()  # Least recently used first
+        self.closing: Dict[str, Future] = {}  # Scope -> Final save of an evicted index
+        # Saves run one at a time off the event loop, in the order they were asked for
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+
+    def _get_index(self, scope: Union[int, str]) -> VectorIndex:
+        key = str(scope)
+        if key in self.indexes:
+            self.indexes.move_to_end(key)
+            return self.indexes[key]
+
+        # Reopening an index that was just evicted has to wait for its files to be written
+        closing = self.closing.pop(key, None)
+        if closing:
+            closing.result()
+
+        path = os.path.join(self.base_dir, re.sub(r"[^A-Za-z0-9_-]", "_", key))
+        self.indexes[key] = VectorIndex(path, self.embedder.dim, MEMORY_CAPACITY)
+        # Evicted indexes are written out, then their file is unmapped once nothing refers to them
+        self.closing = {name: future for name, future in self.closing.items() if not future.done()}
+        while len(self.indexes) > self.max_open:
+            evicted_key, evicted = self.indexes.popitem(last=False)
+            self.closing[evicted_key] = self.writer.submit(evicted.save)
+        return self.indexes[key]
+
+    def remember(self, scope: Union[int, str], speaker: str, message: str) -> None:
+        """
+        Store a conversation turn
+
+        Args:
+            scope: Guild ID, or another key such as "dm_<user id>" for direct messages
+            speaker: Who said it
+            message: What was said
+        """
+        if not self.enabled or not message or not message.strip():
+            return
+
+        try:
+            vector = self.embedder.embed([message])[0]
+            index = self._get_index(scope)
+            if index.add(vector, {
+                "timestamp": time.time(),
+                "speaker": speaker,
+                "message": message
+            }):
+                self.writer.submit(index.save)
+        except Exception as e:
+            logger.error(f"Error storing long-term memory: {e}")
+
+    def recall(self, scope: Union[int, str], query: str, k: int = None, exclude: List[str] = None) -> List[Dict]:
+        """
+        Find the past turns most relevant to a query
+
+        Args:
+            scope: Guild ID or other memory key
+            query: Text to search for
+            k: Maximum number of memories (uses config if None)
+            exclude: Messages to leave out, e.g. those already in the recent context
+
+        Returns:
+            Matching turns, most relevant first
+        """
+        if not self.enabled or not query:
+            return []
+
+        try:
+            index = self._get_index(scope)
+            k = k if k is not None else MEMORY_TOP_K
+            excluded = set(exclude or [])
+            # Over-fetch so excluded turns don't leave us short
+            matches = index.search(self.embedder.embed([query])[0], k + len(excluded), MEMORY_MIN_SIMILARITY)
+            return [match for match in matches if match["message"] not in excluded][:k]
+        except Exception as e:
+            logger.error(f"Error recalling long-term memory: {e}")
+            return []
+
+    def format_recalled(self, scope: Union[int, str], query: str, exclude: List[str] = None) -> str:
+        """
+        Get relevant memories formatted for a prompt
+
+        Returns:
+            One line per memory, or an empty string if nothing relevant was found
+        """
+        memories = self.recall(scope, query, exclude=exclude)
+        # Present in chronological order so the model reads them as a history
+        memories.sort(key=lambda memory: memory["timestamp"])
+        return "\n".join(
+            f"[{time.strftime('%Y-%m-%d', time.localtime(memory['timestamp']))}] {memory['speaker']}: {memory['message']}"
+            for memory in memories
+        )
+
+    def save(self, scope: Union[int, str] = None) -> None:
+        """Save one guild's memory, or every loaded memory if scope is None, blocking until it is written"""
+        if scope is not None:
+            index = self.indexes.get(str(scope))
+            if index:
+                index.save()
+            return
+        for future in list(self.closing.values()):
+            future.result()
+        self.closing.clear()
+        for index in list(self.indexes.values()):
+            index.save()
+
+    def save_in_background(self, scope: Union[int, str]) -> Optional[Future]:
+        """
+        Save one guild's memory without blocking the caller
+
+        Returns:
+            A future that completes once it is written, or None if the guild has no open memory
+        """
+        index = self.indexes.get(str(scope))
+        return self.writer.submit(index.save) if index else None
@@ -0,0 +1,234 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+import discord
+
+from audio import OpusPacketSource, PCMBufferSource, SpeechAudio
+from config import VOICE_PLAYBACK_QUEUE_SIZE
+from speech_pipeline import SentencePipeline
+
+logger = logging.getLogger(__name__)
+
+# Playback classes from most to least urgent
+PLAYBACK_PRIORITIES = ["urgent", "reply", "commentary"]
+
+class PlaybackItem:
+    def __init__(self, audio: Union[SpeechAudio, SentencePipeline], priority: str, sequence: int):
+        """
+        One clip or pipelined reply waiting in a guild's playback queue
+
+        Await `done` to learn how it ended: True if it played to the end,
+        False if it was dropped, interrupted or failed.
+        """
+        self.audio = audio
+        self.priority = priority
+        self.rank = PLAYBACK_PRIORITIES.index(priority)
+        self.sequence = sequence
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.task: Optional[asyncio.Task] = None
+
+    def __lt__(self, other: "PlaybackItem") -> bool:
+        return (self.rank, self.sequence) < (other.rank, other.sequence)
+
+    def finish(self, completed: bool) -> None:
+        if not self.done.done():
+            self.done.set_result(completed)
+
+    def discard(self) -> None:
+        """Give up on the item, stopping any synthesis it still has running"""
+        if isinstance(self.audio, SentencePipeline):
+            self.audio.cancel()
+        self.finish(False)
+
+
+class PlaybackQueue:
+    def __init__(self, voice_client, max_pending: int = None):
+        """
+        The only thing allowed to call play on a guild's voice client
+
+        Items play one at a time in priority order, first come first served
+        within a priority. Playback completion is signalled by the voice
+        client's after callback, so there is no polling and no length limit.
+
+        Args:
+            voice_client: The connected Discord voice client
+            max_pending: Items that may wait behind the one playing (uses config if None)
+        """
+        self.voice_client = voice_client
+        self.max_pending = max(1, max_pending or VOICE_PLAYBACK_QUEUE_SIZE)
+
+        self.pending: List[PlaybackItem] = []  # Heap ordered by (rank, sequence)
+        self.current: Optional[PlaybackItem] = None
+        self.sequence = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.worker: Optional[asyncio.Task] = None
+
+    def enqueue(self, audio: Union[SpeechAudio, SentencePipeline], priority: str = "reply",
+                preempt: bool = False) -> PlaybackItem:
+        """
+        Queue audio without waiting for it to play
+
+        Args:
+            audio: A synthesized clip, or a sentence pipeline to play as it is synthesized
+            priority: One of PLAYBACK_PRIORITIES
+            preempt: Cut off the item playing now if it is less urgent than this one
+
+        Returns:
+            The queued item, whose `done` future resolves when it finishes
+        """
+        if priority not in PLAYBACK_PRIORITIES:
+            raise ValueError(f"Unknown playback priority: {priority}")
+
+        item = PlaybackItem(audio, priority, next(self.sequence))
+        if not audio:
+            item.finish(False)
+            return item
+
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run(), name="voice-playback")
+
+        heapq.heappush(self.pending, item)
+        if len(self.pending) > self.max_pending:
+            # The newest of the least urgent items is the one that matters least
+            dropped = max(self.pending, key=lambda queued: (queued.rank, queued.sequence))
+            self.pending.remove(dropped)
+            heapq.heapify(self.pending)
+            logger.info(f"Playback queue full, dropped a {dropped.priority} item")
+            dropped.discard()
+
+        if preempt and self.current and self.current.rank > item.rank:
+            logger.info(f"Pre-empting {self.current.priority} playback for {priority}")
+            self.interrupt()
+
+        self.wakeup.set()
+        return item
+
+    async def play(self, audio: Union[SpeechAudio, SentencePipeline], priority: str = "reply",
+                   preempt: bool = False) -> bool:
+        """
+        Queue audio and wait until it has finished
+
+        Returns:
+            True if it played to the end
+        """
+        return await self.enqueue(audio, priority, preempt).done
+
+    def is_busy(self) -> bool:
+        """Whether anything is playing or waiting to play"""
+        return self.current is not None or bool(self.pending)
+
+    def interrupt(self) -> bool:
+        """
+        Stop the item that is playing now and move on to the next one
+
+        Returns:
+            True if something was interrupted
+        """
+        if self.current and self.current.task and not self.current.task.done():
+            self.current.task.cancel()
+            return True
+        return False
+
+    def clear(self) -> None:
+        """Stop the current item and drop everything waiting"""
+        while self.pending:
+            heapq.heappop(self.pending).discard()
+        self.interrupt()
+
+    async def close(self) -> None:
+        """Stop playback and the worker task"""
+        self.clear()
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.worker = None
+
+    async def _run(self) -> None:
+        while True:
+            while not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+
+            item = heapq.heappop(self.pending)
+            self.current = item
+            item.task = asyncio.create_task(self._play_item(item))
+            try:
+                # wait() doesn't raise when only the item was cancelled, so an interrupt never stops the worker
+                await asyncio.wait([item.task])
+            except asyncio.CancelledError:
+                item.task.cancel()
+                item.discard()
+                raise
+            finally:
+                self.current = None
+
+            if item.task.cancelled():
+                item.discard()
+            elif item.task.exception():
+                logger.error(f"Error during playback: {item.task.exception()}")
+                item.discard()
+            else:
+                item.finish(item.task.result())
+
+    async def _play_item(self, item: PlaybackItem) -> bool:
+        if not isinstance(item.audio, SentencePipeline):
+            return await self._play_clip(item.audio)
+
+        try:
+            async for segment in item.audio.audio_segments():
+                if not await self._play_clip(segment):
+                    return False
+            return True
+        finally:
+            # Stops any synthesis still running if playback was cut short
+            item.audio.cancel()
+
+    async def _play_clip(self, speech: SpeechAudio) -> bool:
+        """Play one clip and wait for the voice client to report that it finished"""
+        if not self.voice_client or not self.voice_client.is_connected():
+            return False
+
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def after_playing(error: Optional[Exception]) -> None:
+            # Runs on the voice client's player thread
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(lambda: finished.done() or finished.set_result(error))
+
+        if await speech.ensure_opus():
+            # Already encoded, the voice client just sends the packets
+            source = OpusPacketSource(speech.opus_packets)
+        else:
+            pcm = await loop.run_in_executor(None, speech.to_discord_pcm)
+            source = discord.PCMVolumeTransformer(PCMBufferSource(pcm))
+            source.volume = 1.0
+        self.voice_client.play(source, after=after_playing)
+
+        try:
+            # Shielded so a cancelled wait still sees the after callback
+            error = await asyncio.shield(finished)
+        except asyncio.CancelledError:
+            if self.voice_client.is_playing():
+                self.voice_client.stop()
+            # Let the player thread wind down so the next item can start cleanly
+            await asyncio.wait([finished], timeout=1.0)
+            raise
+
+        if error:
+            logger.error(f"Error in playback: {error}")
+            return False
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get what is playing and how much is waiting"""
+        return {
+            "playing": self.current.priority if self.current else None,
+            "pending": len(self.pending),
+        }
@@ -3,6 +3,7 @@ import os
 import logging
 from dotenv import load_dotenv
 from bot import RupertBot
+from sharding import ShardSupervisor
 import config
 import tts
 
@@ -39,11 +40,29 @@ def run_directly():
     # Set slightly slower speed for British sophistication
     piper_tts.set_voice_parameters(speed=1.1, variation=0.7, randomness=0.75)
     
+    # Spread the gateway shards over several processes if configured
+    if config.SHARD_PROCESSES > 1:
+        run_sharded(discord_token)
+        return
+    
     # Initialize and run the bot
     bot = RupertBot(discord_token)
     logger.info("Bot initialized, connecting to Discord...")
     bot.run()
 
+def run_sharded(discord_token: str):
+    """
+    Run the bot as one worker process per group of gateway shards
+    
+    A supervisor in this process restarts crashed shards and reports their
+    combined status to the dashboard.
+    """
+    shard_count = config.SHARD_COUNT or config.SHARD_PROCESSES
+    logger.info(f"Starting Rupert Bot in sharded mode: {shard_count} shards over {config.SHARD_PROCESSES} processes")
+    
+    supervisor = ShardSupervisor(discord_token, shard_count, config.SHARD_PROCESSES)
+    supervisor.run()
+
 if __name__ == "__main__":
     # Load environment variables from .env file if present
     load_dotenv()
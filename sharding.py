@@ -0,0 +1,240 @@
+import json
+import logging
+import multiprocessing
+import queue
+import time
+import urllib.request
+from typing import Any, Dict, List
+
+from config import SHARD_RESTART_BACKOFF_MAX, SHARD_STATUS_INTERVAL, DASHBOARD_URL
+
+logger = logging.getLogger(__name__)
+
+# A shard process that stays up this long is considered healthy again
+STABLE_RUN_SECONDS = 300
+
+def plan_shard_groups(shard_count: int, process_count: int) -> List[List[int]]:
+    """
+    Split shard IDs into one contiguous group per worker process
+
+    Args:
+        shard_count: Total number of gateway shards
+        process_count: Number of worker processes to spread them over
+
+    Returns:
+        A list of shard ID lists, one per process
+    """
+    shard_count = max(1, shard_count)
+    process_count = max(1, min(process_count, shard_count))
+
+    groups = []
+    base, extra = divmod(shard_count, process_count)
+    start = 0
+    for index in range(process_count):
+        size = base + (1 if index < extra else 0)
+        groups.append(list(range(start, start + size)))
+        start += size
+    return groups
+
+def run_shard_worker(token: str, shard_ids: List[int], shard_count: int, status_queue) -> None:
+    """
+    Entry point of a shard worker process
+
+    Args:
+        token: Discord bot token
+        shard_ids: The shard IDs this process connects
+        shard_count: Total number of shards across all processes
+        status_queue: Queue for reporting status back to the supervisor
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - shards {shard_ids} - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    # Imported here so the supervisor process never loads the bot stack
+    from bot import RupertBot
+
+    def report(status: Dict[str, Any]) -> None:
+        try:
+            status_queue.put_nowait(status)
+        except Exception as e:
+            logger.error(f"Error reporting shard status: {e}")
+
+    bot = RupertBot(token, shard_ids=shard_ids, shard_count=shard_count, status_reporter=report)
+    bot.run()
+
+
+class ShardSupervisor:
+    def __init__(self, token: str, shard_count: int, process_count: int):
+        """
+        Run the bot as one worker process per shard group and keep them alive
+
+        Args:
+            token: Discord bot token
+            shard_count: Total number of gateway shards
+            process_count: Number of worker processes
+        """
+        self.token = token
+        self.shard_count = max(1, shard_count)
+        self.groups = plan_shard_groups(self.shard_count, process_count)
+
+        # Spawn gives every worker a clean interpreter and its own event loop
+        self.context = multiprocessing.get_context("spawn")
+        self.status_queue = self.context.Queue()
+
+        self.processes: Dict[int, multiprocessing.Process] = {}  # Group index -> Process
+        self.started_at: Dict[int, float] = {}
+        self.restart_counts: Dict[int, int] = {}
+        self.restart_due: Dict[int, float] = {}  # Group index -> Time a restart is allowed
+        self.shard_reports: Dict[int, Dict[str, Any]] = {}  # Group index -> Latest worker status
+
+        self.running = False
+
+    def start(self) -> None:
+        """Start a worker for every shard group"""
+        self.running = True
+        for index in range(len(self.groups)):
+            self._start_worker(index)
+
+    def run(self) -> None:
+        """Start the workers and supervise them until interrupted"""
+        logger.info(f"Starting {len(self.groups)} shard processes for {self.shard_count} shards: {self.groups}")
+        self.start()
+
+        last_publish = 0.0
+        try:
+            while self.running:
+                self._drain_status_queue(timeout=1.0)
+                self._check_workers()
+                if not self.processes:
+                    logger.info("All shard processes have exited")
+                    break
+
+                if time.monotonic() - last_publish >= SHARD_STATUS_INTERVAL:
+                    self.publish_status()
+                    last_publish = time.monotonic()
+        except KeyboardInterrupt:
+            logger.info("Shard supervisor interrupted, shutting down")
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Terminate every worker process"""
+        self.running = False
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=10)
+
+    def _start_worker(self, index: int) -> None:
+        shard_ids = self.groups[index]
+        process = self.context.Process(
+            target=run_shard_worker,
+            args=(self.token, shard_ids, self.shard_count, self.status_queue),
+            name=f"rupert-shards-{index}",
+            daemon=True
+        )
+        process.start()
+
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        self.restart_due.pop(index, None)
+        logger.info(f"Started shard process {process.pid} for shards {shard_ids}")
+
+    def _check_workers(self) -> None:
+        """Restart crashed workers with exponential backoff"""
+        now = time.monotonic()
+        for index, process in list(self.processes.items()):
+            if process.is_alive():
+                # A worker that has run long enough earns a clean slate
+                if now - self.started_at[index] >= STABLE_RUN_SECONDS:
+                    self.restart_counts[index] = 0
+                continue
+
+            if index not in self.restart_due:
+                if process.exitcode == 0:
+                    # Deliberate shutdowns are not restarted
+                    logger.info(f"Shard process for shards {self.groups[index]} exited cleanly")
+                    del self.processes[index]
+                    self.shard_reports.pop(index, None)
+                    continue
+
+                restarts = self.restart_counts.get(index, 0)
+                delay = min(SHARD_RESTART_BACKOFF_MAX, 2 ** restarts)
+                self.restart_counts[index] = restarts + 1
+                self.restart_due[index] = now + delay
+                self.shard_reports.pop(index, None)
+                logger.error(
+                    f"Shard process for shards {self.groups[index]} crashed with exit code "
+                    f"{process.exitcode}, restarting in {delay}s"
+                )
+            elif now >= self.restart_due[index]:
+                self._start_worker(index)
+
+    def _drain_status_queue(self, timeout: float) -> None:
+        """Collect status reports sent by the workers"""
+        try:
+            status = self.status_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        while True:
+            shard_ids = status.get("shard_ids")
+            if shard_ids in self.groups:
+                self.shard_reports[self.groups.index(shard_ids)] = status
+            try:
+                status = self.status_queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Aggregate the latest status of every shard process
+
+        Returns:
+            Dictionary with per-process details and totals across all shards
+        """
+        processes = []
+        totals = {"guilds": 0, "voice_sessions": 0, "screenshares": 0}
+        for index, shard_ids in enumerate(self.groups):
+            process = self.processes.get(index)
+            report = self.shard_reports.get(index, {})
+            for key in totals:
+                totals[key] += report.get(key, 0)
+            processes.append({
+                "shard_ids": shard_ids,
+                "pid": process.pid if process else None,
+                "alive": bool(process and process.is_alive()),
+                "restarts": self.restart_counts.get(index, 0),
+                "ready": report.get("ready", False),
+                "latency": report.get("latency"),
+                "guilds": report.get("guilds", 0),
+                "voice_sessions": report.get("voice_sessions", 0),
+                "reported_at": report.get("timestamp"),
+            })
+
+        return {
+            "mode": "sharded",
+            "shard_count": self.shard_count,
+            "processes": processes,
+            **totals,
+        }
+
+    def publish_status(self) -> None:
+        """Send the aggregated status to the dashboard if one is configured"""
+        status = self.get_status()
+        if not DASHBOARD_URL:
+            logger.info(f"Shard status: {status['guilds']} guilds, {status['voice_sessions']} voice sessions")
+            return
+
+        try:
+            request = urllib.request.Request(
+                f"{DASHBOARD_URL.rstrip('/')}/shard-status",
+                data=json.dumps(status).encode(),
+                headers={"Content-Type": "application/json"},
+                method="POST"
+            )
+            urllib.request.urlopen(request, timeout=5).close()
+        except Exception as e:
+            logger.warning(f"Could not report shard status to the dashboard: {e}")
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import re
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from audio import SpeechAudio
+from config import TTS_PIPELINE_LOOKAHEAD, TTS_SENTENCE_MIN_LENGTH
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+def split_sentences(text: str, min_length: int = None) -> List[str]:
+    """
+    Split text into sentences for incremental synthesis
+
+    Very short fragments are merged into the following sentence so playback
+    doesn't sound choppy.
+
+    Args:
+        text: The text to split
+        min_length: Fragments shorter than this are merged (uses config if None)
+
+    Returns:
+        List of sentences in order
+    """
+    min_length = TTS_SENTENCE_MIN_LENGTH if min_length is None else min_length
+
+    sentences = []
+    pending = ""
+    for part in SENTENCE_BOUNDARY.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_length:
+            sentences.append(pending)
+            pending = ""
+
+    if pending:
+        if sentences and len(pending) < min_length:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+class SentencePipeline:
+    def __init__(self, text: str, synthesize: Callable[[str], Awaitable[Optional[SpeechAudio]]], lookahead: int = None):
+        """
+        Synthesizes a response sentence by sentence, a few sentences ahead of playback
+
+        Args:
+            text: The full response text
+            synthesize: Turns one sentence into in-memory speech
+            lookahead: How many sentences may be synthesized ahead of the one playing (uses config if None)
+        """
+        self.sentences = split_sentences(text)
+        self.synthesize = synthesize
+        self.lookahead = max(1, lookahead or TTS_PIPELINE_LOOKAHEAD)
+
+        self.tasks: Dict[int, asyncio.Task] = {}  # Sentence index -> Synthesis task
+        self.next_to_start = 0
+        self.cancelled = False
+
+    def start(self) -> None:
+        """Begin synthesizing the first sentences without waiting for playback"""
+        self._fill_window(0)
+
+    def _fill_window(self, playing_index: int) -> None:
+        while (not self.cancelled and self.next_to_start < len(self.sentences)
+               and self.next_to_start <= playing_index + self.lookahead):
+            index = self.next_to_start
+            self.tasks[index] = asyncio.create_task(self.synthesize(self.sentences[index]))
+            self.next_to_start += 1
+
+    async def audio_segments(self) -> AsyncIterator[SpeechAudio]:
+        """
+        Yield each sentence's audio in order as soon as it is ready
+
+        Sentences whose synthesis fails are skipped.
+        """
+        self.start()
+        try:
+            for index in range(len(self.sentences)):
+                if self.cancelled:
+                    return
+
+                # Keep the next sentences synthesizing while this one plays
+                self._fill_window(index)
+                try:
+                    segment = await self.tasks.pop(index)
+                except Exception as e:
+                    logger.error(f"Error synthesizing sentence {index + 1}/{len(self.sentences)}: {e}")
+                    continue
+
+                if segment:
+                    yield segment
+        finally:
+            self.cancel()
+
+    def cancel(self) -> None:
+        """Stop synthesizing sentences that will not be played"""
+        self.cancelled = True
+        for task in self.tasks.values():
+            # Retrieve any failure so asyncio doesn't warn about it
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            task.cancel()
+        self.tasks.clear()
@@ -0,0 +1,183 @@
+"""
+Accuracy and latency test for the local screenshare content classifier
+
+The screenshots are drawn from a fixed seed, so every run sees the same
+1080p images: YouTube pages with and without the logo or progress bar and in
+full screen, chess and checkers boards of random size, colours and position
+on a cluttered page, street-view scenes, and other desktop screens.
+
+Run with `python -m pytest test_content_classifier.py`, or write the
+screenshots somewhere to look at with `python test_content_classifier.py <dir>`.
+"""
+import os
+import sys
+from typing import Tuple
+
+import numpy as np
+import pytest
+
+from content_classifier import CONTENT_TYPES, evaluate
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+WIDTH, HEIGHT = 1920, 1080
+SCREENSHOTS_PER_TYPE = 12
+
+# What the classifier has to reach on the generated screenshots, timed from the decoded frame
+MIN_ACCURACY = 0.9
+MAX_P95_MS = 10.0
+
+_BOARD_COLOURS = [((238, 238, 210), (118, 150, 86)), ((240, 217, 181), (181, 136, 99)), ((230, 230, 230), (120, 40, 40))]
+
+
+def _noise(rng: np.random.Generator, width: int, height: int, base: Tuple[int, int, int], amplitude: float) -> "Image.Image":
+    """Blotchy texture standing in for video or foliage"""
+    coarse = rng.random((height // 8 + 1, width // 8 + 1, 3))
+    blotches = np.kron(coarse, np.ones((8, 8, 1)))[:height, :width]
+    grain = rng.random((height, width, 3))
+    pixels = np.array(base) + amplitude * (blotches - 0.5) + amplitude * 0.5 * (grain - 0.5)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _page(rng: np.random.Generator) -> "Image.Image":
+    """A light or dark page with scattered lines of text"""
+    background = tuple(int(value) for value in rng.choice([[49, 46, 43], [255, 255, 255], [38, 36, 33], [240, 240, 240]]))
+    image = Image.new("RGB", (WIDTH, HEIGHT), background)
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = int(rng.integers(0, WIDTH - 300)), int(rng.integers(0, HEIGHT - 20))
+        draw.text((x, y), "Lorem ipsum dolor sit amet " * 2, fill=(128, 128, 128))
+    return image
+
+
+def _board(rng: np.random.Generator, image: "Image.Image", game: str) -> None:
+    """Draw a chess or checkers board somewhere on the image"""
+    side = int(rng.integers(450, 1000))
+    x, y = int(rng.integers(0, WIDTH - side)), int(rng.integers(0, HEIGHT - side))
+    draw = ImageDraw.Draw(image)
+    cell = side / 8
+    light, dark = _BOARD_COLOURS[int(rng.integers(0, len(_BOARD_COLOURS)))]
+    for row in range(8):
+        for column in range(8):
+            draw.rectangle([x + column * cell, y + row * cell, x + (column + 1) * cell - 1, y + (row + 1) * cell - 1],
+                           fill=light if (row + column) % 2 == 0 else dark)
+    for row in range(8):
+        for column in range(8):
+            cx, cy = x + (column + 0.5) * cell, y + (row + 0.5) * cell
+            if game == "chess":
+                if (row in (0, 1, 6, 7) and rng.random() < 0.8) or rng.random() < 0.1:
+                    colour = (250, 250, 250) if row > 3 else (30, 30, 30)
+                    draw.polygon([(cx - .3 * cell, cy + .35 * cell), (cx + .3 * cell, cy + .35 * cell), (cx + .12 * cell, cy - .1 * cell),
+                                  (cx, cy - .35 * cell), (cx - .12 * cell, cy - .1 * cell)], fill=colour, outline=(0, 0, 0))
+                    draw.ellipse([cx - .12 * cell, cy - .4 * cell, cx + .12 * cell, cy - .18 * cell], fill=colour, outline=(0, 0, 0))
+            elif (row + column) % 2 == 1 and (row < 3 or row > 4) and rng.random() < 0.85:
+                colour = (200, 30, 30) if row > 4 else (20, 20, 20)
+                draw.ellipse([cx - .38 * cell, cy - .38 * cell, cx + .38 * cell, cy + .38 * cell], fill=colour, outline=(255, 255, 255))
+
+
+def _youtube(rng: np.random.Generator, index: int) -> "Image.Image":
+    image = Image.new("RGB", (WIDTH, HEIGHT), (255, 255, 255) if index % 2 else (15, 15, 15))
+    draw = ImageDraw.Draw(image)
+    if index % 3 != 2:
+        draw.rounded_rectangle([40, 20, 82, 50], radius=7, fill=(255, 0, 0))
+        draw.polygon([(57, 27), (57, 43), (70, 35)], fill=(255, 255, 255))
+        draw.text((90, 28), "YouTube", fill=(0, 0, 0) if index % 2 else (255, 255, 255))
+    if index % 4 == 3:
+        width, height, left, top = WIDTH, HEIGHT, 0, 0  # Full screen
+    else:
+        width, height, left, top = 1280, 720, 80, 80
+    image.paste(_noise(rng, width, height, (90, 110, 120), 160), (left, top))
+    if index % 3 != 1:
+        bar = top + height - 40
+        played = rng.uniform(0.05, 0.9)
+        draw.rectangle([left + 12, bar, left + width - 12, bar + 3], fill=(180, 180, 180))
+        draw.rectangle([left + 12, bar, left + 12 + int((width - 24) * played), bar + 3], fill=(255, 0, 0))
+    for i in range(20):
+        draw.text((1400, 100 + i * 40), "Recommended video title", fill=(100, 100, 100))
+    return image
+
+
+def _street_view(rng: np.random.Generator, index: int) -> "Image.Image":
+    pixels = np.zeros((HEIGHT, WIDTH, 3))
+    horizon = int(HEIGHT * 0.45)
+    fade = np.linspace(0, 1, HEIGHT)[:, None]
+    pixels[:horizon] = np.array([120, 170, 230]) * (1 - 0.3 * fade[:horizon])[..., None] if index % 2 else np.full((1, 1, 3), 200.0)
+    pixels[horizon:] = np.array([90, 95, 85])
+    image = Image.fromarray(np.clip(pixels + rng.normal(0, 6, pixels.shape), 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(25):
+        x, y = int(rng.integers(0, WIDTH)), int(rng.integers(int(HEIGHT * 0.3), int(HEIGHT * 0.6)))
+        image.paste(_noise(rng, 160, 160, (60, 100, 50), 120), (x, y))
+    image.paste(_noise(rng, WIDTH, int(HEIGHT * 0.35), (100, 100, 95), 60), (0, int(HEIGHT * 0.65)))
+    draw.polygon([(WIDTH // 2 - 40, int(HEIGHT * 0.5)), (WIDTH // 2 + 40, int(HEIGHT * 0.5)), (WIDTH // 2 + 700, HEIGHT),
+                  (WIDTH // 2 - 700, HEIGHT)], fill=(70, 70, 72))
+    if index % 2:
+        # The minimap in the corner
+        draw.rectangle([WIDTH - 420, HEIGHT - 300, WIDTH - 20, HEIGHT - 20], fill=(229, 227, 223))
+        draw.line([WIDTH - 400, HEIGHT - 200, WIDTH - 40, HEIGHT - 150], fill=(255, 255, 255), width=6)
+    return image
+
+
+def _other(rng: np.random.Generator, index: int) -> "Image.Image":
+    image = _page(rng)
+    if index % 3 == 0:
+        # A code editor
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([0, 0, 300, HEIGHT], fill=(37, 37, 38))
+        for i in range(50):
+            draw.text((320, 20 + i * 20), "def function(x): return x + 1", fill=(200, 200, 120))
+    elif index % 3 == 1:
+        # A photo in a document
+        image.paste(_noise(rng, 600, 400, (128, 128, 128), 200), (700, 300))
+    return image
+
+
+def generate_screenshots(directory: str, per_type: int = SCREENSHOTS_PER_TYPE, seed: int = 42) -> None:
+    """
+    Write labelled screenshots, one subdirectory per content type
+
+    Args:
+        directory: Where to write them
+        per_type: Screenshots of each content type
+        seed: Random seed, the same seed always draws the same images
+    """
+    rng = np.random.default_rng(seed)
+    for label in CONTENT_TYPES:
+        os.makedirs(os.path.join(directory, label), exist_ok=True)
+        for index in range(per_type):
+            if label in ("chess", "checkers"):
+                image = _page(rng)
+                _board(rng, image, label)
+            elif label == "youtube":
+                image = _youtube(rng, index)
+            elif label == "geoguesser":
+                image = _street_view(rng, index)
+            else:
+                image = _other(rng, index)
+            image.save(os.path.join(directory, label, f"{index}.png"))
+
+
+@pytest.fixture(scope="module")
+def report(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("screenshots")
+    generate_screenshots(str(directory))
+    return evaluate(str(directory))
+
+
+def test_every_screenshot_is_classified(report):
+    assert report["images"] == SCREENSHOTS_PER_TYPE * len(CONTENT_TYPES)
+
+
+def test_accuracy(report):
+    assert report["accuracy"] >= MIN_ACCURACY, report["misclassified"]
+
+
+def test_latency(report):
+    assert report["p95_ms"] <= MAX_P95_MS
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python test_content_classifier.py <dir>")
+    generate_screenshots(sys.argv[1])
@@ -2,11 +2,28 @@
 """
 Rupert AI - TTS Testing Script
 This script allows testing of Rupert's TTS functionality without running the full bot.
+
+Benchmark mode runs a fixed corpus through every engine and reports latency,
+real-time factor, memory and concurrency scaling as JSON:
+
+    python test_tts.py --benchmark --output bench.json
+    python test_tts.py --benchmark --baseline bench.json
 """
 
 import os
 import sys
+import json
+import time
+import base64
 import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 from tts import PiperTTS, GoogleTTS, gTTS
 
@@ -49,26 +66,349 @@ async def test_tts(text=None, engine=None):
     
     # Generate speech
     print("Generating speech...")
-    output_file = await tts_engine.text_to_speech(text)
+    speech = await tts_engine.synthesize(text)
     
-    if output_file:
-        print(f"Speech generated successfully: {output_file}")
+    if speech:
+        print(f"Speech generated successfully: {speech.duration:.2f}s at {speech.sample_rate} Hz")
         print("Playing audio...")
+        wav = speech.to_wav()
         
-        # Play the audio using whatever is available
-        if sys.platform == "darwin":  # macOS
-            os.system(f"afplay {output_file}")
+        # Play the audio using whatever is available, straight from memory where the player allows it
+        if sys.platform == "darwin":  # macOS, afplay needs a file
+            with tempfile.NamedTemporaryFile(prefix="rupert_tts_", suffix=".wav") as wav_file:
+                wav_file.write(wav)
+                wav_file.flush()
+                subprocess.run(["afplay", wav_file.name])
         elif sys.platform == "linux":  # Linux
-            os.system(f"aplay {output_file}")
-        else:  # Windows or other
-            print(f"Audio file generated at: {output_file}")
-            print("Please play it with your system's audio player.")
+            subprocess.run(["aplay", "-q", "-"], input=wav)
+        elif sys.platform == "win32":  # Windows
+            import winsound
+            winsound.PlaySound(wav, winsound.SND_MEMORY)
+        else:
+            print("No audio player available on this platform.")
     else:
         print("Error: Failed to generate speech.")
 
+
+# Rupert-style texts of the lengths the bot actually speaks
+BENCHMARK_CORPUS = {
+    "short": [
+        "Ah, splendid!",
+        "Quite right, old chap.",
+        "I'm having trouble thinking right now. Can you try again?",
+    ],
+    "medium": [
+        "That is a rather bold move with the knight. I suspect your opponent will regret leaving the bishop undefended.",
+        "Judging by the road markings and the eucalyptus trees, I would wager we are somewhere in southern Australia.",
+        "One might argue that the point of a good question is not the answer, but the conversation it starts.",
+    ],
+    "long": [
+        "Well, that is a fascinating question. The Stoics held that we suffer more in imagination than in reality, "
+        "and I rather think they had a point. Most of what keeps us up at night never actually happens. "
+        "Marcus Aurelius wrote his meditations on a military campaign, surrounded by plague and war, and still "
+        "found time to remind himself that the obstacle is the way. I find that enormously comforting.",
+        "Right, let me have a proper look at the board. White has castled kingside and the pawn structure is solid, "
+        "but the queen is a touch exposed on the open file. If I were you, I would bring the rook across first, "
+        "then push the central pawn to open lines for the bishops. Mind the knight fork on the next move, though, "
+        "it would be a terrible shame to lose the exchange after playing so nicely.",
+    ],
+}
+
+ENGINE_NAMES = ["piper", "google", "gtts"]
+
+# Metrics where a higher value is better, everything else is a cost
+HIGHER_IS_BETTER = {"throughput", "scaling_efficiency"}
+
+
+class _StandInTTSHandler(BaseHTTPRequestHandler):
+    """Answers gTTS requests like Google Translate does, with a tone of matching length"""
+    latency = 0.05
+    clips: Dict[int, str] = {}
+    clips_lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+        rpc = json.loads(body["f.req"][0])
+        text = json.loads(rpc[0][0][1])[0]
+
+        time.sleep(self.latency)  # Network round trip
+
+        payload = f"[[\"wrb.fr\",\"jQ1olc\",\"[\\\"{self._clip(text)}\\\"]\",null,null,null,\"generic\"]]"
+        response = f")]}}'\n\n{len(payload)}\n{payload}\n".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def _clip(self, text: str) -> str:
+        """Base64 MP3 of roughly the time it takes to say the text, made once per length"""
+        duration_ms = max(500, len(text) * 65 // 500 * 500)
+        with self.clips_lock:
+            if duration_ms not in self.clips:
+                import io
+                from pydub.generators import Sine
+                buffer = io.BytesIO()
+                Sine(220).to_audio_segment(duration=duration_ms, volume=-20).export(buffer, format="mp3")
+                self.clips[duration_ms] = base64.b64encode(buffer.getvalue()).decode("ascii")
+            return self.clips[duration_ms]
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_gtts_stand_in(latency: float) -> ThreadingHTTPServer:
+    """
+    Serve gTTS requests locally and point the gtts library at the stand-in
+
+    Args:
+        latency: Seconds each request waits, standing in for the network
+
+    Returns:
+        The running server
+    """
+    import gtts.tts
+
+    _StandInTTSHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInTTSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    port = server.server_address[1]
+    gtts.tts._translate_url = lambda tld="com", path="": f"http://127.0.0.1:{port}/{path}"
+    # gTTS passes the environment's proxies explicitly, which would bypass no_proxy
+    for variable in ("http_proxy", "HTTP_PROXY", "https_proxy", "HTTPS_PROXY"):
+        os.environ.pop(variable, None)
+    return server
+
+
+def create_benchmark_engine(name: str):
+    """Create an engine exactly as the bot would, without hidden fallbacks"""
+    if name == "piper":
+        # Without this a missing model would silently benchmark pyttsx3
+        return PiperTTS(fallback=False)
+    if name == "google":
+        return GoogleTTS(language="en-GB")
+    if name == "gtts":
+        return gTTS(language="en-gb")
+    raise ValueError(f"Unknown TTS engine '{name}'")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    import numpy as np
+    return round(float(np.percentile(values, q)), 4)
+
+
+async def measure_synthesis(engine, text: str) -> Optional[Dict[str, float]]:
+    """
+    Synthesize text the way the bot speaks it, sentence by sentence
+
+    Returns:
+        Time to the first playable audio, total latency and real-time factor, or None on failure
+    """
+    from speech_pipeline import SentencePipeline
+
+    start = time.perf_counter()
+    first_audio = None
+    audio_seconds = 0.0
+    async for segment in SentencePipeline(text, engine.synthesize).audio_segments():
+        if first_audio is None:
+            first_audio = time.perf_counter() - start
+        audio_seconds += segment.duration
+    latency = time.perf_counter() - start
+
+    if first_audio is None or audio_seconds <= 0:
+        return None
+    return {"ttfb": first_audio, "latency": latency, "rtf": latency / audio_seconds}
+
+
+async def benchmark_engine(name: str, iterations: int, concurrency_levels: List[int],
+                           gtts_latency: float) -> Dict[str, Any]:
+    """
+    Benchmark one engine in this process
+
+    Returns:
+        Per-category latency statistics, concurrency scaling and peak memory
+    """
+    if name == "gtts":
+        start_gtts_stand_in(gtts_latency)
+
+    engine = create_benchmark_engine(name)
+    # The first call loads models and warms caches, it is not what users wait for
+    if await measure_synthesis(engine, BENCHMARK_CORPUS["short"][0]) is None:
+        return {"error": f"{name} could not synthesize speech"}
+
+    results: Dict[str, Any] = {"categories": {}, "concurrency": {}}
+    for category, texts in BENCHMARK_CORPUS.items():
+        samples = []
+        errors = 0
+        for _ in range(iterations):
+            for text in texts:
+                sample = await measure_synthesis(engine, text)
+                if sample is None:
+                    errors += 1
+                else:
+                    samples.append(sample)
+
+        results["categories"][category] = {
+            "samples": len(samples),
+            "errors": errors,
+            "ttfb_p50": percentile([sample["ttfb"] for sample in samples], 50),
+            "ttfb_p95": percentile([sample["ttfb"] for sample in samples], 95),
+            "latency_p50": percentile([sample["latency"] for sample in samples], 50),
+            "latency_p95": percentile([sample["latency"] for sample in samples], 95),
+            "rtf_p50": percentile([sample["rtf"] for sample in samples], 50),
+        }
+
+    # Several guilds speaking at once
+    text = BENCHMARK_CORPUS["medium"][0]
+    single_throughput = None
+    for level in concurrency_levels:
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(measure_synthesis(engine, text) for _ in range(level)))
+        elapsed = time.perf_counter() - start
+        succeeded = [sample for sample in samples if sample]
+
+        throughput = len(succeeded) / elapsed if elapsed > 0 else 0.0
+        if single_throughput is None:
+            single_throughput = throughput / level if level else throughput
+        results["concurrency"][str(level)] = {
+            "throughput": round(throughput, 4),
+            "latency_p50": percentile([sample["latency"] for sample in succeeded], 50),
+            "latency_p95": percentile([sample["latency"] for sample in succeeded], 95),
+            "scaling_efficiency": round(throughput / (level * single_throughput), 4) if single_throughput else None,
+        }
+
+    # ru_maxrss is in kilobytes on Linux
+    results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+
+def run_benchmark(engines: List[str], iterations: int, concurrency_levels: List[int],
+                  gtts_latency: float) -> Dict[str, Any]:
+    """
+    Benchmark each engine in its own process so peak memory is measured per engine
+
+    Returns:
+        The full report
+    """
+    report: Dict[str, Any] = {
+        "timestamp": time.time(),
+        "iterations": iterations,
+        "concurrency_levels": concurrency_levels,
+        "gtts_stand_in_latency": gtts_latency,
+        "engines": {},
+    }
+
+    for name in engines:
+        print(f"Benchmarking {name}...", file=sys.stderr)
+        command = [
+            sys.executable, os.path.abspath(__file__), "--benchmark-engine", name,
+            "--iterations", str(iterations),
+            "--concurrency", ",".join(str(level) for level in concurrency_levels),
+            "--gtts-latency", str(gtts_latency),
+        ]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        try:
+            report["engines"][name] = json.loads(completed.stdout.strip().splitlines()[-1])
+        except (IndexError, json.JSONDecodeError):
+            report["engines"][name] = {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "no output"}
+
+    return report
+
+
+def flatten_metrics(report: Dict[str, Any]) -> Dict[str, float]:
+    """Turn a report into engine.section.metric -> value for comparison"""
+    metrics = {}
+
+    def walk(prefix: str, value: Any) -> None:
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, child)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[prefix] = value
+
+    walk("", report.get("engines", {}))
+    return metrics
+
+
+def compare_with_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare a report with a stored baseline
+
+    Args:
+        report: The new report
+        baseline: A report saved by an earlier run
+        tolerance: Fractional change allowed before a metric counts as a regression
+
+    Returns:
+        Descriptions of the metrics that regressed
+    """
+    current = flatten_metrics(report)
+    previous = flatten_metrics(baseline)
+    regressions = []
+
+    for key in sorted(current.keys() & previous.keys()):
+        metric = key.rsplit(".", 1)[-1]
+        if metric in ("samples", "errors") or not previous[key]:
+            continue
+
+        change = (current[key] - previous[key]) / abs(previous[key])
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        print(f"{key}: {previous[key]} -> {current[key]} ({change:+.1%})", file=sys.stderr)
+        if worse > tolerance:
+            regressions.append(f"{key} regressed by {worse:.1%}")
+
+    return regressions
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Test or benchmark Rupert's text-to-speech engines")
+    parser.add_argument("text", nargs="*", help="Text to speak in test mode")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark every engine instead of playing a test phrase")
+    parser.add_argument("--engines", default=",".join(ENGINE_NAMES), help="Comma separated engines to benchmark")
+    parser.add_argument("--iterations", type=int, default=3, help="Times each corpus text is synthesized")
+    parser.add_argument("--concurrency", default="1,2,4", help="Comma separated concurrent request counts")
+    parser.add_argument("--gtts-latency", type=float, default=0.05, help="Simulated network latency of the gTTS stand-in in seconds")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Compare with a report from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed regression against the baseline, e.g. 0.1 for 10%%")
+    parser.add_argument("--benchmark-engine", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    concurrency_levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    # Worker process for a single engine, prints its results as the last line
+    if args.benchmark_engine:
+        results = asyncio.run(benchmark_engine(args.benchmark_engine, args.iterations, concurrency_levels, args.gtts_latency))
+        print(json.dumps(results))
+        return 0
+
+    if not args.benchmark:
+        asyncio.run(test_tts(" ".join(args.text) or None))
+        return 0
+
+    engines = [name.strip().lower() for name in args.engines.split(",") if name.strip()]
+    report = run_benchmark(engines, args.iterations, concurrency_levels, args.gtts_latency)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
 if __name__ == "__main__":
-    # Get text from command line arguments
-    text = " ".join(sys.argv[1:]) if len(sys.argv) > 1 else None
-    
-    # Run the test function
-    asyncio.run(test_tts(text))
\ No newline at end of file
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,91 @@
+import logging
+import time
+from typing import List
+
+from config import TEXT_STREAM_EDIT_INTERVAL, TEXT_MESSAGE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+class StreamingMessage:
+    def __init__(self, channel, edit_interval: float = None, max_length: int = None):
+        """
+        Post a reply early and keep editing it in place as more text arrives
+
+        Args:
+            channel: The Discord channel to post the reply in
+            edit_interval: Minimum seconds between edits of the same message (uses config if None)
+            max_length: Maximum characters per message before rolling over (uses config if None)
+        """
+        self.channel = channel
+        self.edit_interval = edit_interval if edit_interval is not None else TEXT_STREAM_EDIT_INTERVAL
+        self.max_length = max_length or TEXT_MESSAGE_LIMIT
+
+        self.messages: List = []  # Every Discord message posted for this reply
+        self.current_message = None  # The message currently being edited
+        self.buffer = ""  # Text belonging to the current message
+        self.full_text = ""  # Everything received so far
+        self.last_edit = 0.0
+        self.shown_text = ""  # What the current message displays right now
+
+    async def append(self, text: str) -> None:
+        """
+        Add newly generated text to the reply
+
+        Args:
+            text: The next chunk of generated text
+        """
+        if not text:
+            return
+
+        self.full_text += text
+        self.buffer += text
+
+        # Roll over to a new message whenever the current one is full
+        while len(self.buffer) > self.max_length:
+            split_at = self._find_split_point(self.buffer)
+            head, self.buffer = self.buffer[:split_at].rstrip(), self.buffer[split_at:].lstrip()
+            await self._show(head)
+            self.current_message = None
+            self.shown_text = ""
+
+        # The first text of each message is posted straight away, later text is rate limited
+        if self.current_message is None or time.monotonic() - self.last_edit >= self.edit_interval:
+            await self._show(self.buffer)
+
+    async def finish(self) -> str:
+        """
+        Make sure the final text is visible
+
+        Returns:
+            The complete reply text
+        """
+        if self.buffer != self.shown_text:
+            await self._show(self.buffer)
+        return self.full_text
+
+    def _find_split_point(self, text: str) -> int:
+        """Find a natural place to split text that is longer than one message"""
+        window = text[:self.max_length]
+        for separator in ("\n", ". ", " "):
+            index = window.rfind(separator)
+            # Only split on a separator if it keeps a reasonable amount in the message
+            if index > self.max_length // 2:
+                return index + len(separator)
+        return self.max_length
+
+    async def _show(self, text: str) -> None:
+        """Post or edit the current message so that it displays text"""
+        # Discord rejects empty messages
+        if not text.strip() or text == self.shown_text:
+            return
+
+        try:
+            if self.current_message is None:
+                self.current_message = await self.channel.send(text)
+                self.messages.append(self.current_message)
+            else:
+                await self.current_message.edit(content=text)
+            self.shown_text = text
+            self.last_edit = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error updating streamed message: {e}")
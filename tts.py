@@ -1,11 +1,18 @@
 
+import io
 import logging
 import os
+import tempfile
+import json
+import threading
+import queue
 import pyttsx3
-import subprocess
 import asyncio
-from typing import Optional, List, Dict, Any
-from utils import create_temp_file
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Iterator, Callable
+from audio import SpeechAudio
+from config import PIPER_INTRA_OP_THREADS
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -13,58 +20,241 @@ logger = logging.getLogger(__name__)
 # Define default piper model path
 DEFAULT_PIPER_MODEL_PATH = os.path.join("piper_models", "en_US-lessac-medium")
 
+class Pyttsx3Worker:
+    def __init__(self, language: str = "en-GB", rate: int = 165, volume: float = 1.0):
+        """
+        Owns a pyttsx3 engine on a dedicated thread and runs synthesis jobs for the event loop
+        
+        pyttsx3 drivers block in runAndWait and expect to be driven from the
+        thread that created them, so the engine is created once on the worker
+        thread and every job is queued to it.
+        
+        Args:
+            language: Preferred voice language
+            rate: Speaking rate in words per minute
+            volume: Volume level from 0.0 to 1.0
+        """
+        self.language = language
+        self.rate = rate
+        self.volume = volume
+        self.voice_id: Optional[str] = None
+        
+        self.jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.ready = threading.Event()
+        self.init_error: Optional[Exception] = None
+        
+        self.thread = threading.Thread(target=self._run, name="pyttsx3", daemon=True)
+        self.thread.start()
+        self.ready.wait(timeout=15.0)
+    
+    def _run(self) -> None:
+        try:
+            engine = pyttsx3.init()
+            engine.setProperty('rate', self.rate)  # Slightly slower for British accent
+            engine.setProperty('volume', self.volume)  # Volume level
+            
+            # Look for a British English voice
+            for voice in engine.getProperty('voices'):
+                if 'en_GB' in voice.id or 'british' in voice.id.lower():
+                    engine.setProperty('voice', voice.id)
+                    break
+            self.voice_id = engine.getProperty('voice')
+        except Exception as e:
+            logger.error(f"Error initializing pyttsx3: {e}")
+            self.init_error = e
+            self.ready.set()
+            return
+        
+        self.ready.set()
+        
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            
+            func, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(engine))
+            except Exception as e:
+                future.set_exception(e)
+    
+    async def run(self, func: Callable[[Any], Any]) -> Any:
+        """
+        Run a function with the engine on the worker thread
+        
+        Args:
+            func: Called with the pyttsx3 engine
+            
+        Returns:
+            Whatever func returns
+        """
+        if self.init_error:
+            raise RuntimeError(f"pyttsx3 is unavailable: {self.init_error}")
+        
+        future = concurrent.futures.Future()
+        self.jobs.put((func, future))
+        return await asyncio.wrap_future(future)
+    
+    def close(self) -> None:
+        """Stop the worker thread once queued jobs have finished"""
+        self.jobs.put(None)
+
+
 class GoogleTTS:
     def __init__(self, language: str = "en-GB"):
         self.language = language
-        self.engine = pyttsx3.init()
-        self.engine.setProperty('rate', 165)  # Slightly slower for British accent
-        self.engine.setProperty('volume', 1.0)  # Volume level
-        
-        # Try to set a British voice if available
-        voices = self.engine.getProperty('voices')
-        british_voice = None
-        
-        # Look for a British English voice
-        for voice in voices:
-            if 'en_GB' in voice.id or 'british' in voice.id.lower():
-                british_voice = voice.id
-                break
-                
-        # Set British voice if found
-        if british_voice:
-            self.engine.setProperty('voice', british_voice)
+        self.worker = Pyttsx3Worker(language)
+    
+    def cache_signature(self) -> str:
+        """Describe the voice settings that affect synthesized audio"""
+        return f"{self.worker.voice_id}|{self.worker.rate}|{self.worker.volume}"
+
+    @staticmethod
+    def _render(engine, text: str, output_file: str) -> None:
+        engine.save_to_file(text, output_file)
+        engine.runAndWait()
 
-    async def text_to_speech(self, text: str) -> str:
+    async def synthesize(self, text: str) -> Optional[SpeechAudio]:
         """
-        Convert text to speech using pyttsx3
+        Convert text to speech held in memory
 
         Args:
             text: The text to convert to speech
 
         Returns:
-            Path to the generated audio file
+            The synthesized speech, or None if synthesis failed
         """
-        output_file = f"temp_tts_{os.urandom(4).hex()}.wav"
+        def render_to_memory(engine) -> SpeechAudio:
+            # pyttsx3 can only render to a file, so use a private temp file outside the working directory
+            fd, output_file = tempfile.mkstemp(prefix="rupert_tts_", suffix=".wav")
+            os.close(fd)
+            try:
+                self._render(engine, text, output_file)
+                return SpeechAudio.from_file(output_file)
+            finally:
+                try:
+                    os.remove(output_file)
+                except OSError:
+                    pass
 
         try:
-            self.engine.save_to_file(text, output_file)
-            self.engine.runAndWait()
-            return output_file
+            return await self.worker.run(render_to_memory)
 
         except Exception as e:
             logger.error(f"Error during TTS synthesis: {e}")
             return None
 
 
+class PiperEngine:
+    def __init__(self, model_file: str, config_file: str, intra_op_threads: int = None):
+        """
+        A Piper voice loaded once and kept in memory for every utterance
+        
+        Args:
+            model_file: Path to the ONNX voice model
+            config_file: Path to the voice's config.json
+            intra_op_threads: ONNX runtime threads per synthesis (uses config if None, 0 lets ONNX decide)
+        """
+        self.model_file = model_file
+        self.config_file = config_file
+        self.intra_op_threads = PIPER_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        
+        self.voice = None
+        self.sample_rate = 22050
+        self._load_lock = threading.Lock()
+        
+        # A single synthesis thread keeps CPU use predictable, ONNX runs without the GIL
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="piper")
+    
+    @staticmethod
+    def is_available() -> bool:
+        """Check whether the Piper Python package and ONNX runtime can be imported"""
+        try:
+            import onnxruntime  # noqa: F401
+            from piper import PiperVoice  # noqa: F401
+            return True
+        except ImportError:
+            return False
+    
+    def load(self) -> None:
+        """Load the voice model if it has not been loaded yet"""
+        if self.voice is not None:
+            return
+        
+        with self._load_lock:
+            if self.voice is not None:
+                return
+            
+            import onnxruntime
+            from piper import PiperVoice
+            from piper.config import PiperConfig
+            
+            with open(self.config_file, "r", encoding="utf-8") as f:
+                config_dict = json.load(f)
+            
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.intra_op_threads
+            options.inter_op_num_threads = 1
+            session = onnxruntime.InferenceSession(
+                self.model_file, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            
+            self.voice = PiperVoice(config=PiperConfig.from_dict(config_dict), session=session)
+            self.sample_rate = self.voice.config.sample_rate
+            logger.info(f"Loaded Piper voice {self.model_file} ({self.sample_rate} Hz, {self.intra_op_threads} threads)")
+    
+    def synthesize_stream(self, text: str, speaker: int = 0, length_scale: float = None,
+                          noise_scale: float = None, noise_w: float = None) -> Iterator[bytes]:
+        """
+        Synthesize text one sentence at a time
+        
+        Args:
+            text: The text to speak
+            speaker: Speaker ID for multi-speaker voices
+            length_scale: Speed multiplier (lower = faster)
+            noise_scale: Voice variation level
+            noise_w: Phoneme randomness level
+            
+        Yields:
+            Raw 16-bit mono PCM at self.sample_rate for each sentence
+        """
+        self.load()
+        yield from self.voice.synthesize_stream_raw(
+            text,
+            speaker_id=speaker if self.voice.config.num_speakers > 1 else None,
+            length_scale=length_scale,
+            noise_scale=noise_scale,
+            noise_w=noise_w
+        )
+    
+    def synthesize(self, text: str, **params) -> bytes:
+        """
+        Synthesize text into a single buffer
+        
+        Returns:
+            Raw 16-bit mono PCM at self.sample_rate
+        """
+        return b"".join(self.synthesize_stream(text, **params))
+    
+    async def synthesize_async(self, text: str, **params) -> bytes:
+        """Synthesize text on the engine's worker thread without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.synthesize(text, **params))
+
+
 class PiperTTS:
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, fallback: bool = True):
         """
         Initialize the Piper TTS engine with the specified model
         
         Args:
             model_path: Path to the Piper voice model. If None, uses default
+            fallback: Whether to fall back to GoogleTTS when Piper fails (a router choosing between engines turns this off)
         """
         self.model_path = model_path or DEFAULT_PIPER_MODEL_PATH
+        self.fallback = fallback
         
         # Check if model exists
         self._verify_model()
@@ -75,6 +265,18 @@ class PiperTTS:
         self.noise_scale = 0.7  # Slightly more variations for expressiveness
         self.noise_w = 0.75  # Balanced phoneme randomness for a natural British cadence
         
+        # Keep the voice model loaded between utterances when the Piper package is installed,
+        # otherwise fall back to running the piper CLI for each utterance
+        self.engine: Optional[PiperEngine] = None
+        if PiperEngine.is_available():
+            self.engine = PiperEngine(
+                os.path.join(self.model_path, "model.onnx"),
+                os.path.join(self.model_path, "config.json")
+            )
+        
+        # Created on first fallback and reused afterwards
+        self._fallback_tts: Optional[GoogleTTS] = None
+        
         logger.info(f"Initialized Piper TTS with model: {self.model_path}")
     
     def _verify_model(self) -> None:
@@ -95,96 +297,132 @@ class PiperTTS:
             logger.warning(f"Models need to be downloaded to: {self.model_path}")
             logger.warning("Will attempt to use fallback TTS methods until models are available")
     
-    async def text_to_speech(self, text: str) -> str:
+    def cache_signature(self) -> str:
+        """Describe the voice settings that affect synthesized audio"""
+        return f"{self.model_path}|{self.speaker}|{self.length_scale}|{self.noise_scale}|{self.noise_w}"
+    
+    @property
+    def fallback_tts(self) -> GoogleTTS:
+        """The pyttsx3 engine used when Piper can't synthesize, initialized once"""
+        if self._fallback_tts is None:
+            self._fallback_tts = GoogleTTS()
+        return self._fallback_tts
+    
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate of the PCM produced by synthesize_pcm"""
+        return self.engine.sample_rate if self.engine else 22050
+    
+    async def synthesize_pcm(self, text: str) -> Optional[bytes]:
+        """
+        Synthesize text in memory with the persistent Piper engine
+        
+        Args:
+            text: The text to convert to speech
+            
+        Returns:
+            Raw 16-bit mono PCM at self.sample_rate, or None if the engine is unavailable or fails
+        """
+        if not self.engine or not os.path.exists(self.engine.model_file) or not os.path.exists(self.engine.config_file):
+            return None
+        
+        try:
+            pcm = await self.engine.synthesize_async(
+                text,
+                speaker=self.speaker,
+                length_scale=self.length_scale,
+                noise_scale=self.noise_scale,
+                noise_w=self.noise_w
+            )
+            return pcm or None
+        except Exception as e:
+            logger.error(f"Error during in-process Piper synthesis: {e}")
+            return None
+    
+    async def synthesize(self, text: str) -> Optional[SpeechAudio]:
         """
-        Convert text to speech using Piper
+        Convert text to speech held in memory using Piper
         
         Args:
             text: The text to convert to speech
             
         Returns:
-            Path to the generated audio file
+            The synthesized speech, or None if every engine failed
         """
         # Check if model files exist
         model_file = os.path.join(self.model_path, "model.onnx")
         config_file = os.path.join(self.model_path, "config.json")
         
-        # If model files are missing, fall back to other TTS engines
+        # If model files are missing, fall back to another TTS engine
         if not os.path.exists(model_file) or not os.path.exists(config_file):
-            logger.warning("Piper model files missing, falling back to GoogleTTS")
-            fallback_tts = GoogleTTS()
-            return await fallback_tts.text_to_speech(text)
+            logger.warning("Piper model files missing")
+            return await self._fall_back(text)
         
-        # Create a temporary file for the text
-        text_file = f"temp_text_{os.urandom(4).hex()}.txt"
-        output_file = f"temp_tts_{os.urandom(4).hex()}.wav"
+        # Use the already loaded voice model when we can
+        pcm = await self.synthesize_pcm(text)
+        if pcm:
+            return SpeechAudio(pcm, self.sample_rate)
         
         try:
-            # Write the text to a file
-            with open(text_file, "w") as f:
-                f.write(text)
-            
-            # Construct the piper command
+            # Construct the piper command, raw PCM goes to stdout so nothing touches the disk
             command = [
                 "piper",
                 "--model", model_file,
                 "--config", config_file,
-                "--output-file", output_file,
+                "--output-raw",
                 "--speaker", str(self.speaker),
                 "--length-scale", str(self.length_scale),
                 "--noise-scale", str(self.noise_scale),
                 "--noise-w", str(self.noise_w)
             ]
             
-            # Run piper with the text file as input
+            # Run piper with the text on stdin
             process = await asyncio.create_subprocess_exec(
                 *command,
-                stdin=open(text_file, "r"),
+                stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
             
             # Wait for the process to complete with timeout
             try:
-                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=15.0)
+                stdout, stderr = await asyncio.wait_for(process.communicate(text.encode("utf-8")), timeout=15.0)
                 if process.returncode != 0:
                     logger.error(f"Piper TTS error: {stderr.decode()}")
-                    # If piper fails, fall back to GoogleTTS
-                    logger.warning("Piper TTS failed, falling back to GoogleTTS")
-                    fallback_tts = GoogleTTS()
-                    return await fallback_tts.text_to_speech(text)
+                    return await self._fall_back(text)
                 
-                if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
-                    logger.error("Piper TTS output file is empty or does not exist")
-                    # If output is empty, fall back to GoogleTTS
-                    logger.warning("Piper TTS output invalid, falling back to GoogleTTS")
-                    fallback_tts = GoogleTTS()
-                    return await fallback_tts.text_to_speech(text)
+                if not stdout:
+                    logger.error("Piper TTS produced no audio")
+                    return await self._fall_back(text)
                 
-                return output_file
+                return SpeechAudio(stdout, self._config_sample_rate(config_file))
                 
             except asyncio.TimeoutError:
                 logger.error("Piper TTS process timed out")
                 process.kill()
-                # If timeout occurs, fall back to GoogleTTS
-                logger.warning("Piper TTS timed out, falling back to GoogleTTS")
-                fallback_tts = GoogleTTS()
-                return await fallback_tts.text_to_speech(text)
+                return await self._fall_back(text)
                 
         except Exception as e:
             logger.error(f"Error during Piper TTS synthesis: {e}")
-            # For any exception, fall back to GoogleTTS
-            logger.warning(f"Falling back to GoogleTTS due to error: {e}")
-            fallback_tts = GoogleTTS()
-            return await fallback_tts.text_to_speech(text)
-            
-        finally:
-            # Clean up the text file
-            if os.path.exists(text_file):
-                try:
-                    os.remove(text_file)
-                except Exception as e:
-                    logger.error(f"Error removing temporary text file: {e}")
+            return await self._fall_back(text)
+    
+    async def _fall_back(self, text: str) -> Optional[SpeechAudio]:
+        if not self.fallback:
+            return None
+        logger.warning("Falling back to GoogleTTS")
+        # Starting pyttsx3 waits for its thread to come up, which mustn't hold up the event loop
+        fallback_tts = await asyncio.get_running_loop().run_in_executor(None, lambda: self.fallback_tts)
+        return await fallback_tts.synthesize(text)
+    
+    def _config_sample_rate(self, config_file: str) -> int:
+        """Sample rate of the voice, read from its config when the model isn't loaded in-process"""
+        if self.engine and self.engine.voice is not None:
+            return self.engine.sample_rate
+        try:
+            with open(config_file, "r", encoding="utf-8") as f:
+                return int(json.load(f)["audio"]["sample_rate"])
+        except Exception:
+            return 22050
     
     def set_voice_parameters(self, speed: float = None, variation: float = None, randomness: float = None) -> None:
         """
@@ -227,33 +465,37 @@ class gTTS:
             logger.warning("gTTS library not available. Install with 'pip install gtts'")
             self.gtts_available = False
     
-    async def text_to_speech(self, text: str) -> Optional[str]:
+    def cache_signature(self) -> str:
+        """Describe the voice settings that affect synthesized audio"""
+        return self.language
+    
+    async def synthesize(self, text: str) -> Optional[SpeechAudio]:
         """
-        Convert text to speech using Google TTS
+        Convert text to speech held in memory using Google TTS
         
         Args:
             text: Text to convert to speech
             
         Returns:
-            Path to audio file or None if conversion failed
+            The synthesized speech, or None if conversion failed
         """
         if not self.gtts_available:
             logger.error("gTTS is not available")
             return None
-            
-        # Import here to allow the class to be defined even if gtts is not installed
+        
         from gtts import gTTS as GoogleTTS
         
-        output_file = f"temp_tts_{os.urandom(4).hex()}.mp3"
+        def fetch() -> bytes:
+            buffer = io.BytesIO()
+            GoogleTTS(text=text, lang=self.language, slow=False).write_to_fp(buffer)
+            return buffer.getvalue()
         
         try:
-            # Create gTTS object with text and language
-            tts = GoogleTTS(text=text, lang=self.language, slow=False)
-            
-            # Save to file
-            tts.save(output_file)
-            
-            return output_file
+            # The request is blocking network I/O, keep it off the event loop
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(None, fetch)
+            # gTTS only returns MP3, which needs decoding to PCM once
+            return await loop.run_in_executor(None, SpeechAudio.from_encoded, data, "mp3")
             
         except Exception as e:
             logger.error(f"Error during Google TTS synthesis: {e}")
@@ -0,0 +1,267 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from audio import OPUS_PACKETS_FORMAT, SpeechAudio, pack_opus_packets
+from config import (
+    TTS_CACHE_DIR, TTS_CACHE_MEMORY_MB, TTS_CACHE_DISK_MB, TTS_CACHE_MAX_TEXT_LENGTH
+)
+
+logger = logging.getLogger(__name__)
+
+def normalize_tts_text(text: str) -> str:
+    """Normalize text so trivially different strings share a cache entry"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def tts_cache_key(engine_name: str, voice_signature: str, text: str) -> str:
+    """Content address for a piece of synthesized speech"""
+    material = f"{engine_name}\x00{voice_signature}\x00{normalize_tts_text(text)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read()
+    os.utime(path)  # Keeps LRU order across restarts
+    return data
+
+def _write_file(path: str, data: bytes) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def _delete_files(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class TTSAudioCache:
+    def __init__(self, cache_dir: str = None, memory_limit_mb: float = None, disk_limit_mb: float = None):
+        """
+        Two-tier LRU cache of synthesized audio keyed by content address
+
+        Args:
+            cache_dir: Directory for the disk tier (uses config if None)
+            memory_limit_mb: Size limit of the memory tier (uses config if None)
+            disk_limit_mb: Size limit of the disk tier (uses config if None)
+        """
+        self.cache_dir = cache_dir or TTS_CACHE_DIR
+        self.memory_limit = int((memory_limit_mb if memory_limit_mb is not None else TTS_CACHE_MEMORY_MB) * 1024 * 1024)
+        self.disk_limit = int((disk_limit_mb if disk_limit_mb is not None else TTS_CACHE_DISK_MB) * 1024 * 1024)
+
+        self.memory: "collections.OrderedDict[str, Tuple[bytes, str]]" = collections.OrderedDict()  # Key -> (Audio, Extension)
+        self.memory_size = 0
+
+        self.disk: "collections.OrderedDict[str, Tuple[str, int]]" = collections.OrderedDict()  # Key -> (Path, Size)
+        self.disk_size = 0
+        self.writing: Set[str] = set()  # Keys whose file is being written
+
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan_disk()
+
+    def _scan_disk(self) -> None:
+        """Rebuild the disk tier's LRU order from file modification times"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            key = os.path.splitext(name)[0]
+            if os.path.isfile(path) and len(key) == 64:
+                files.append((os.path.getmtime(path), key, path, os.path.getsize(path)))
+
+        for _, key, path, size in sorted(files):
+            self.disk[key] = (path, size)
+            self.disk_size += size
+
+        _delete_files(self._evict_disk())
+        logger.info(f"TTS cache has {len(self.disk)} entries on disk ({self.disk_size // 1024} KB)")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.memory or key in self.disk
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Look up synthesized audio, reading the disk tier on a worker thread
+
+        Args:
+            key: Content address from tts_cache_key
+
+        Returns:
+            (audio bytes, file extension) or None on a miss
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self.memory[key]
+
+        if key in self.disk:
+            path, _ = self.disk[key]
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(None, _read_file, path)
+            except OSError as e:
+                logger.error(f"Error reading cached audio {path}: {e}")
+                if key in self.disk:
+                    self.disk_size -= self.disk.pop(key)[1]
+                    await asyncio.get_running_loop().run_in_executor(None, _delete_files, [path])
+                self.stats["misses"] += 1
+                return None
+
+            # The entry may have been evicted while the file was being read
+            if key in self.disk:
+                self.disk.move_to_end(key)
+            extension = os.path.splitext(path)[1].lstrip(".")
+            self._put_memory(key, data, extension)
+            self.stats["disk_hits"] += 1
+            return data, extension
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, data: bytes, extension: str) -> None:
+        """
+        Store synthesized audio in both tiers, writing the disk tier on a worker thread
+
+        Args:
+            key: Content address from tts_cache_key
+            data: Encoded audio file contents
+            extension: File extension describing the format (wav, mp3, ...)
+        """
+        if not data:
+            return
+
+        self._put_memory(key, data, extension)
+
+        if key in self.disk or key in self.writing or len(data) > self.disk_limit:
+            return
+
+        path = os.path.join(self.cache_dir, f"{key}.{extension}")
+        loop = asyncio.get_running_loop()
+        self.writing.add(key)
+        try:
+            await loop.run_in_executor(None, _write_file, path, data)
+        except OSError as e:
+            logger.error(f"Error writing cached audio {path}: {e}")
+            return
+        finally:
+            self.writing.discard(key)
+
+        self.disk[key] = (path, len(data))
+        self.disk_size += len(data)
+        evicted = self._evict_disk()
+        if evicted:
+            await loop.run_in_executor(None, _delete_files, evicted)
+
+    def _put_memory(self, key: str, data: bytes, extension: str) -> None:
+        if len(data) > self.memory_limit:
+            return
+        if key in self.memory:
+            self.memory_size -= len(self.memory.pop(key)[0])
+
+        self.memory[key] = (data, extension)
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_limit:
+            _, (evicted, _) = self.memory.popitem(last=False)
+            self.memory_size -= len(evicted)
+
+    def _evict_disk(self) -> List[str]:
+        """Drop the least recently used entries until the disk tier fits, returning the files to delete"""
+        evicted = []
+        while self.disk_size > self.disk_limit and self.disk:
+            _, (path, size) = self.disk.popitem(last=False)
+            self.disk_size -= size
+            evicted.append(path)
+        return evicted
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get hit counters and tier sizes"""
+        return {
+            **self.stats,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_size,
+            "disk_entries": len(self.disk),
+            "disk_bytes": self.disk_size,
+        }
+
+
+class CachedTTS:
+    def __init__(self, engine, cache: TTSAudioCache = None):
+        """
+        Wrap a TTS engine so repeated phrases are served from the audio cache
+
+        Args:
+            engine: Any TTS engine with synthesize and cache_signature methods
+            cache: The cache to use (a new one with config limits if None)
+        """
+        self.engine = engine
+        self.cache = cache or TTSAudioCache()
+
+    def _key(self, text: str) -> str:
+        return tts_cache_key(type(self.engine).__name__, self.engine.cache_signature(), text)
+
+    def is_cached(self, text: str) -> bool:
+        """Check whether a phrase would be served from the cache"""
+        return bool(text) and len(text) <= TTS_CACHE_MAX_TEXT_LENGTH and self._key(text) in self.cache
+
+    async def synthesize(self, text: str) -> Optional[SpeechAudio]:
+        """
+        Synthesize text in memory, reusing earlier synthesis of the same phrase
+
+        Args:
+            text: The text to convert to speech
+
+        Returns:
+            The synthesized speech, or None on failure
+        """
+        # Long one-off replies would only push useful entries out
+        if not text or len(text) > TTS_CACHE_MAX_TEXT_LENGTH:
+            return await self.engine.synthesize(text)
+
+        key = self._key(text)
+        cached = await self.cache.get(key)
+        if cached:
+            data, extension = cached
+            try:
+                return SpeechAudio.from_encoded(data, extension)
+            except Exception as e:
+                logger.error(f"Error decoding cached audio, synthesizing again: {e}")
+
+        speech = await self.engine.synthesize(text)
+        if speech:
+            # Store what playback needs so a repeat costs no encoding at all
+            if await speech.ensure_opus():
+                await self.cache.put(key, pack_opus_packets(speech.opus_packets), OPUS_PACKETS_FORMAT)
+            else:
+                await self.cache.put(key, speech.to_wav(), "wav")
+        return speech
+
+    async def prewarm(self, phrases: List[str]) -> None:
+        """
+        Synthesize fixed phrases ahead of time so they play instantly later
+
+        Args:
+            phrases: Phrases the bot is known to say often
+        """
+        start = time.monotonic()
+        missing = [phrase for phrase in phrases if self._key(phrase) not in self.cache]
+        for phrase in missing:
+            await self.synthesize(phrase)
+
+        logger.info(f"Pre-warmed {len(missing)} TTS phrases in {time.monotonic() - start:.1f}s "
+                    f"({len(phrases) - len(missing)} already cached)")
+
+    def __getattr__(self, name):
+        # Everything else (voice parameters etc.) belongs to the wrapped engine
+        if name == "engine":
+            raise AttributeError(name)
+        return getattr(self.engine, name)
@@ -0,0 +1,233 @@
+import asyncio
+import collections
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from audio import SpeechAudio
+from config import (
+    PIPER_VOICE, TTS_ENGINE_PREFERENCE, TTS_ENGINE_TIMEOUT, TTS_ROUTER_SWITCH_RATIO,
+    TTS_HEALTH_WINDOW, TTS_BREAKER_FAILURES, TTS_BREAKER_ERROR_RATE, TTS_BREAKER_COOLDOWN,
+    TTS_CACHE_ENABLED
+)
+from tts import GoogleTTS, PiperTTS, gTTS
+from tts_cache import CachedTTS, TTSAudioCache
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker states
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+def _default_factories() -> Dict[str, Callable[[], Any]]:
+    return {
+        "piper": lambda: PiperTTS(os.path.join("piper_models", PIPER_VOICE), fallback=False),
+        "google": lambda: GoogleTTS(),
+        "gtts": lambda: gTTS(),
+    }
+
+
+class EngineHealth:
+    def __init__(self, name: str):
+        """
+        Rolling latency and error tracking with a circuit breaker for one TTS engine
+
+        Args:
+            name: Engine name used in logs and status
+        """
+        self.name = name
+        self.outcomes: "collections.deque[bool]" = collections.deque(maxlen=TTS_HEALTH_WINDOW)
+        self.latencies: "collections.deque[float]" = collections.deque(maxlen=TTS_HEALTH_WINDOW)  # Seconds per character
+        self.consecutive_failures = 0
+
+        self.state = BREAKER_CLOSED
+        self.opened_at = 0.0
+        self.trial_in_progress = False
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Median seconds per character of recent successful syntheses, None until one succeeds"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2]
+
+    def available(self, now: float) -> bool:
+        """Whether a request may be sent to this engine right now"""
+        if self.state == BREAKER_OPEN and now - self.opened_at >= TTS_BREAKER_COOLDOWN:
+            # Let a single request through to see if the engine has recovered
+            self.state = BREAKER_HALF_OPEN
+            self.trial_in_progress = False
+        if self.state == BREAKER_HALF_OPEN:
+            return not self.trial_in_progress
+        return self.state == BREAKER_CLOSED
+
+    def record_success(self, seconds: float, characters: int) -> None:
+        self.outcomes.append(True)
+        self.latencies.append(seconds / max(1, characters))
+        self.consecutive_failures = 0
+        if self.state != BREAKER_CLOSED:
+            logger.info(f"TTS engine {self.name} recovered, closing its circuit breaker")
+        self.state = BREAKER_CLOSED
+        self.trial_in_progress = False
+
+    def record_failure(self) -> None:
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.trial_in_progress = False
+
+        window_full = len(self.outcomes) == self.outcomes.maxlen
+        if (self.state == BREAKER_HALF_OPEN or self.consecutive_failures >= TTS_BREAKER_FAILURES
+                or (window_full and self.error_rate >= TTS_BREAKER_ERROR_RATE)):
+            self.trip()
+
+    def trip(self) -> None:
+        """Stop routing to this engine until the cooldown has passed"""
+        if self.state != BREAKER_OPEN:
+            logger.warning(f"TTS engine {self.name} is failing, opening its circuit breaker for {TTS_BREAKER_COOLDOWN}s")
+        self.state = BREAKER_OPEN
+        self.opened_at = time.monotonic()
+        self.trial_in_progress = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        latency = self.latency
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate, 3),
+            "ms_per_char": round(latency * 1000, 2) if latency is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class TTSRouter:
+    def __init__(self, preference: List[str] = None, factories: Dict[str, Callable[[], Any]] = None):
+        """
+        Sends each synthesis request to the fastest healthy TTS engine
+
+        Engines are created on first use and kept. A less preferred engine is
+        only chosen over a more preferred one when it is clearly faster, so the
+        voice stays consistent while every engine is healthy. Engines that keep
+        failing are skipped until their circuit breaker cools down.
+
+        Args:
+            preference: Engine names allowed to speak, most preferred first (uses config if None)
+            factories: Engine name -> constructor (piper, google and gtts if None)
+        """
+        self.factories = factories or _default_factories()
+        self.preference = [name for name in (preference or TTS_ENGINE_PREFERENCE) if name in self.factories]
+        if not self.preference:
+            raise ValueError("No usable TTS engines in the preference list")
+
+        self.cache = TTSAudioCache() if TTS_CACHE_ENABLED else None
+        self.engines: Dict[str, Any] = {}
+        self.creating: Dict[str, "asyncio.Future"] = {}  # Engine name -> Construction still running
+        self.health: Dict[str, EngineHealth] = {name: EngineHealth(name) for name in self.preference}
+
+    async def _get_engine(self, name: str) -> Optional[Any]:
+        """Create an engine the first time it is needed, on a worker thread since loading a voice blocks"""
+        if name not in self.engines:
+            # Requests that arrive while the engine is loading wait for the same load
+            creating = self.creating.get(name)
+            if creating is None:
+                creating = asyncio.get_running_loop().run_in_executor(None, self.factories[name])
+                self.creating[name] = creating
+            try:
+                engine = await asyncio.shield(creating)
+            except Exception as e:
+                if self.creating.pop(name, None) is not None:
+                    logger.error(f"Error creating TTS engine {name}: {e}")
+                    self.health[name].trip()
+                return None
+            self.creating.pop(name, None)
+            if name not in self.engines:
+                self.engines[name] = CachedTTS(engine, self.cache) if self.cache is not None else engine
+        return self.engines[name]
+
+    def rank_engines(self) -> List[str]:
+        """
+        Order the currently available engines by how requests should try them
+
+        Returns:
+            Engine names, the one to use first at the front
+        """
+        now = time.monotonic()
+        candidates = [name for name in self.preference if self.health[name].available(now)]
+        if not candidates:
+            # Everything is tripped, trying the preferred engine beats saying nothing
+            return list(self.preference)
+
+        best = candidates[0]
+        for name in candidates[1:]:
+            best_latency = self.health[best].latency
+            latency = self.health[name].latency
+            if best_latency is not None and latency is not None and latency * TTS_ROUTER_SWITCH_RATIO < best_latency:
+                best = name
+        return [best] + [name for name in candidates if name != best]
+
+    async def synthesize(self, text: str) -> Optional[SpeechAudio]:
+        """
+        Synthesize text with the best available engine, failing over to the others
+
+        Args:
+            text: The text to convert to speech
+
+        Returns:
+            The synthesized speech, or None if every engine failed
+        """
+        if not text:
+            return None
+
+        for name in self.rank_engines():
+            engine = await self._get_engine(name)
+            if engine is None:
+                continue
+
+            health = self.health[name]
+            # Cache hits say nothing about the engine's health, so they don't count as a half-open trial
+            cached = isinstance(engine, CachedTTS) and engine.is_cached(text)
+            trial = health.state == BREAKER_HALF_OPEN and not cached
+            if trial:
+                health.trial_in_progress = True
+
+            start = time.monotonic()
+            try:
+                try:
+                    speech = await asyncio.wait_for(engine.synthesize(text), TTS_ENGINE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.warning(f"TTS engine {name} timed out after {TTS_ENGINE_TIMEOUT}s")
+                    speech = None
+                except Exception as e:
+                    logger.error(f"Error synthesizing with TTS engine {name}: {e}")
+                    speech = None
+
+                if speech:
+                    if not cached:
+                        health.record_success(time.monotonic() - start, len(text))
+                    return speech
+
+                health.record_failure()
+            finally:
+                # A cancelled trial (barge-in, a cancelled sentence pipeline) must not leave the engine locked out
+                if trial:
+                    health.trial_in_progress = False
+
+        logger.error("Every TTS engine failed to synthesize speech")
+        return None
+
+    async def prewarm(self, phrases: List[str]) -> None:
+        """Cache fixed phrases with the engine that would currently speak them"""
+        for name in self.rank_engines():
+            engine = await self._get_engine(name)
+            if isinstance(engine, CachedTTS):
+                await engine.prewarm(phrases)
+                return
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get breaker state, error rate and latency for every engine"""
+        return {name: self.health[name].get_stats() for name in self.preference}
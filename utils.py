@@ -5,11 +5,24 @@ import logging
 import asyncio
 import base64
 import json
-import datetime
-from typing import Optional, Dict, Any, Tuple
+import functools
+from typing import Optional, Dict, Any, List, Tuple
+
+from content_classifier import classify_frame
+from frames import Frame
+from llm_scheduler import LLMRequestExpired
+from vision_preprocess import PreparedImage, prepare_image, prepare_images, trim_to_budget
 
 logger = logging.getLogger(__name__)
 
+# Replies given when a vision or text call failed, which must never be cached
+VISION_FALLBACK_RESPONSES = frozenset({
+    "Unable to analyze the image at this time.",
+    "I'm having trouble analyzing what's on the screen right now.",
+    "I'm having trouble analyzing the image right now.",
+    "I'm having trouble thinking right now. Can you try again?",
+})
+
 def create_temp_file(data: bytes, extension: str = "bin") -> str:
     """
     Create a temporary file with the given data
@@ -77,7 +90,7 @@ def convert_audio_format(input_file: str, output_format: str = "wav") -> Optiona
         logger.error(f"Error converting audio format: {e}")
         return None
 
-async def capture_screenshot(discord_client, channel_id: int) -> Optional[str]:
+async def capture_screenshot(discord_client, channel_id: int) -> Optional[Frame]:
     """
     Capture a screenshot of an ongoing screen share in a Discord voice channel
     
@@ -86,7 +99,7 @@ async def capture_screenshot(discord_client, channel_id: int) -> Optional[str]:
         channel_id: ID of the voice channel
         
     Returns:
-        Path to the captured screenshot file or None if capture failed
+        The captured frame held in memory or None if capture failed
     """
     try:
         # Get the voice channel by ID
@@ -108,19 +121,12 @@ async def capture_screenshot(discord_client, channel_id: int) -> Optional[str]:
                 # to capture the screen share stream. For this demo, we'll just create
                 # a placeholder image to simulate this functionality.
                 
-                # Creating a placeholder temporary file for the screenshot
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                screenshot_path = f"temp_screenshot_{member.id}_{timestamp}.png"
-                
-                # In a real implementation, we would save the actual screenshot here
+                # In a real implementation, we would keep the encoded screenshot here
                 # For this demo, we'll just log that we would capture it
                 logger.info(f"Would capture screenshot of {member.display_name}'s screen share")
                 
-                # For the purposes of this demo, we'll just create an empty file
-                with open(screenshot_path, 'wb') as f:
-                    f.write(b'')
-                
-                return screenshot_path
+                # For the purposes of this demo, the frame is empty
+                return Frame(b'', "image/png", member.id)
                 
             except Exception as e:
                 logger.error(f"Error capturing screen share from {member.display_name}: {e}")
@@ -131,27 +137,29 @@ async def capture_screenshot(discord_client, channel_id: int) -> Optional[str]:
         logger.error(f"Error during screen share capture: {e}")
         return None
 
-async def analyze_image_with_vision_model(image_path: str, prompt: str, gemini_api, content_type: str = None) -> str:
+async def analyze_image_with_vision_model(frame: Frame, prompt: str, gemini_api, content_type: str = None,
+                                          priority: str = "voice", keyframes: List[Frame] = None,
+                                          max_side: int = None) -> str:
     """
     Analyze an image using a vision-capable AI model in Gemini
     
     Args:
-        image_path: Path to the image file
+        frame: The captured screenshare frame
         prompt: Text prompt to guide the image analysis
         gemini_api: Instance of the GeminiAPI class
         content_type: Type of content detected in the image (youtube, chess, etc.)
+        priority: LLM scheduling class for the request ("voice" for questions, "proactive" for commentary)
+        keyframes: Earlier frames of the same screen, oldest first, sent in the same request
+            so the model can tell what changed
+        max_side: Longest side of the uploaded image (uses the content type's target if None)
         
     Returns:
         Analysis result as text
     """
     try:
-        # Read the image file and encode as base64
-        with open(image_path, 'rb') as f:
-            image_data = f.read()
-        
         # If the image is empty (in our demo case), generate a simulated analysis
-        if len(image_data) == 0:
-            logger.warning("Empty image file, generating simulated analysis for demo")
+        if len(frame) == 0:
+            logger.warning("Empty screenshare frame, generating simulated analysis for demo")
             
             # Generate appropriate simulated response based on content type
             if content_type == "youtube":
@@ -221,8 +229,8 @@ async def analyze_image_with_vision_model(image_path: str, prompt: str, gemini_a
                      "or suburban area outside one of the major cities.")
                 ]
                 
-                # Choose one based on a deterministic seed from the image path
-                seed_value = hash(image_path) % 100
+                # Choose one based on a deterministic seed from the frame
+                seed_value = hash(frame.key) % 100
                 import random
                 random.seed(seed_value)
                 return random.choice(geoguesser_responses)
@@ -233,87 +241,114 @@ async def analyze_image_with_vision_model(image_path: str, prompt: str, gemini_a
         
         # For a real implementation, we would use Gemini's vision capabilities
         # Select the appropriate system prompt based on content type
-        system_prompt = None
-        if content_type == "youtube":
-            from config import YOUTUBE_SYSTEM_PROMPT
-            system_prompt = YOUTUBE_SYSTEM_PROMPT
-        elif content_type == "chess":
-            from config import CHESS_SYSTEM_PROMPT
-            system_prompt = CHESS_SYSTEM_PROMPT
-        elif content_type == "checkers":
-            from config import CHECKERS_SYSTEM_PROMPT
-            system_prompt = CHECKERS_SYSTEM_PROMPT
-        elif content_type == "geoguesser":
-            from config import GEOGUESSER_SYSTEM_PROMPT
-            system_prompt = GEOGUESSER_SYSTEM_PROMPT
+        system_prompt = vision_system_prompt(content_type)
+        
+        # Send only what matters, as small as it can usefully be
+        from config import VISION_PREPROCESS_ENABLED
+        if keyframes:
+            return await analyze_keyframes(keyframes + [frame], prompt, gemini_api, system_prompt, content_type,
+                                           priority, VISION_PREPROCESS_ENABLED)
+        if VISION_PREPROCESS_ENABLED:
+            image = await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+                prepare_image, frame, content_type, max_side=max_side))
+            image_data, mime_type = image.data, image.mime_type
+        else:
+            image_data, mime_type = frame.data, frame.mime_type
         
         # Analyze the image using the vision model through Gemini API
-        analysis = await gemini_api.generate_vision_response(prompt, image_path, system_prompt)
+        analysis = await gemini_api.generate_vision_response(prompt, image_data, system_prompt, priority=priority,
+                                                             mime_type=mime_type)
         return analysis if analysis else "Unable to analyze the image at this time."
         
+    except LLMRequestExpired:
+        # Stale requests are dropped silently rather than answered with an apology
+        raise
     except Exception as e:
         logger.error(f"Error analyzing image: {e}")
         return "I'm having trouble analyzing what's on the screen right now."
 
-def detect_content_type(image_path: str) -> str:
+async def analyze_keyframes(frames: List[Frame], prompt: str, gemini_api, system_prompt: Optional[str],
+                            content_type: str = None, priority: str = "voice", preprocess: bool = True) -> str:
+    """
+    Ask the vision model about a window of frames in one request, each captioned with how old it is
+    
+    Args:
+        frames: Frames of one screen, oldest first, the last being the screen now
+        prompt: Text prompt to guide the analysis
+        gemini_api: Instance of the GeminiAPI class
+        system_prompt: System prompt for the content type
+        content_type: Type of content detected in the frames
+        priority: LLM scheduling class for the request
+        preprocess: Whether to crop and shrink the frames before upload
+        
+    Returns:
+        Analysis result as text
+    """
+    if preprocess:
+        images = await asyncio.get_running_loop().run_in_executor(None, prepare_images, frames, content_type)
+    else:
+        images = trim_to_budget([PreparedImage(frame.data, frame.mime_type, len(frame)) for frame in frames])
+    # The budget may have dropped the oldest frames, keep the captions matched to the ones left
+    kept = frames[len(frames) - len(images):]
+    if len(images) == 1:
+        analysis = await gemini_api.generate_vision_response(prompt, images[0].data, system_prompt, priority=priority,
+                                                             mime_type=images[0].mime_type)
+        return analysis if analysis else "Unable to analyze the image at this time."
+    
+    now = frames[-1].timestamp
+    labels = [f"Screenshot {index + 1}, {now - frame.timestamp:.0f} seconds before the last one:"
+              for index, frame in enumerate(kept[:-1])]
+    labels.append(f"Screenshot {len(kept)}, the screen right now:")
+    temporal_prompt = (f"These are {len(kept)} screenshots of the same screenshare, oldest first. "
+                       f"Use the differences between them to tell what happened.\n\n{prompt}")
+    
+    analysis = await gemini_api.generate_multi_image_response(
+        temporal_prompt, [(image.data, image.mime_type) for image in images], system_prompt,
+        priority=priority, labels=labels
+    )
+    return analysis if analysis else "Unable to analyze the image at this time."
+
+def vision_system_prompt(content_type: str = None) -> Optional[str]:
+    """
+    Get the system prompt for analysing a type of screenshare content
+    
+    Args:
+        content_type: Type of content detected in the image (youtube, chess, etc.)
+        
+    Returns:
+        The system prompt, or None for unknown content
+    """
+    if content_type == "youtube":
+        from config import YOUTUBE_SYSTEM_PROMPT
+        return YOUTUBE_SYSTEM_PROMPT
+    elif content_type == "chess":
+        from config import CHESS_SYSTEM_PROMPT
+        return CHESS_SYSTEM_PROMPT
+    elif content_type == "checkers":
+        from config import CHECKERS_SYSTEM_PROMPT
+        return CHECKERS_SYSTEM_PROMPT
+    elif content_type == "geoguesser":
+        from config import GEOGUESSER_SYSTEM_PROMPT
+        return GEOGUESSER_SYSTEM_PROMPT
+    return None
+
+def detect_content_type(frame: Frame) -> str:
     """
     Detect the type of content in a screenshot
     
     Args:
-        image_path: Path to the screenshot image
+        frame: The captured screenshare frame
         
     Returns:
         String identifying the content type (youtube, chess, checkers, geoguesser, or unknown)
     """
     try:
-        # If the file doesn't exist or is empty, return a default value
-        if not os.path.exists(image_path) or os.path.getsize(image_path) == 0:
+        # Demo frames from capture_screenshot have no image to look at
+        if frame is None or len(frame) == 0:
             return "unknown"
             
-        # In a real implementation, this would use computer vision techniques to identify content:
-        # 1. Use image recognition models to detect UI elements characteristic of each application
-        # 2. Look for specific visual patterns (YouTube player controls, chess board grid, etc.)
-        # 3. Use OCR to detect text that might indicate the content type
-        
-        # For demonstration purposes, we'll implement a more guided approach:
-        # Look at the last detected content type in our cache to improve consistency
-        # This creates a more realistic user experience than purely random choices
-        
-        # Get timestamp from the image filename to use as a consistent seed
-        # If we're looking at the same image (or images from the same stream),
-        # we want to return the same content_type for consistency
-        import re
-        import random
-        
-        # Initialize the random seed based on the current day/hour 
-        # to keep content type stable for reasonable periods
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H")
-        random.seed(int(timestamp) + hash(image_path) % 10000)
-        
-        # Create a content type cache based on the image path
-        # This simulates persistent pattern recognition
-        cache_key = hash(image_path) % 100
-        if hasattr(detect_content_type, 'content_cache'):
-            if cache_key in detect_content_type.content_cache:
-                # 90% of the time, stick with the previously detected content type
-                # This creates a more realistic experience where the content doesn't randomly change
-                if random.random() < 0.9:
-                    return detect_content_type.content_cache[cache_key]
-        else:
-            detect_content_type.content_cache = {}
-        
-        # Define content type weights with more emphasis on GeoGuessr
-        # The user requested improved GeoGuessr detection, so we'll increase its weight
-        content_types = ["youtube", "chess", "checkers", "geoguesser", "unknown"]
-        weights = [0.20, 0.15, 0.10, 0.45, 0.10]  # 45% chance of GeoGuessr
-        
-        # Choose a content type based on the weighted distribution
-        result = random.choices(content_types, weights=weights, k=1)[0]
-        
-        # Store in cache for consistency in future calls
-        detect_content_type.content_cache[cache_key] = result
-        
-        logger.info(f"Detected content type: {result} (seed: {timestamp}, cache: {cache_key})")
+        result = classify_frame(frame)
+        logger.info(f"Detected content type: {result}")
         return result
         
     except Exception as e:
@@ -0,0 +1,207 @@
+import collections
+import json
+import logging
+import re
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import (
+    VISION_CACHE_TTL, VISION_CACHE_MAX_ENTRIES, VISION_SCENE_ANSWERS, SCREENSHARE_DEDUP_THRESHOLD
+)
+from frames import Frame, hamming_distance
+from utils import VISION_FALLBACK_RESPONSES, analyze_image_with_vision_model, vision_system_prompt
+
+logger = logging.getLogger(__name__)
+
+# Appended to a vision prompt so the same upload also yields a reusable description of the screen
+SCENE_INSTRUCTIONS = (
+    "\n\nReply with JSON only, in this form: "
+    "{\"answer\": \"your spoken reply\", \"scene\": {\"summary\": \"one sentence\", "
+    "\"visible_text\": [\"...\"], \"objects\": [\"...\"], \"details\": \"anything else someone might ask about\"}}"
+)
+
+def normalize_question(text: str) -> str:
+    """Normalize a question so trivially different phrasings share a cache entry"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def parse_scene_response(text: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Split a reply to a prompt with SCENE_INSTRUCTIONS into the answer and the scene
+
+    Returns:
+        (answer, scene), where the answer is the whole text and the scene None if it isn't the expected JSON
+    """
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match:
+        try:
+            reply = json.loads(match.group(0))
+            if isinstance(reply, dict) and isinstance(reply.get("answer"), str) and reply["answer"].strip():
+                scene = reply.get("scene")
+                return reply["answer"].strip(), scene if isinstance(scene, dict) else None
+        except json.JSONDecodeError:
+            pass
+    return text, None
+
+
+class VisionCache:
+    def __init__(self, ttl: float = None, max_entries: int = None, threshold: int = None,
+                 scene_answers: bool = None):
+        """
+        Short-lived LRU cache of vision answers keyed by what is on screen
+
+        Entries belong to the guild whose screenshare they were read from, so
+        one guild is never answered from another's screen. An entry matches a
+        request from the same guild when the content type and normalized
+        question are the same and the frames' perceptual hashes are within
+        `threshold` bits, so a question asked again about an unchanged screen
+        is answered without another vision call. With scene answers enabled,
+        the first vision call for a screen also asks for a structured
+        description of it, and different questions about the same screen
+        are answered from that description by the text model.
+
+        Args:
+            ttl: Seconds an answer stays valid (uses config if None)
+            max_entries: Answers and scenes kept, least recently used dropped first (uses config if None)
+            threshold: Max differing hash bits for the same screen (uses config if None)
+            scene_answers: Whether to answer follow-ups from scene descriptions (uses config if None)
+        """
+        self.ttl = ttl if ttl is not None else VISION_CACHE_TTL
+        self.max_entries = max(1, max_entries or VISION_CACHE_MAX_ENTRIES)
+        self.threshold = threshold if threshold is not None else SCREENSHARE_DEDUP_THRESHOLD
+        self.scene_answers = VISION_SCENE_ANSWERS if scene_answers is None else scene_answers
+
+        # (Guild ID, Hash, Content type, Question) -> (Answer, Time stored)
+        self.answers: "collections.OrderedDict[Tuple[int, int, str, str], Tuple[str, float]]" = collections.OrderedDict()
+        # (Guild ID, Hash) -> (Scene, Content type, Time stored)
+        self.scenes: "collections.OrderedDict[Tuple[int, int], Tuple[Dict[str, Any], str, float]]" = collections.OrderedDict()
+
+        self.stats: Dict[str, int] = {"hits": 0, "scene_hits": 0, "misses": 0}
+
+    def _expire(self, now: float) -> None:
+        for store in (self.answers, self.scenes):
+            expired = [key for key, entry in store.items() if now - entry[-1] > self.ttl]
+            for key in expired:
+                del store[key]
+
+    def _store(self, store: collections.OrderedDict, key, entry) -> None:
+        store[key] = entry
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def get(self, guild_id: int, frame_hash: int, content_type: str, question: str) -> Optional[str]:
+        """
+        Look up an answer for the same question about the same screen
+
+        Returns:
+            The cached answer or None on a miss
+        """
+        now = time.time()
+        self._expire(now)
+        question = normalize_question(question)
+        # Newest first, so the closest match in time wins
+        for key in reversed(self.answers):
+            cached_guild, cached_hash, cached_type, cached_question = key
+            if (cached_guild == guild_id and cached_type == content_type and cached_question == question
+                    and hamming_distance(cached_hash, frame_hash) <= self.threshold):
+                self.answers.move_to_end(key)
+                return self.answers[key][0]
+        return None
+
+    def put(self, guild_id: int, frame_hash: int, content_type: str, question: str, answer: str) -> None:
+        """Store an answer about a guild's screen"""
+        self._store(self.answers, (guild_id, frame_hash, content_type, normalize_question(question)),
+                    (answer, time.time()))
+
+    def get_scene(self, guild_id: int, frame_hash: int, content_type: str) -> Optional[Dict[str, Any]]:
+        """Look up the structured description of the same screen"""
+        self._expire(time.time())
+        for key in reversed(self.scenes):
+            cached_guild, cached_hash = key
+            scene, cached_type, _ = self.scenes[key]
+            if (cached_guild == guild_id and cached_type == content_type
+                    and hamming_distance(cached_hash, frame_hash) <= self.threshold):
+                self.scenes.move_to_end(key)
+                return scene
+        return None
+
+    def put_scene(self, guild_id: int, frame_hash: int, content_type: str, scene: Dict[str, Any]) -> None:
+        """Store the structured description of a guild's screen"""
+        self._store(self.scenes, (guild_id, frame_hash), (scene, content_type, time.time()))
+
+    def forget(self, guild_id: int) -> None:
+        """Drop everything stored about a guild's screen"""
+        for store in (self.answers, self.scenes):
+            for key in [key for key in store if key[0] == guild_id]:
+                del store[key]
+
+    def clear(self) -> None:
+        self.answers.clear()
+        self.scenes.clear()
+
+    async def analyze(self, guild_id: int, frame: Frame, prompt: str, question: str, gemini_api,
+                      content_type: str = None, priority: str = "voice", max_side: int = None,
+                      budget: Callable[[], bool] = None) -> Optional[str]:
+        """
+        Answer a question about a frame, from the cache when the same screen was already analysed
+
+        Args:
+            guild_id: Guild whose screenshare the frame is from
+            frame: The screenshare frame the question is about
+            prompt: The full vision prompt to send on a miss
+            question: What was actually asked, used for the cache key
+            gemini_api: Instance of the GeminiAPI class
+            content_type: Type of content detected in the frame
+            priority: LLM scheduling class for the request
+            max_side: Longest side of the uploaded image on a miss (uses the content type's target if None)
+            budget: Called just before a vision call is made, returning False skips the call
+
+        Returns:
+            Analysis result as text, or None if the budget refused the vision call
+        """
+        frame_hash = frame.perceptual_hash()
+        if frame_hash is None:
+            # Nothing to key on, e.g. a frame that can't be decoded
+            if budget is not None and not budget():
+                return None
+            return await analyze_image_with_vision_model(frame, prompt, gemini_api, content_type, priority=priority,
+                                                         max_side=max_side)
+
+        content_type = content_type or "unknown"
+        answer = self.get(guild_id, frame_hash, content_type, question)
+        if answer is not None:
+            self.stats["hits"] += 1
+            logger.info("Answered vision question from the cache")
+            return answer
+
+        scene = self.get_scene(guild_id, frame_hash, content_type) if self.scene_answers else None
+        if scene is not None:
+            self.stats["scene_hits"] += 1
+            logger.info("Answering vision question from a cached scene description")
+            scene_prompt = (
+                f"Here is a description of what is on screen, as JSON:\n{json.dumps(scene, ensure_ascii=False)}\n\n"
+                f"{prompt}\nAnswer from the description alone."
+            )
+            answer = await gemini_api.generate_response(scene_prompt, vision_system_prompt(content_type), priority=priority)
+        else:
+            self.stats["misses"] += 1
+            # Only an actual upload counts against the vision budget
+            if budget is not None and not budget():
+                return None
+            if self.scene_answers:
+                reply = await analyze_image_with_vision_model(frame, prompt + SCENE_INSTRUCTIONS, gemini_api,
+                                                              content_type, priority=priority, max_side=max_side)
+                answer, scene = parse_scene_response(reply)
+                if scene is not None:
+                    self.put_scene(guild_id, frame_hash, content_type, scene)
+            else:
+                answer = await analyze_image_with_vision_model(frame, prompt, gemini_api, content_type, priority=priority,
+                                                               max_side=max_side)
+
+        # Apologies for failed calls must not be served again
+        if answer and answer not in VISION_FALLBACK_RESPONSES:
+            self.put(guild_id, frame_hash, content_type, question, answer)
+        return answer
@@ -0,0 +1,225 @@
+import io
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import VISION_IMAGE_FORMAT, VISION_IMAGE_QUALITY, VISION_IMAGE_MAX_SIDE, VISION_KEYFRAME_MAX_BYTES
+from content_classifier import find_board, find_youtube_player, title_region
+from frames import Frame, grayscale
+
+logger = logging.getLogger(__name__)
+
+# Longest side uploaded per content type: a board reads fine at one 768px tile,
+# captions and street signs need more
+TARGET_SIDES = {"chess": 768, "checkers": 768, "youtube": 1024, "geoguesser": 1280}
+
+# Earlier keyframes only need to show what changed, so they are sent this much smaller than the current frame
+_KEYFRAME_SCALE = 2 / 3
+
+# Extra room kept around a cropped region, as a fraction of its size, so board coordinates stay in
+_CROP_MARGIN = 0.04
+
+_MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+# Totals over every prepared upload
+stats: Dict[str, int] = {"images": 0, "bytes_in": 0, "bytes_out": 0}
+
+_webp_checked = False
+
+
+class PreparedImage:
+    def __init__(self, data: bytes, mime_type: str, original_bytes: int, size: Tuple[int, int] = None):
+        """
+        An encoded image ready to send to the vision model
+
+        Args:
+            data: The encoded image
+            mime_type: MIME type of the encoded image
+            original_bytes: Size of the frame it was made from
+            size: (width, height) in pixels, None if unknown
+        """
+        self.data = data
+        self.mime_type = mime_type
+        self.original_bytes = original_bytes
+        self.size = size
+
+    @property
+    def saved(self) -> int:
+        """Bytes saved compared to uploading the frame as captured"""
+        return self.original_bytes - len(self.data)
+
+
+def region_of_interest(frame: Frame, content_type: str = None) -> Optional[Tuple[int, int, int, int]]:
+    """
+    The part of a frame worth sending for its content type: the board, or the video with its title
+
+    Args:
+        frame: The captured screenshare frame
+        content_type: Type of content detected in the frame
+
+    Returns:
+        (top, left, bottom, right) in full-size pixels, or None to keep the whole frame
+    """
+    pixels, thumbnail = frame.pixels(), frame.thumbnail()
+    if pixels is None or thumbnail is None:
+        return None
+
+    h, w = pixels.shape[:2]
+    if content_type in ("chess", "checkers"):
+        board = find_board(grayscale(thumbnail))
+        if board is None:
+            return None
+        top, left, side = board[3]
+        scale = h / thumbnail.shape[0]
+        region = (top * scale, left * scale, (top + side) * scale, (left + side) * scale)
+    elif content_type == "youtube":
+        region = find_youtube_player(pixels, thumbnail)
+        if region is None:
+            return None
+        # Keep the title and channel under the player, the model can't say what is being watched without them
+        strip = title_region(pixels, thumbnail, region)
+        if strip is not None:
+            region = (region[0], region[1], strip[2], region[3])
+    else:
+        return None
+
+    top, left, bottom, right = region
+    margin_y, margin_x = (bottom - top) * _CROP_MARGIN, (right - left) * _CROP_MARGIN
+    return (max(0, int(top - margin_y)), max(0, int(left - margin_x)),
+            min(h, int(bottom + margin_y)), min(w, int(right + margin_x)))
+
+def _image_format(requested: str) -> str:
+    global _webp_checked
+    requested = requested.lower()
+    if requested not in _MIME_TYPES:
+        logger.warning(f"Unknown vision image format {requested}, using jpeg")
+        return "jpeg"
+    if requested == "webp":
+        from PIL import features
+        if not features.check("webp"):
+            if not _webp_checked:
+                logger.warning("Pillow was built without WebP support, vision images will be sent as JPEG")
+                _webp_checked = True
+            return "jpeg"
+    return requested
+
+def prepare_image(frame: Frame, content_type: str = None, image_format: str = None, quality: int = None,
+                  max_side: int = None) -> PreparedImage:
+    """
+    Crop a frame to what matters for its content type, shrink it and re-encode it for upload
+
+    Falls back to the frame as captured when it can't be decoded, or when
+    re-encoding at the same size wouldn't make it any smaller. Decoding and
+    encoding take a while, so call this in an executor.
+
+    Args:
+        frame: The captured screenshare frame
+        content_type: Type of content detected in the frame
+        image_format: jpeg or webp (uses config if None)
+        quality: Encoder quality from 1 to 100 (uses config if None)
+        max_side: Longest side in pixels (uses the content type's target or config if None)
+
+    Returns:
+        The image to upload
+    """
+    original = PreparedImage(frame.data, frame.mime_type, len(frame))
+    pixels = frame.pixels()
+    if pixels is None:
+        return original
+
+    try:
+        from PIL import Image
+
+        h, w = pixels.shape[:2]
+        region = region_of_interest(frame, content_type)
+        if region is not None:
+            top, left, bottom, right = region
+            pixels = pixels[top:bottom, left:right]
+            h, w = pixels.shape[:2]
+
+        max_side = max_side or TARGET_SIDES.get(content_type, VISION_IMAGE_MAX_SIDE)
+        scale = min(1.0, max_side / max(h, w))
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        reshaped = region is not None or scale < 1.0
+
+        image = Image.fromarray(np.ascontiguousarray(pixels))
+        if scale < 1.0:
+            # Reducing by whole factors first keeps resampling cheap on full-size frames
+            image = image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+        image_format = _image_format(image_format or VISION_IMAGE_FORMAT)
+        quality = max(1, min(100, quality if quality is not None else VISION_IMAGE_QUALITY))
+        buffer = io.BytesIO()
+        # WebP's method 2 is about twice as fast as the default for a few percent more bytes
+        image.save(buffer, format=image_format.upper(), quality=quality, method=2)
+        prepared = PreparedImage(buffer.getvalue(), _MIME_TYPES[image_format], len(frame), size)
+
+        if reshaped and len(prepared.data) >= len(frame) and frame.mime_type == "image/png":
+            # Flat UIs compress better losslessly, keep the smaller pixels in the format they came in
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            if len(buffer.getvalue()) < len(prepared.data):
+                prepared = PreparedImage(buffer.getvalue(), "image/png", len(frame), size)
+    except ImportError:
+        logger.warning("Pillow not available, vision images are sent as captured. Install with 'pip install pillow'")
+        return original
+    except Exception as e:
+        logger.error(f"Error preparing vision image: {e}")
+        return original
+
+    # Same pixels and no smaller, e.g. a flat UI that compresses well as PNG
+    if not reshaped and len(prepared.data) >= len(frame):
+        original.size = size
+        prepared = original
+
+    stats["images"] += 1
+    stats["bytes_in"] += len(frame)
+    stats["bytes_out"] += len(prepared.data)
+    logger.debug(f"Prepared {content_type or 'unknown'} vision image {prepared.size[0]}x{prepared.size[1]}, "
+                 f"{len(frame)} -> {len(prepared.data)} bytes ({prepared.saved} saved)")
+    return prepared
+
+def trim_to_budget(images: List[PreparedImage], max_bytes: int = None) -> List[PreparedImage]:
+    """
+    Drop images until their total size fits a request, oldest first
+
+    The most recent changes matter most to what just happened, and the last
+    image, the screen now, is never dropped.
+
+    Args:
+        images: Encoded images, oldest first
+        max_bytes: Most bytes for all images together (uses config if None)
+
+    Returns:
+        The images that fit, in the same order
+    """
+    max_bytes = max_bytes or VISION_KEYFRAME_MAX_BYTES
+    images = list(images)
+    while len(images) > 1 and sum(len(image.data) for image in images) > max_bytes:
+        images.pop(0)
+    return images
+
+def prepare_images(frames: List[Frame], content_type: str = None, max_bytes: int = None) -> List[PreparedImage]:
+    """
+    Prepare a window of keyframes for one vision request
+
+    The newest frame is prepared like a single upload, the earlier ones at a
+    smaller size, and frames are dropped until the total fits the budget.
+    Call this in an executor, like prepare_image.
+
+    Args:
+        frames: Keyframes, oldest first, the last being the current screen
+        content_type: Type of content detected in the frames
+        max_bytes: Most bytes for all images together (uses config if None)
+
+    Returns:
+        The images to upload, oldest first
+    """
+    if not frames:
+        return []
+    latest = prepare_image(frames[-1], content_type)
+    side = max(latest.size) if latest.size else TARGET_SIDES.get(content_type, VISION_IMAGE_MAX_SIDE)
+    earlier = [prepare_image(frame, content_type, max_side=max(1, round(side * _KEYFRAME_SCALE)))
+               for frame in frames[:-1]]
+    return trim_to_budget(earlier + [latest], max_bytes)
@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import (
+    SCREENSHOT_INTERVAL, SCREENSHOT_MIN_INTERVAL, SCREENSHOT_MAX_INTERVAL, SCREENSHOT_MAX_FPS,
+    VISION_CALLS_PER_MINUTE
+)
+
+logger = logging.getLogger(__name__)
+
+# How the interval of a stream moves after a capture: halve on change, grow by half when static
+_SPEED_UP = 0.5
+_SLOW_DOWN = 1.5
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        """
+        Allows `rate` events per second on average, in bursts of up to `capacity`
+
+        Args:
+            rate: Tokens added per second
+            capacity: Most tokens that can be saved up
+        """
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, force: bool = False) -> bool:
+        """
+        Use up a token
+
+        Args:
+            force: Take it even when none is left, going into debt that later takes must wait out
+
+        Returns:
+            True if a token was available
+        """
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        if force:
+            self.tokens -= 1
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until a token will be available"""
+        self._refill(time.monotonic())
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+
+
+class _Stream:
+    def __init__(self, guild_id: int, interval: float):
+        self.guild_id = guild_id
+        self.interval = interval
+        self.generation = 0  # Bumped on every (re)schedule, so stale timer entries are ignored
+        self.task: Optional[asyncio.Task] = None
+        self.captures = 0
+        self.changes = 0
+
+
+class VisionScheduler:
+    def __init__(self, capture: Callable[[int], Awaitable[Optional[bool]]], min_interval: float = None,
+                 max_interval: float = None, max_fps: float = None, calls_per_minute: int = None):
+        """
+        One timer for the screenshares of every guild
+
+        Each stream has its own interval, which halves whenever a capture
+        shows a new scene and grows when the screen stays the same, between
+        the minimum and maximum. All captures share a frames-per-second
+        budget, and vision calls share a per-minute budget. A stream never
+        has more than one capture in flight.
+
+        Args:
+            capture: Coroutine capturing and handling a frame for a guild, returning
+                whether the scene changed or None if nothing was captured
+            min_interval: Fastest seconds between captures of a stream (uses config if None)
+            max_interval: Slowest seconds between captures of a stream (uses config if None)
+            max_fps: Captures per second across all streams (uses config if None)
+            calls_per_minute: Vision calls per minute across all streams (uses config if None)
+        """
+        self.capture = capture
+        self.min_interval = min_interval or SCREENSHOT_MIN_INTERVAL
+        self.max_interval = max(self.min_interval, max_interval or SCREENSHOT_MAX_INTERVAL)
+        max_fps = max_fps or SCREENSHOT_MAX_FPS
+        calls_per_minute = calls_per_minute or VISION_CALLS_PER_MINUTE
+        self.frames = TokenBucket(max_fps, max_fps)
+        self.vision_calls = TokenBucket(calls_per_minute / 60, calls_per_minute / 4)
+
+        self.streams: Dict[int, _Stream] = {}
+        self.timers: List[Tuple[float, int, int, int]] = []  # Heap of (due, sequence, guild ID, generation)
+        self.sequence = itertools.count()
+        self.wakeup: Optional[asyncio.Event] = None  # Made with the worker, inside the running loop
+        self.worker: Optional[asyncio.Task] = None
+
+        self.metrics: Dict[str, int] = {"captures": 0, "changes": 0, "throttled": 0, "vision_calls": 0,
+                                        "vision_calls_refused": 0}
+
+    def watch(self, guild_id: int) -> None:
+        """Start sampling a guild's screenshare, does nothing if it is already sampled"""
+        if guild_id in self.streams:
+            return
+        if self.worker is None or self.worker.done():
+            self.wakeup = asyncio.Event()
+            self.worker = asyncio.create_task(self._run(), name="vision-scheduler")
+
+        stream = _Stream(guild_id, min(self.max_interval, max(self.min_interval, SCREENSHOT_INTERVAL)))
+        self.streams[guild_id] = stream
+        logger.info(f"Watching screenshare in guild {guild_id}")
+        self._schedule(stream, 0)
+
+    def unwatch(self, guild_id: int) -> None:
+        """Stop sampling a guild's screenshare and cancel a capture in flight"""
+        stream = self.streams.pop(guild_id, None)
+        if stream is None:
+            return
+        # A capture may stop its own stream, it just isn't rescheduled then
+        if stream.task and not stream.task.done() and stream.task is not asyncio.current_task():
+            stream.task.cancel()
+        logger.info(f"Stopped watching screenshare in guild {guild_id}")
+
+    def is_watching(self, guild_id: int) -> bool:
+        return guild_id in self.streams
+
+    def try_vision_call(self, force: bool = False) -> bool:
+        """
+        Spend one vision call from the shared budget
+
+        Args:
+            force: Count the call even over budget, for questions someone is waiting on
+
+        Returns:
+            True if the call fits in the budget, commentary should be skipped otherwise
+        """
+        allowed = self.vision_calls.take(force)
+        if allowed or force:
+            self.metrics["vision_calls"] += 1
+        else:
+            self.metrics["vision_calls_refused"] += 1
+        return allowed
+
+    async def close(self) -> None:
+        """Stop every stream and the timer task"""
+        for guild_id in list(self.streams):
+            self.unwatch(guild_id)
+        self.timers.clear()
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.worker = None
+
+    def _schedule(self, stream: _Stream, delay: float) -> None:
+        stream.generation += 1
+        heapq.heappush(self.timers, (time.monotonic() + delay, next(self.sequence), stream.guild_id, stream.generation))
+        if self.wakeup:
+            self.wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self.wakeup.clear()
+            if not self.timers:
+                await self.wakeup.wait()
+                continue
+
+            due = self.timers[0][0] - time.monotonic()
+            if due > 0:
+                # A new stream may need to go before the earliest timer
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), due)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, guild_id, generation = heapq.heappop(self.timers)
+            stream = self.streams.get(guild_id)
+            if stream is None or stream.generation != generation:
+                continue
+            if stream.task and not stream.task.done():
+                # Still busy with the last capture, it reschedules itself when done
+                continue
+
+            if not self.frames.take():
+                self.metrics["throttled"] += 1
+                self._schedule(stream, self.frames.wait_time())
+                continue
+            stream.task = asyncio.create_task(self._capture(stream))
+
+    async def _capture(self, stream: _Stream) -> None:
+        changed = None
+        try:
+            changed = await self.capture(stream.guild_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error capturing screenshare in guild {stream.guild_id}: {e}")
+
+        if self.streams.get(stream.guild_id) is not stream:
+            return
+        if changed is not None:
+            stream.captures += 1
+            self.metrics["captures"] += 1
+            if changed:
+                stream.changes += 1
+                self.metrics["changes"] += 1
+            factor = _SPEED_UP if changed else _SLOW_DOWN
+            stream.interval = min(self.max_interval, max(self.min_interval, stream.interval * factor))
+        self._schedule(stream, stream.interval)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the streams being watched, their intervals and the budget counters"""
+        return {
+            **self.metrics,
+            "streams": {str(stream.guild_id): round(stream.interval, 2) for stream in self.streams.values()},
+        }
@@ -0,0 +1,380 @@
+import asyncio
+import collections
+import io
+import logging
+import time
+import wave
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    VOICE_ASR_QUEUE_SIZE, VOICE_DECIDE_QUEUE_SIZE, VOICE_RESPOND_QUEUE_SIZE,
+    VOICE_PLAYBACK_QUEUE_SIZE, VOICE_POLL_INTERVAL,
+    VOICE_BARGE_IN_ENABLED, VOICE_BARGE_IN_WINDOW, VOICE_BARGE_IN_GRACE,
+    VOICE_BARGE_IN_MIN_RMS, VOICE_BARGE_IN_MIN_SPEECH
+)
+
+logger = logging.getLogger(__name__)
+
+# Captured voice arrives as WAV files, levels are measured per 20 ms frame
+_FRAME_SECONDS = 0.02
+# Bare PCM without a WAV header is taken to be Discord's 48 kHz 16-bit stereo
+_RAW_SAMPLE_RATE = 48000
+_RAW_CHANNELS = 2
+
+# What a mailbox does with a new item when it is full
+DROP_OLDEST = "drop_oldest"  # Evict the oldest queued item to make room (freshest work wins)
+DROP_NEWEST = "drop_newest"  # Refuse the new item (queued work keeps its place)
+
+def speech_seconds(audio_data: bytes, min_rms: float = None) -> float:
+    """
+    How much of a stretch of captured audio is loud enough to be speech
+
+    Args:
+        audio_data: Captured 16-bit WAV file contents, or bare 48 kHz stereo PCM
+        min_rms: RMS level a 20 ms frame needs to count (uses config if None)
+
+    Returns:
+        Seconds of frames at or above the level
+    """
+    min_rms = VOICE_BARGE_IN_MIN_RMS if min_rms is None else min_rms
+    pcm, sample_rate, channels = audio_data, _RAW_SAMPLE_RATE, _RAW_CHANNELS
+    if audio_data[:4] == b"RIFF":
+        try:
+            with wave.open(io.BytesIO(audio_data), "rb") as wav_file:
+                if wav_file.getsampwidth() != 2:
+                    return 0.0
+                sample_rate, channels = wav_file.getframerate(), wav_file.getnchannels()
+                pcm = wav_file.readframes(wav_file.getnframes())
+        except (wave.Error, EOFError) as e:
+            logger.debug(f"Unreadable captured audio: {e}")
+            return 0.0
+
+    frame_samples = max(1, round(sample_rate * _FRAME_SECONDS) * channels)
+    samples = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+    frames = len(samples) // frame_samples
+    if not frames:
+        return 0.0
+    levels = np.sqrt(np.mean(samples[:frames * frame_samples].reshape(frames, -1).astype(np.float64) ** 2, axis=1))
+    return np.count_nonzero(levels >= min_rms) * _FRAME_SECONDS
+
+class BoundedMailbox:
+    def __init__(self, name: str, maxsize: int, drop_policy: str = DROP_OLDEST,
+                 on_drop: Optional[Callable[[Any], None]] = None):
+        """
+        A bounded queue that never blocks the producer
+
+        Args:
+            name: Name used in logs and metrics
+            maxsize: Maximum number of queued items
+            drop_policy: DROP_OLDEST or DROP_NEWEST
+            on_drop: Optional callback for releasing resources held by a dropped item
+        """
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.drop_policy = drop_policy
+        self.on_drop = on_drop
+        self._items = collections.deque()
+        self._not_empty = asyncio.Event()
+
+        # Metrics
+        self.put_count = 0
+        self.dropped_count = 0
+
+    def put_nowait(self, item: Any) -> bool:
+        """
+        Add an item without waiting, applying the drop policy if the mailbox is full
+
+        Args:
+            item: The item to queue
+
+        Returns:
+            True if the item was queued, False if it was dropped
+        """
+        self.put_count += 1
+
+        if len(self._items) >= self.maxsize:
+            if self.drop_policy == DROP_NEWEST:
+                self._drop(item)
+                return False
+            self._drop(self._items.popleft())
+
+        self._items.append(item)
+        self._not_empty.set()
+        return True
+
+    async def get(self) -> Any:
+        """Wait for and return the next item"""
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self._items.popleft()
+
+    def clear(self) -> None:
+        """Drop everything that is currently queued"""
+        while self._items:
+            self._drop(self._items.popleft())
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _drop(self, item: Any) -> None:
+        self.dropped_count += 1
+        logger.debug(f"Mailbox {self.name} full, dropped an item")
+        if self.on_drop:
+            try:
+                self.on_drop(item)
+            except Exception as e:
+                logger.error(f"Error releasing dropped item from {self.name}: {e}")
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Get queue depth and drop counters"""
+        return {
+            "depth": len(self._items),
+            "capacity": self.maxsize,
+            "queued": self.put_count,
+            "dropped": self.dropped_count,
+        }
+
+
+class GuildVoiceSession:
+    def __init__(self, guild_id: int, voice_client,
+                 poll_audio: Callable[[], List[Tuple[int, bytes]]],
+                 transcribe: Callable[[bytes], Awaitable[Optional[str]]],
+                 decide: Callable[[int, str], Awaitable[Optional[Callable[[], Awaitable[None]]]]],
+                 play: Callable[[Any], Awaitable[None]],
+                 release_audio: Optional[Callable[[Any], None]] = None,
+                 is_speaking: Optional[Callable[[], bool]] = None,
+                 stop_speaking: Optional[Callable[[], None]] = None):
+        """
+        A guild's voice conversation split into cooperating stage tasks
+
+        Audio flows ingest -> ASR -> decide -> respond -> playback, with a bounded
+        mailbox between each pair of stages so a slow stage never stalls intake.
+
+        Args:
+            guild_id: The guild this session belongs to
+            voice_client: The connected Discord voice client
+            poll_audio: Returns newly captured (user_id, audio_data) pairs
+            transcribe: Turns audio data into a transcript
+            decide: Takes (user_id, transcript) and returns a reply coroutine factory, or None to stay quiet
+            play: Plays one synthesized reply in the voice channel
+            release_audio: Cleans up a synthesized reply that will never be played
+            is_speaking: Whether Rupert is playing or about to play audio in the channel
+            stop_speaking: Stops Rupert's playback and drops anything queued to play
+        """
+        self.guild_id = guild_id
+        self.voice_client = voice_client
+        self.poll_audio = poll_audio
+        self.transcribe = transcribe
+        self.decide = decide
+        self.play = play
+        self.is_speaking = is_speaking
+        self.stop_speaking = stop_speaking
+
+        # Old audio and transcripts are dropped first, the newest speech matters most
+        self.asr_mailbox = BoundedMailbox("asr", VOICE_ASR_QUEUE_SIZE, DROP_OLDEST)
+        self.decide_mailbox = BoundedMailbox("decide", VOICE_DECIDE_QUEUE_SIZE, DROP_OLDEST)
+        # A newer question supersedes one we have not started answering yet
+        self.respond_mailbox = BoundedMailbox("respond", VOICE_RESPOND_QUEUE_SIZE, DROP_OLDEST)
+        # Replies that are already synthesized keep their order, extra ones are discarded
+        self.playback_mailbox = BoundedMailbox("playback", VOICE_PLAYBACK_QUEUE_SIZE, DROP_NEWEST,
+                                               on_drop=release_audio)
+
+        self.tasks: List[asyncio.Task] = []
+
+        # The reply being generated now and when its turn started, for barge-in
+        self.reply_task: Optional[asyncio.Task] = None
+        self.turn_started_at = 0.0
+        self.barge_in_count = 0
+        # User ID -> Seconds of speech heard in a row while Rupert has the floor
+        self.speech_heard: Dict[int, float] = {}
+
+    def start(self) -> None:
+        """Start every stage task"""
+        if self.tasks:
+            return
+
+        stages = [
+            ("ingest", self._ingest_loop),
+            ("asr", self._asr_loop),
+            ("decide", self._decide_loop),
+            ("respond", self._respond_loop),
+            ("playback", self._playback_loop),
+        ]
+        for name, stage in stages:
+            task = asyncio.create_task(stage(), name=f"voice-{name}-{self.guild_id}")
+            self.tasks.append(task)
+
+        logger.info(f"Started voice session stages for guild {self.guild_id}")
+
+    async def run(self) -> None:
+        """Start the session and wait until the voice client disconnects"""
+        self.start()
+        try:
+            # Ingest stops on disconnect, which ends the session
+            await self.tasks[0]
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop()
+
+    async def stop(self) -> None:
+        """Cancel every stage and release anything still queued"""
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self.tasks = []
+
+        for mailbox in (self.asr_mailbox, self.decide_mailbox, self.respond_mailbox, self.playback_mailbox):
+            mailbox.clear()
+
+        logger.info(f"Stopped voice session for guild {self.guild_id}")
+
+    def enqueue_playback(self, audio: Any) -> bool:
+        """
+        Hand a synthesized reply to the playback stage without waiting for it to play
+
+        Args:
+            audio: The synthesized reply
+
+        Returns:
+            True if the reply was queued, False if it was dropped
+        """
+        return self.playback_mailbox.put_nowait(audio)
+
+    def get_metrics(self) -> Dict[str, Dict[str, int]]:
+        """Get metrics for every mailbox in the session"""
+        metrics = {
+            mailbox.name: mailbox.get_metrics()
+            for mailbox in (self.asr_mailbox, self.decide_mailbox, self.respond_mailbox, self.playback_mailbox)
+        }
+        metrics["barge_in"] = {"count": self.barge_in_count}
+        return metrics
+
+    def has_floor(self) -> bool:
+        """Whether Rupert is generating, synthesizing or playing a reply"""
+        generating = self.reply_task is not None and not self.reply_task.done()
+        return generating or len(self.playback_mailbox) > 0 or bool(self.is_speaking and self.is_speaking())
+
+    def barge_in(self) -> bool:
+        """
+        Give the floor back to the users if Rupert is holding it
+
+        Cancels the reply being generated, drops replies waiting to play and
+        stops playback. Speech within the grace period of a new reply is taken
+        to be the tail end of the question that triggered it and is ignored.
+
+        Returns:
+            True if anything was interrupted
+        """
+        if not self.has_floor() or time.monotonic() - self.turn_started_at < VOICE_BARGE_IN_GRACE:
+            return False
+
+        self.barge_in_count += 1
+        logger.info(f"User started speaking in guild {self.guild_id}, interrupting Rupert")
+
+        if self.reply_task is not None and not self.reply_task.done():
+            self.reply_task.cancel()
+        self.playback_mailbox.clear()
+        if self.stop_speaking:
+            self.stop_speaking()
+        return True
+
+    def heard_interruption(self, captured: List[Tuple[int, bytes]]) -> bool:
+        """
+        Whether someone has been talking over Rupert long enough to interrupt him
+
+        Only frames above the speech level count, and a poll without any from
+        a user starts their count again, so background noise, clicks and
+        coughs don't cut a reply off.
+
+        Args:
+            captured: The (user_id, audio_data) pairs from the latest poll
+
+        Returns:
+            True once a user has spoken for the minimum duration
+        """
+        if not self.has_floor():
+            self.speech_heard.clear()
+            return False
+        heard = {}
+        for user_id, audio_data in captured:
+            seconds = speech_seconds(audio_data)
+            if seconds > 0:
+                heard[user_id] = heard.get(user_id, self.speech_heard.get(user_id, 0.0)) + seconds
+        self.speech_heard = heard
+        return any(seconds >= VOICE_BARGE_IN_MIN_SPEECH for seconds in heard.values())
+
+    async def _ingest_loop(self) -> None:
+        """Collect captured audio and pass it on without ever waiting on later stages"""
+        while self.voice_client.is_connected():
+            try:
+                captured = self.poll_audio()
+                if VOICE_BARGE_IN_ENABLED and self.heard_interruption(captured) and self.barge_in():
+                    self.speech_heard.clear()
+                for user_id, audio_data in captured:
+                    self.asr_mailbox.put_nowait((user_id, audio_data))
+            except Exception as e:
+                logger.error(f"Error collecting voice audio: {e}")
+
+            # Listen more closely while Rupert talks so interruptions are noticed quickly
+            interval = VOICE_BARGE_IN_WINDOW if VOICE_BARGE_IN_ENABLED and self.has_floor() else VOICE_POLL_INTERVAL
+            await asyncio.sleep(interval)
+
+    async def _asr_loop(self) -> None:
+        """Transcribe queued audio"""
+        while True:
+            user_id, audio_data = await self.asr_mailbox.get()
+            try:
+                transcript = await self.transcribe(audio_data)
+                if transcript:
+                    self.decide_mailbox.put_nowait((user_id, transcript))
+            except Exception as e:
+                logger.error(f"Error transcribing audio: {e}")
+
+    async def _decide_loop(self) -> None:
+        """Decide whether each transcript needs a reply"""
+        while True:
+            user_id, transcript = await self.decide_mailbox.get()
+            try:
+                reply = await self.decide(user_id, transcript)
+                if reply is not None:
+                    self.respond_mailbox.put_nowait(reply)
+            except Exception as e:
+                logger.error(f"Error deciding on a response: {e}")
+
+    async def _respond_loop(self) -> None:
+        """Generate and synthesize replies one at a time"""
+        while True:
+            reply = await self.respond_mailbox.get()
+            self.turn_started_at = time.monotonic()
+            self.reply_task = asyncio.create_task(reply())
+            try:
+                # wait() doesn't raise when only the reply was cancelled by a barge-in
+                await asyncio.wait([self.reply_task])
+            except asyncio.CancelledError:
+                self.reply_task.cancel()
+                raise
+
+            if self.reply_task.cancelled():
+                logger.info(f"Abandoned a voice response in guild {self.guild_id} after a barge-in")
+            elif self.reply_task.exception():
+                logger.error(f"Error generating a voice response: {self.reply_task.exception()}")
+
+    async def _playback_loop(self) -> None:
+        """Play synthesized replies in order"""
+        while True:
+            audio = await self.playback_mailbox.get()
+            try:
+                await self.play(audio)
+            except Exception as e:
+                logger.error(f"Error playing a voice response: {e}")
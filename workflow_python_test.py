@@ -22,7 +22,7 @@ if gemini_prompts:
 # Verify TTS module
 print('\nTTS Systems:')
 tts_classes = [name for name, obj in inspect.getmembers(tts) 
-               if inspect.isclass(obj) and hasattr(obj, 'text_to_speech')]
+               if inspect.isclass(obj) and hasattr(obj, 'synthesize')]
 print(f'- Available TTS engines: {", ".join(tts_classes)}')
 
 # Check Piper model
@@ -0,0 +1,249 @@
+import collections
+import difflib
+import logging
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    YOUTUBE_OCR_ENABLED, YOUTUBE_CONTEXT_MAX_VIDEOS, YOUTUBE_SUMMARY_COMMENTS, YOUTUBE_CONTEXT_MIN_SIDE
+)
+from content_classifier import title_region
+from frames import Frame, downscale, grayscale
+from vision_preprocess import TARGET_SIDES
+
+logger = logging.getLogger(__name__)
+
+# Size of the coarse picture of the title strip that tells videos apart without OCR
+_SIGNATURE_SHAPE = (16, 128)
+# Fraction of the cells with text that may differ for the same title, the cursor and hover effects move a few
+_SIGNATURE_TOLERANCE = 0.2
+
+# Titles read by OCR this similar belong to the same video, OCR misreads a character here and there
+_TITLE_SIMILARITY = 0.85
+
+# Each comment on a video sends a smaller frame than the last, down to the minimum
+_SIDE_DECAY = 0.75
+
+_SUBSCRIBERS = re.compile(r"\s*[\d.,]+\s*[KMB]?\s+subscribers?.*$", re.IGNORECASE)
+
+_tesseract_checked = False
+
+
+def _signature(strip: np.ndarray) -> Optional[np.ndarray]:
+    """Which cells of a coarse grid over a title strip hold text, or None if none do"""
+    gray = grayscale(strip)
+    small = downscale(gray, *_SIGNATURE_SHAPE)
+    # The page background is the most common shade, text stands out from it either way
+    text = np.abs(small - np.median(small)) > 12
+    return text if text.any() else None
+
+
+def _signature_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Fraction of the cells with text in either signature that differ"""
+    union = np.count_nonzero(a | b)
+    return np.count_nonzero(a ^ b) / union if union else 0.0
+
+
+def _read_text(strip: np.ndarray) -> Tuple[Optional[str], Optional[str]]:
+    """
+    OCR the title and channel out of a title strip
+
+    Returns:
+        (title, channel), either None when it couldn't be read or OCR isn't available
+    """
+    global _tesseract_checked
+    try:
+        import pytesseract
+        from PIL import Image
+    except ImportError:
+        if not _tesseract_checked:
+            logger.warning("pytesseract not available, YouTube titles won't be read locally. "
+                           "Install with 'pip install pytesseract' and the tesseract binary")
+            _tesseract_checked = True
+        return None, None
+
+    gray = grayscale(strip)
+    if gray.mean() < 128:
+        # Dark theme, Tesseract reads dark text on light best
+        gray = 255 - gray
+    image = Image.fromarray(gray.clip(0, 255).astype(np.uint8))
+    # Small text reads much better at twice the size
+    image = image.resize((image.width * 2, image.height * 2), Image.LANCZOS)
+    try:
+        text = pytesseract.image_to_string(image)
+    except Exception as e:
+        if not _tesseract_checked:
+            logger.warning(f"Couldn't run Tesseract for YouTube titles: {e}")
+            _tesseract_checked = True
+        return None, None
+
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    lines = [line for line in lines if sum(char.isalnum() for char in line) >= 3]
+    if not lines:
+        return None, None
+    channel = _SUBSCRIBERS.sub("", lines[1]).strip() if len(lines) > 1 else None
+    return lines[0], channel or None
+
+
+def _same_title(a: Optional[str], b: Optional[str]) -> bool:
+    if not a or not b:
+        return False
+    return difflib.SequenceMatcher(None, a.lower(), b.lower()).ratio() >= _TITLE_SIMILARITY
+
+
+class VideoContext:
+    def __init__(self, signature: Optional[np.ndarray], title: str = None, channel: str = None):
+        """
+        What is known about one video, so later prompts don't have to find it out again
+
+        Args:
+            signature: Coarse picture of the title strip, see _signature
+            title: Title read off the page, None if it couldn't be read
+            channel: Channel name read off the page, None if it couldn't be read
+        """
+        self.signature = signature
+        self.title = title
+        self.channel = channel
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        self.comments: "collections.deque[str]" = collections.deque(maxlen=max(1, YOUTUBE_SUMMARY_COMMENTS))
+        self.comment_count = 0
+
+    @property
+    def known(self) -> bool:
+        """Whether the title was read, so the model doesn't need to read it again"""
+        return bool(self.title)
+
+    def matches(self, signature: Optional[np.ndarray], title: str = None) -> bool:
+        """Whether a title strip shows this video"""
+        if title and self.title:
+            return _same_title(title, self.title)
+        if signature is None or self.signature is None or signature.shape != self.signature.shape:
+            return False
+        return _signature_distance(signature, self.signature) <= _SIGNATURE_TOLERANCE
+
+    def add_comment(self, text: str) -> None:
+        """Remember a comment made about this video, keeping the most recent few"""
+        text = " ".join(text.split())
+        if text:
+            self.comments.append(text if len(text) <= 240 else text[:237] + "...")
+            self.comment_count += 1
+
+    def image_side(self) -> int:
+        """
+        Longest side of the frame to send with the next prompt about this video
+
+        The text context carries more of each prompt the longer a video is
+        watched, so every comment shrinks the frame a step, down to the minimum.
+        """
+        side = TARGET_SIDES["youtube"] * _SIDE_DECAY ** self.comment_count
+        if not self.known:
+            # Without the title the model still has to read it off the frame
+            side = max(side, TARGET_SIDES["youtube"] * _SIDE_DECAY)
+        return int(max(YOUTUBE_CONTEXT_MIN_SIDE, side))
+
+    def describe(self) -> str:
+        """The context as text for a prompt"""
+        lines = []
+        if self.title:
+            lines.append(f"Video title: {self.title}")
+        if self.channel:
+            lines.append(f"Channel: {self.channel}")
+        minutes = (self.last_seen - self.first_seen) / 60
+        if minutes >= 1:
+            lines.append(f"Watched for about {minutes:.0f} minutes so far")
+        if self.comments:
+            lines.append("Earlier comments on this video, oldest first:")
+            lines.extend(f"- {comment}" for comment in self.comments)
+        return "\n".join(lines)
+
+
+class YouTubeContextCache:
+    def __init__(self, max_videos: int = None, ocr: bool = None):
+        """
+        Per-guild cache of what is known about the YouTube videos being watched
+
+        The title strip under the player is compared with the current video's
+        on every new frame, which takes a few thousand pixels. Only when it
+        looks different is it read with OCR, once per video, and a video seen
+        before in the same guild gets its old context back.
+
+        Args:
+            max_videos: Videos remembered per guild, least recently seen dropped first (uses config if None)
+            ocr: Whether to read titles with Tesseract (uses config if None)
+        """
+        self.max_videos = max(1, max_videos or YOUTUBE_CONTEXT_MAX_VIDEOS)
+        self.ocr = YOUTUBE_OCR_ENABLED if ocr is None else ocr
+        # Guild ID -> Videos, most recently seen last
+        self.videos: Dict[int, "collections.OrderedDict[int, VideoContext]"] = {}
+        self.current: Dict[int, VideoContext] = {}
+        self.next_id = 0
+        self.stats: Dict[str, int] = {"frames": 0, "ocr_reads": 0, "videos": 0, "video_changes": 0}
+
+    def get(self, guild_id: int) -> Optional[VideoContext]:
+        """The video a guild is watching, None before one has been seen"""
+        return self.current.get(guild_id)
+
+    def forget(self, guild_id: int) -> None:
+        self.videos.pop(guild_id, None)
+        self.current.pop(guild_id, None)
+
+    def update(self, guild_id: int, frame: Frame) -> Optional[VideoContext]:
+        """
+        Match a YouTube frame to the video it shows, reading the title when it is a new one
+
+        Decodes the frame and may run OCR, so call this in an executor.
+
+        Args:
+            guild_id: Guild whose screenshare the frame is from
+            frame: A frame classified as YouTube
+
+        Returns:
+            The context of the video, or the current one if the title strip can't be seen
+        """
+        current = self.current.get(guild_id)
+        pixels, thumbnail = frame.pixels(), frame.thumbnail()
+        if pixels is None or thumbnail is None:
+            return current
+        region = title_region(pixels, thumbnail)
+        if region is None:
+            return current
+        top, left, bottom, right = region
+        strip = pixels[top:bottom, left:right]
+        signature = _signature(strip)
+        if signature is None:
+            return current
+
+        self.stats["frames"] += 1
+        if current is not None and current.matches(signature):
+            current.last_seen = time.time()
+            return current
+
+        title, channel = None, None
+        if self.ocr:
+            title, channel = _read_text(strip)
+            self.stats["ocr_reads"] += 1
+
+        videos = self.videos.setdefault(guild_id, collections.OrderedDict())
+        video_id = next((key for key, video in videos.items() if video.matches(signature, title)), None)
+        if video_id is None:
+            video_id, self.next_id = self.next_id, self.next_id + 1
+            videos[video_id] = VideoContext(signature, title, channel)
+            self.stats["videos"] += 1
+            logger.info(f"New YouTube video in guild {guild_id}: {title or 'title not read'}")
+        video = videos[video_id]
+        videos.move_to_end(video_id)
+        while len(videos) > self.max_videos:
+            videos.popitem(last=False)
+
+        # The strip can look a little different when it is seen again, e.g. with the description expanded
+        video.signature = signature
+        video.title, video.channel = video.title or title, video.channel or channel
+        video.last_seen = time.time()
+        if current is not None and video is not current:
+            self.stats["video_changes"] += 1
+        self.current[guild_id] = video
+        return video